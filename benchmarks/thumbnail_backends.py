@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+    Compare the thumbnail resize backends on a corpus of images.
+
+    Usage:
+        python benchmarks/thumbnail_backends.py CORPUS_DIR [FORMAT ...]
+
+    Every file in CORPUS_DIR (recursively) with a resizable image
+    MIME type is thumbnailed once per backend and per format
+    (default: all formats of thumbnailFormatMap); a summary of timings
+    and successes is printed. Run from the Ostracion root directory.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__,
+))))
+
+from ostracion_app.utilities.fileIO.postProcessing import (  # noqa: E402
+    determineFileProperties,
+)
+
+from ostracion_app.utilities.fileIO.thumbnails import (  # noqa: E402
+    thumbnailFormatMap,
+    thumbnailResizeBackends,
+)
+
+from ostracion_app.utilities.fileIO.mimeTypeMaps import (  # noqa: E402
+    imageMimeTypeToResizeMethodMap,
+)
+
+
+def collectCorpus(corpusDir):
+    """ List (fullPath, mimeType, size) for all resizable images."""
+    corpus = []
+    for dirPath, _, fileNames in os.walk(corpusDir):
+        for fileName in sorted(fileNames):
+            fullPath = os.path.join(dirPath, fileName)
+            fileProperties = determineFileProperties(fullPath)
+            mimeType = fileProperties['file_mime_type']
+            if imageMimeTypeToResizeMethodMap.get(mimeType) == 'resize':
+                corpus.append((
+                    fullPath,
+                    mimeType,
+                    fileProperties['file_size'],
+                ))
+    return corpus
+
+
+def benchmarkBackend(resizer, corpus, thumbnailFormat, workDir):
+    """ Thumbnail the whole corpus, return (seconds, successes, bytes)."""
+    numSuccesses = 0
+    outputBytes = 0
+    startTime = time.perf_counter()
+    for fileIndex, (fullPath, _, _) in enumerate(corpus):
+        dstFile = os.path.join(workDir, 'thumb_%i' % fileIndex)
+        if resizer(fullPath, dstFile, thumbnailFormat):
+            numSuccesses += 1
+            outputBytes += os.path.getsize(dstFile)
+    elapsed = time.perf_counter() - startTime
+    return elapsed, numSuccesses, outputBytes
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    corpus = collectCorpus(sys.argv[1])
+    formats = sys.argv[2:] if len(sys.argv) > 2 else list(thumbnailFormatMap)
+    print('Corpus: %i images, %.1f MiB, types: %s' % (
+        len(corpus),
+        sum(c[2] for c in corpus) / 1048576,
+        ', '.join(sorted({c[1] for c in corpus})),
+    ))
+    if len(corpus) == 0:
+        sys.exit(0)
+    print('%-12s %-12s %10s %12s %9s %10s' % (
+        'format', 'backend', 'total (s)', 'ms/image', 'ok', 'out KiB',
+    ))
+    for thumbnailFormat in formats:
+        for backendName, resizer in sorted(thumbnailResizeBackends.items()):
+            workDir = tempfile.mkdtemp(prefix='ostracion_thb_bench_')
+            try:
+                elapsed, numSuccesses, outputBytes = benchmarkBackend(
+                    resizer,
+                    corpus,
+                    thumbnailFormat,
+                    workDir,
+                )
+            finally:
+                shutil.rmtree(workDir)
+            print('%-12s %-12s %10.2f %12.1f %5i/%-3i %10.1f' % (
+                thumbnailFormat,
+                backendName,
+                elapsed,
+                1000 * elapsed / len(corpus),
+                numSuccesses,
+                len(corpus),
+                outputBytes / 1024,
+            ))
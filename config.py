@@ -17,6 +17,10 @@ maxStoredTextLength = 65536
 
 # "find" tool, threshold for similarity search
 similarityScoreThreshold = 0.15
+# changes to the digram vectors retained for the similarity matrices
+# kept in memory (if NumPy/SciPy are there) to catch up with: a process
+# lagging behind more than this reloads them whole
+similarityChangeLogLength = 10000
 
 # allowed characters for usernames
 usernameCharacterSet = set(
@@ -78,3 +82,64 @@ dbFullName = os.path.join(
     'db',
     'ostracion.db',
 )
+
+# database connection handling:
+# within a request, hand out always the same connection (stored on flask.g)
+dbReuseConnectionPerRequest = True
+# max number of idle connections kept open, per process, for reuse
+dbConnectionPoolSize = 4
+# PRAGMAs issued, in this order, upon opening a connection
+# ('journal_mode' is persistent and is skipped on read-only connections)
+dbOpenPragmas = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 268435456),
+    ('cache_size', -16384),
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+]
+# GET endpoints declared as read-only get a "mode=ro" connection
+dbReadOnlyConnectionsForGet = False
+# max number of resolved box paths kept in memory, per process (0 = no cache)
+boxPathCacheSize = 2048
+# settings are cached per process and reloaded when changed: how often
+# (seconds) to check for changes made by other processes (0 = every request)
+settingsVersionCheckSeconds = 0
+# delivery of file bytes to clients: 'python' (the app streams them),
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (apache/lighttpd),
+# the latter two requiring a matching front-end server configuration
+fileDeliveryBackend = 'python'
+# for 'x-accel-redirect': internal URI prefix mapped, in the front-end
+# server, to the filesystem directory
+fileDeliveryAccelPrefix = '/_ostracion_fs/'
+# byte-range requests asking for more pieces than this get the whole file
+maxRangesPerRequest = 16
+# thumbnails of uploaded images are prepared by background workers
+# (run thumbnail_worker.py) instead of within the upload request
+asyncThumbnailGeneration = True
+# worker processes started by "thumbnail_worker.py run"
+thumbnailWorkerProcesses = 2
+# idle workers look for new jobs this often (seconds)
+thumbnailWorkerPollSeconds = 2
+# a job failing this many times is marked as failed
+thumbnailJobMaxAttempts = 3
+# a job running for longer than this (seconds) is given back to the queue
+thumbnailJobTimeoutSeconds = 600
+# how thumbnails are resized: 'pillow' (in-process, falling back to
+# ImageMagick where Pillow cannot help) or 'imagemagick' (a subprocess)
+thumbnailResizeBackend = 'pillow'
+# max threads analysing/thumbnailing the files of a single upload
+uploadProcessingThreads = min(8, os.cpu_count() or 1)
+# widths (px) of the reduced renditions made for uploaded images,
+# served to galleries according to the screen (empty list = none)
+imageDerivativeWidths = [160, 320, 800, 1600]
+# whether to make WebP versions of the renditions as well
+imageDerivativesWebP = False
+# zlib level (1-9) for the files compressed in box archives
+# (which ones, is an admin setting)
+archiveCompressionLevel = 6
+# results shown per page by the search (the next ones on request)
+searchResultsPageSize = 50
+# found items checked against permissions at a time, when filling
+# a page of search results
+searchPermissionBatchSize = 100
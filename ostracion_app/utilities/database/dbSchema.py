@@ -2,6 +2,10 @@
     Description of the tables, their columns/indices/for.keys.
 """
 
+from ostracion_app.utilities.database.sqliteEngine import (
+    precomputeTablesColumns,
+)
+
 dbSchema = {
     'users': {
         'primary_key': [
@@ -43,9 +47,9 @@ dbSchema = {
             ('icon_file_id_username', 'TEXT'),
             ('icon_mime_type', 'TEXT'),
             #
-            ('dvector_box_name', 'TEXT'),
-            ('dvector_title', 'TEXT'),
-            ('dvector_description', 'TEXT'),
+            ('dvector_box_name', 'BLOB'),
+            ('dvector_title', 'BLOB'),
+            ('dvector_description', 'BLOB'),
         ],
         'indices': {
             'boxes_parent_id_index': [
@@ -83,8 +87,8 @@ dbSchema = {
             ('metadata_username', 'TEXT'),
             ('editor_username', 'TEXT'),
             #
-            ('dvector_name', 'TEXT'),
-            ('dvector_description', 'TEXT'),
+            ('dvector_name', 'BLOB'),
+            ('dvector_description', 'BLOB'),
         ],
         'indices': {
             'files_box_id_index': [
@@ -121,9 +125,9 @@ dbSchema = {
             ('icon_mime_type', 'TEXT'),
             ('metadata_username', 'TEXT'),
             #
-            ('dvector_name', 'TEXT'),
-            ('dvector_title', 'TEXT'),
-            ('dvector_description', 'TEXT'),
+            ('dvector_name', 'BLOB'),
+            ('dvector_title', 'BLOB'),
+            ('dvector_description', 'BLOB'),
         ],
         'indices': {
             'links_box_id_index': [
@@ -244,6 +248,63 @@ dbSchema = {
             ('datetime',        'TIMESTAMP'),
         ],
     },
+    'generation_counters': {
+        'primary_key': [
+            ('counter_id',      'TEXT'),
+        ],
+        'columns': [
+            ('generation',      'INTEGER'),
+        ],
+    },
+    'file_derivatives': {
+        'primary_key': [
+            ('file_id',             'TEXT'),
+            ('rendition',           'TEXT'),
+        ],
+        'columns': [
+            ('derivative_file_id',  'TEXT'),
+            ('mime_type',           'TEXT'),
+            ('width',               'INTEGER'),
+            ('height',              'INTEGER'),
+            ('size',                'INTEGER'),
+        ],
+        'foreign_keys': {
+            'files': [
+                [['file_id'], ['file_id']],
+            ],
+        },
+    },
+    'thumbnail_jobs': {
+        'primary_key': [
+            ('job_id',              'TEXT'),
+        ],
+        'columns': [
+            ('file_id',             'TEXT'),
+            ('mime_type',           'TEXT'),
+            ('thumbnail_format',    'TEXT'),
+            ('status',              'TEXT'),
+            ('attempts',            'INTEGER'),
+            ('last_error',          'TEXT'),
+            ('worker_id',           'TEXT'),
+            ('creation_date',       'TIMESTAMP'),
+            ('update_date',         'TIMESTAMP'),
+        ],
+        'indices': {
+            'thumbnail_jobs_status_index': [
+                ('status', 'ASC'),
+                ('creation_date', 'ASC'),
+            ],
+        },
+    },
+    'similarity_changes': {
+        'primary_key': [
+            ('change_id',           'INTEGER'),
+        ],
+        'columns': [
+            ('table_name',          'TEXT'),
+            ('item_id',             'TEXT'),
+        ],
+    },
     # accounting app, tables
     'accounting_ledgers': {
         'primary_key': [
@@ -388,6 +449,64 @@ dbSchema = {
     },
 }
 
+# full-text (FTS5) indices on the searchable texts of boxes/files/links,
+# kept in sync by triggers: see dbCreateFullTextIndex
+# (columns come with their weight in the bm25 ranking of search results)
+fullTextIndices = {
+    'files_fts': {
+        'table': 'files',
+        'columns': [
+            ('name', 2.0),
+            ('description', 1.0),
+        ],
+    },
+    'boxes_fts': {
+        'table': 'boxes',
+        'columns': [
+            ('box_name', 2.0),
+            ('title', 2.0),
+            ('description', 1.0),
+        ],
+    },
+    'links_fts': {
+        'table': 'links',
+        'columns': [
+            ('name', 2.0),
+            ('title', 2.0),
+            ('description', 1.0),
+        ],
+    },
+}
+
+# digram vectors of boxes/files/links, held in memory by the similarity
+# search as matrices: changes are logged, by triggers,
+# in 'similarity_changes' (see dbCreateChangeLogTriggers)
+similarityTrackedTables = {
+    'files': {
+        'key': 'file_id',
+        'dvectors': [
+            'dvector_name',
+            'dvector_description',
+        ],
+    },
+    'boxes': {
+        'key': 'box_id',
+        'dvectors': [
+            'dvector_box_name',
+            'dvector_title',
+            'dvector_description',
+        ],
+    },
+    'links': {
+        'key': 'link_id',
+        'dvectors': [
+            'dvector_name',
+            'dvector_title',
+            'dvector_description',
+        ],
+    },
+}
+
 tableCreationOrderSequence = [
     'users',
     'boxes',
@@ -399,6 +518,10 @@ tableCreationOrderSequence = [
     'settings',
     'tickets',
     'attempted_logins',
+    'generation_counters',
+    'file_derivatives',
+    'thumbnail_jobs',
+    'similarity_changes',
     # accounting app
     'accounting_ledgers',
     'accounting_ledgers_users',
@@ -413,3 +536,6 @@ tableCreationOrder = {
     tN: tI
     for tI, tN in enumerate(tableCreationOrderSequence)
 }
+
+# column lists are derived from the schema once, at import time
+precomputeTablesColumns(dbSchema)
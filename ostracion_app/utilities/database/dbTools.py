@@ -1,17 +1,110 @@
 """ dbTools.py:
     Machinery to open the application database
+
+    Within a request, the connection is kept on flask.g and handed
+    out to all callers; at teardown it goes back to a small
+    per-process pool, ready for the next request.
+
+    Requests which only read (see dbDeclareRequestReadOnly) can,
+    if so configured, be given read-only connections, pooled separately.
 """
 
+import threading
+
+from flask import (
+    g,
+    has_app_context,
+)
+
 from ostracion_app.utilities.database.sqliteEngine import (
     dbOpenDatabase,
+    SqliteError,
 )
 from ostracion_app.utilities.database.dbSchema import (
     dbSchema,
 )
 
-from config import dbFullName
+from config import (
+    dbFullName,
+    dbReuseConnectionPerRequest,
+    dbConnectionPoolSize,
+    dbOpenPragmas,
+    dbReadOnlyConnectionsForGet,
+)
+
+# idle connections, ready to be picked up by the next request
+# (separate pools for read-write and read-only connections)
+_connectionPools = {
+    False: [],
+    True: [],
+}
+_connectionPoolLock = threading.Lock()
+
+
+def _dbOpenConnection(readOnly=False, checkSameThread=True):
+    """Open a new connection with the configured open profile."""
+    return dbOpenDatabase(
+        dbFullName,
+        dbSchema,
+        checkSameThread=checkSameThread,
+        pragmas=dbOpenPragmas,
+        readOnly=readOnly,
+    )
+
+
+def _dbPickPooledConnection(readOnly):
+    """Take an idle connection from the pool, or open a new one."""
+    with _connectionPoolLock:
+        if len(_connectionPools[readOnly]) > 0:
+            return _connectionPools[readOnly].pop()
+    # pooled connections may serve requests on different threads,
+    # but only one request at a time uses any given connection
+    return _dbOpenConnection(readOnly=readOnly, checkSameThread=False)
+
+
+def dbDeclareRequestReadOnly():
+    """ Mark the current request as read-only as far as the DB goes:
+        if so configured, subsequent dbGetDatabase calls
+        will give a read-only connection.
+        Must be called before the first dbGetDatabase of the request.
+    """
+    if dbReadOnlyConnectionsForGet and '_database' not in g:
+        g._databaseReadOnly = True
 
 
 def dbGetDatabase():
-    """Give an instance of the opened database."""
-    return dbOpenDatabase(dbFullName, dbSchema)
+    """ Give an instance of the opened database.
+
+        If configured and within an app context, all calls
+        during a request get the same (pooled) connection.
+    """
+    if dbReuseConnectionPerRequest and has_app_context():
+        if '_database' not in g:
+            g._database = _dbPickPooledConnection(
+                g.get('_databaseReadOnly', False),
+            )
+        return g._database
+    else:
+        return _dbOpenConnection()
+
+
+def dbReleaseDatabase():
+    """ Give the request-scoped connection, if any, back to the pool
+        (closing it if the pool is full). Anything left uncommitted
+        is rolled back, as it would be upon closing the connection.
+    """
+    db = g.pop('_database', None)
+    readOnly = g.pop('_databaseReadOnly', False)
+    if db is not None:
+        try:
+            if db.in_transaction:
+                db.rollback()
+        except SqliteError:
+            # a connection in a bad state is not recycled
+            db.close()
+            return
+        with _connectionPoolLock:
+            if len(_connectionPools[readOnly]) < dbConnectionPoolSize:
+                _connectionPools[readOnly].append(db)
+                return
+        db.close()
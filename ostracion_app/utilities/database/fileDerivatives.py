@@ -0,0 +1,107 @@
+""" fileDerivatives.py
+    Reduced renditions of image files (the 'file_derivatives' table),
+    used to send galleries a picture suited to the screen
+    instead of the full-size original.
+
+    Renditions are named 'w<WIDTH>' (same format as the original,
+    or PNG for bitmaps), 'w<WIDTH>_webp' and 'original', the latter
+    pointing to the file itself, with its real width. (Files processed
+    before the original was always recorded may lack it: their original
+    is then wider than all renditions.)
+"""
+
+from ostracion_app.utilities.database.sqliteEngine import (
+    dbAddRecordToTable,
+    dbRetrieveRecordsByKey,
+    dbDeleteRecordsByKey,
+)
+
+from ostracion_app.utilities.database.dbSchema import (
+    dbSchema,
+)
+
+from ostracion_app.utilities.fileIO.physical import (
+    fileIdToPath,
+)
+
+
+def dbGetFileDerivatives(db, fileId):
+    """ Return the list of rendition dicts for a file, by width."""
+    return sorted(
+        dbRetrieveRecordsByKey(
+            db,
+            'file_derivatives',
+            {'file_id': fileId},
+            dbTablesDesc=dbSchema,
+        ),
+        key=lambda d: (d['width'], d['rendition']),
+    )
+
+
+def dbStoreFileDerivatives(db, fileId, derivatives, skipCommit=False):
+    """ Record the renditions made for a file (dicts as returned
+        by makeFileDerivatives, i.e. without the file_id).
+    """
+    for derivative in derivatives:
+        dbAddRecordToTable(
+            db,
+            'file_derivatives',
+            dict(derivative, file_id=fileId),
+            dbTablesDesc=dbSchema,
+        )
+    if not skipCommit:
+        db.commit()
+
+
+def dbDeleteFileDerivatives(db, fileId, fileStorageDirectory):
+    """ Remove the renditions of a file, returning the delete queue
+        of their physical files (never commits).
+    """
+    fsDeleteQueue = [
+        fileIdToPath(
+            derivative['derivative_file_id'],
+            fileStorageDirectory=fileStorageDirectory,
+        )
+        for derivative in dbGetFileDerivatives(db, fileId)
+        if derivative['derivative_file_id'] != fileId
+    ]
+    dbDeleteRecordsByKey(
+        db,
+        'file_derivatives',
+        {'file_id': fileId},
+        dbTablesDesc=dbSchema,
+    )
+    return fsDeleteQueue
+
+
+def pickFileDerivative(derivatives, width, acceptWebp=False):
+    """ Choose the rendition to send for a requested display width:
+        the narrowest one at least as wide, else the original.
+        WebP renditions are considered only if acceptWebp.
+
+        Return None if the file itself is to be sent: no renditions
+        at all, or none wide enough and no 'original' row recorded.
+    """
+    candidates = [
+        d
+        for d in derivatives
+        if acceptWebp or d['mime_type'] != 'image/webp'
+    ]
+    if len(candidates) == 0:
+        return None
+    else:
+        # among equal widths, WebP (when accepted) comes first
+        rankedCandidates = sorted(
+            candidates,
+            key=lambda d: (d['width'], d['mime_type'] != 'image/webp'),
+        )
+        wideEnough = [d for d in rankedCandidates if d['width'] >= width]
+        if len(wideEnough) > 0:
+            return wideEnough[0]
+        else:
+            originals = [
+                d
+                for d in rankedCandidates
+                if d['rendition'] == 'original'
+            ]
+            return originals[0] if len(originals) > 0 else None
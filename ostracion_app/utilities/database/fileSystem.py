@@ -9,6 +9,10 @@
     restrictions are lifted and special actions are performed.
 """
 
+import copy
+import threading
+from collections import OrderedDict
+
 from ostracion_app.utilities.models.Box import Box
 from ostracion_app.utilities.models.File import File
 from ostracion_app.utilities.models.Link import Link
@@ -20,6 +24,8 @@ from ostracion_app.utilities.tools.dictTools import (
 from ostracion_app.utilities.database.sqliteEngine import (
     dbRetrieveRecordByKey,
     dbRetrieveRecordsByKey,
+    dbRetrieveRecordPathChain,
+    dbRetrieveRecordAncestors,
     dbAddRecordToTable,
     dbDeleteRecordsByKey,
     dbUpdateRecordOnTable,
@@ -27,13 +33,24 @@ from ostracion_app.utilities.database.sqliteEngine import (
 
 from ostracion_app.utilities.database.permissions import (
     dbGetBoxRolePermissions,
-    userHasPermission,
+    dbGetBoxesRolePermissions,
+    userHasBoxPermission,
+    getPermissionEvaluator,
 )
 
 from ostracion_app.utilities.database.dbSchema import (
     dbSchema,
 )
 
+from ostracion_app.utilities.database.generationCounters import (
+    dbGetGeneration,
+    dbBumpGeneration,
+)
+
+from ostracion_app.utilities.database.fileDerivatives import (
+    dbDeleteFileDerivatives,
+)
+
 from ostracion_app.utilities.fileIO.physical import (
     fileIdToPath,
     flushFsDeleteQueue,
@@ -44,6 +61,17 @@ from ostracion_app.utilities.exceptions.exceptions import (
     OstracionError,
 )
 
+from config import (
+    boxPathCacheSize,
+)
+
+# in-process LRU cache of resolved boxes (with their permission layers):
+#   path tuple -> (boxes generation, Box or None)
+# entries are valid as long as the 'boxes' generation counter on DB
+# (bumped by any write to boxes or their permissions) is unchanged
+_boxPathCache = OrderedDict()
+_boxPathCacheLock = threading.Lock()
+
 
 def splitPathString(ps):
     """ Split a path from a string to an array,
@@ -61,40 +89,41 @@ def getBoxesFromParent(db, parentBox, user, accountDeletionInProgress=False):
         if boxes are not accessible, None's are returned instead
         (which is important for some callers as it tells them
         the parentBox has indeed sub-boxes, albeit invisible to user).
+
+        The permission layers of all children are read with one query.
     """
-    for boxDict in dbRetrieveRecordsByKey(
+    childBoxDicts = list(dbRetrieveRecordsByKey(
         db,
         'boxes',
         {'parent_id': parentBox.box_id},
         dbTablesDesc=dbSchema,
+    ))
+    if accountDeletionInProgress or userHasBoxPermission(
+            db,
+            user,
+            parentBox,
+            'r',
     ):
-        #
-        newPermissionLayer = list(
-            dbGetBoxRolePermissions(db, boxDict['box_id'])
+        permissionMap = dbGetBoxesRolePermissions(
+            db,
+            (boxDict['box_id'] for boxDict in childBoxDicts),
         )
-        if accountDeletionInProgress or userHasPermission(
-                db,
-                user,
-                parentBox.permissions,
-                'r',
-        ):
+        evaluator = getPermissionEvaluator(db, user)
+        for boxDict in childBoxDicts:
             thisBox = Box(**boxDict)
             thisBox.updatePermissionData(
                 fromBox=parentBox,
-                lastPermissionLayer=newPermissionLayer,
+                lastPermissionLayer=permissionMap[thisBox.box_id],
             )
-            if accountDeletionInProgress or userHasPermission(
-                    db,
-                    user,
-                    thisBox.permissions,
-                    'r',
-            ):
+            if (accountDeletionInProgress or
+                    evaluator.boxHasPermission(thisBox, 'r')):
                 yield thisBox
             else:
                 yield None
-        else:
-            # the mere existence of not-visible-at-all boxes
-            # must be reported, e.g. for the deletebox chain of calls
+    else:
+        # the mere existence of not-visible-at-all boxes
+        # must be reported, e.g. for the deletebox chain of calls
+        for boxDict in childBoxDicts:
             yield None
 
 
@@ -117,31 +146,124 @@ def getRootBox(db):
     return thisBox
 
 
-def getBoxFromParentChain(db, path, parentBox):
-    """ Given a path and a box to start with,
-        the box identified by the path is returned,
-        with all its permissions set along the way.
+def getBoxChainFromPath(db, path):
+    """ Given a path (a list of box names, as in getBoxFromPath),
+        return the box it identifies, with all its permissions set along
+        the way - or None if there is no such box.
+
+        The whole chain of boxes is read with a single recursive query,
+        all of their permission layers with a second one.
     """
-    subBoxDict = dbRetrieveRecordByKey(
+    boxDicts = dbRetrieveRecordPathChain(
         db,
         'boxes',
-        {'box_name': path[0], 'parent_id': parentBox.box_id},
+        'box_id',
+        'parent_id',
+        'box_name',
+        '',
+        path,
         dbTablesDesc=dbSchema,
     )
-    if subBoxDict is None:
+    if len(boxDicts) < len(path) + 1:
         return None
     else:
-        subPath = path[1:]
-        subBox = Box(**subBoxDict)
-        thisBoxPermissions = list(dbGetBoxRolePermissions(db, subBox.box_id))
-        subBox.updatePermissionData(
-            fromBox=parentBox,
-            lastPermissionLayer=thisBoxPermissions,
+        permissionMap = dbGetBoxesRolePermissions(
+            db,
+            (boxDict['box_id'] for boxDict in boxDicts),
         )
-        if len(subPath) < 1:
-            return subBox
-        else:
-            return getBoxFromParentChain(db, subPath, subBox)
+        #
+        rootBox = Box(**boxDicts[0])
+        rootBoxPermissions = permissionMap[rootBox.box_id]
+        rootBox.setPermissionData(
+            permissions=rootBoxPermissions,
+            permissionHistory=[rootBoxPermissions],
+            lastPermissionLayer=rootBoxPermissions,
+        )
+        thisBox = rootBox
+        for subBoxDict in boxDicts[1:]:
+            subBox = Box(**subBoxDict)
+            subBox.updatePermissionData(
+                fromBox=thisBox,
+                lastPermissionLayer=permissionMap[subBox.box_id],
+            )
+            thisBox = subBox
+        return thisBox
+
+
+def getBoxesWithAncestors(db, boxIds):
+    """ Given some box ids, return a map box_id -> Box for those boxes
+        and all their ancestors up to root, each with its permissions set
+        (as getBoxChainFromPath would do, but without repeating the work
+        for ancestors shared by several boxes).
+
+        All boxes are read with a single recursive query, all of their
+        permission layers with a second one. Boxes not found are
+        missing from the map. No user permissions are checked here.
+    """
+    boxDictMap = dbRetrieveRecordAncestors(
+        db,
+        'boxes',
+        'box_id',
+        'parent_id',
+        boxIds,
+        dbTablesDesc=dbSchema,
+    )
+    permissionMap = dbGetBoxesRolePermissions(db, boxDictMap.keys())
+    boxMap = {}
+    for boxId in boxDictMap.keys():
+        # walk up to the first box already done (or to root),
+        # then set permissions going down again
+        pendingIds = []
+        thisId = boxId
+        while thisId not in boxMap and thisId in boxDictMap:
+            pendingIds.append(thisId)
+            if thisId == '':
+                break
+            thisId = boxDictMap[thisId]['parent_id']
+        for pendingId in reversed(pendingIds):
+            thisBox = Box(**boxDictMap[pendingId])
+            if pendingId == '':
+                thisBox.setPermissionData(
+                    permissions=permissionMap[pendingId],
+                    permissionHistory=[permissionMap[pendingId]],
+                    lastPermissionLayer=permissionMap[pendingId],
+                )
+            elif thisBox.parent_id in boxMap:
+                thisBox.updatePermissionData(
+                    fromBox=boxMap[thisBox.parent_id],
+                    lastPermissionLayer=permissionMap[pendingId],
+                )
+            else:
+                # an orphan box: not reachable from root
+                break
+            boxMap[pendingId] = thisBox
+    return boxMap
+
+
+def getCachedBoxChainFromPath(db, path):
+    """ Same as getBoxChainFromPath, but going through the box-path
+        cache. The returned box is a copy of the cached one.
+    """
+    if boxPathCacheSize <= 0:
+        return getBoxChainFromPath(db, path)
+    else:
+        pathKey = tuple(path)
+        generation = dbGetGeneration(db, 'boxes')
+        with _boxPathCacheLock:
+            cachedItem = _boxPathCache.get(pathKey)
+            if cachedItem is not None and cachedItem[0] == generation:
+                _boxPathCache.move_to_end(pathKey)
+                return copy.copy(cachedItem[1])
+        #
+        thisBox = getBoxChainFromPath(db, path)
+        # boxes read within a not-yet-committed transaction are not cached
+        if not db.in_transaction:
+            with _boxPathCacheLock:
+                _boxPathCache[pathKey] = (generation, thisBox)
+                _boxPathCache.move_to_end(pathKey)
+                while len(_boxPathCache) > boxPathCacheSize:
+                    _boxPathCache.popitem(last=False)
+        return copy.copy(thisBox)
 
 
 def getBoxFromPath(db, path, user, accountDeletionInProgress=False):
@@ -156,19 +278,14 @@ def getBoxFromPath(db, path, user, accountDeletionInProgress=False):
         permissions for the sake of reaching, and then erasing/amending,
         all traces of a user who is about to be deleted.
     """
-    rootBox = getRootBox(db)
     if len(path) < 1:
-        return rootBox
+        return getRootBox(db)
     else:
-        childBox = getBoxFromParentChain(
-            db,
-            path,
-            parentBox=rootBox,
-        )
+        childBox = getCachedBoxChainFromPath(db, path)
         if childBox is not None:
             if (
                 accountDeletionInProgress or
-                    userHasPermission(db, user, childBox.permissions, 'r')):
+                    userHasBoxPermission(db, user, childBox, 'r')):
                 return childBox
             else:
                 return None
@@ -270,7 +387,7 @@ def makeBoxInParent(db, parentBox, newBox, user, skipCommit=False):
         on behalf of 'user'. Does all permission/name availability checks.
     """
     # first we check user has permission to create boxes here
-    if not userHasPermission(db, user, parentBox.permissions, 'c'):
+    if not userHasBoxPermission(db, user, parentBox, 'c'):
         raise OstracionError('User is not allowed to create boxes')
     else:
         # then we check there are no children with same name in the parent
@@ -282,6 +399,7 @@ def makeBoxInParent(db, parentBox, newBox, user, skipCommit=False):
                 newBox.asDict(),
                 dbTablesDesc=dbSchema,
             )
+            dbBumpGeneration(db, 'boxes')
             if not skipCommit:
                 db.commit()
         else:
@@ -311,7 +429,7 @@ def updateBox(
     else:
         if (
                 not accountDeletionInProgress and
-                not userHasPermission(db, user, prevBox.permissions, 'w')):
+                not userHasBoxPermission(db, user, prevBox, 'w')):
             raise OstracionError('User is not allowed to edit box')
         else:
             if not isNameUnderParentBox(
@@ -334,6 +452,7 @@ def updateBox(
                     newBoxItem.asDict(),
                     dbTablesDesc=dbSchema,
                 )
+                dbBumpGeneration(db, 'boxes')
                 if not skipCommit:
                     db.commit()
             else:
@@ -363,7 +482,7 @@ def updateFile(
         raise RuntimeError('File ID mismatch')
     else:
         if (not accountDeletionInProgress and
-                not userHasPermission(db, user, parentBox.permissions, 'w')):
+                not userHasBoxPermission(db, user, parentBox, 'w')):
             raise OstracionError('User is not allowed to edit file')
         else:
             if not isNameUnderParentBox(
@@ -515,8 +634,8 @@ def _recursiveBoxDeletion(
     else:
         if (accountDeletionInProgress or
                 (
-                    userHasPermission(db, user, box.permissions, 'w') and
-                    userHasPermission(db, user, parentBox.permissions, 'c')
+                    userHasBoxPermission(db, user, box, 'w') and
+                    userHasBoxPermission(db, user, parentBox, 'c')
                 )):
             fsDeleteQueue = ([fileIdToPath(
                 box.icon_file_id,
@@ -546,6 +665,7 @@ def _recursiveBoxDeletion(
             dbDeleteRecordsByKey(
                 db, 'boxes', {'box_id': box.box_id},
                 dbTablesDesc=dbSchema)
+            dbBumpGeneration(db, 'boxes')
             return fsDeleteQueue
         else:
             raise OstracionError('User is not allowed to delete box')
@@ -561,8 +681,8 @@ def canDeleteBox(db, box, parentBox, user):
         return False
     else:
         return all([
-            userHasPermission(db, user, box.permissions, 'w'),
-            userHasPermission(db, user, parentBox.permissions, 'c')
+            userHasBoxPermission(db, user, box, 'w'),
+            userHasBoxPermission(db, user, parentBox, 'c')
         ]) and all([
             cBox is not None and canDeleteBox(db, cBox, box, user)
             for cBox in getBoxesFromParent(db, box, user)
@@ -602,7 +722,7 @@ def deleteFile(
         Returns the filesystem delete queue.
     """
     if (accountDeletionInProgress or
-            userHasPermission(db, user, parentBox.permissions, 'w')):
+            userHasBoxPermission(db, user, parentBox, 'w')):
         #
         fsDeleteQueue = [
             fileIdToPath(
@@ -617,6 +737,10 @@ def deleteFile(
                 )
             ]
             if file.icon_file_id != '' else []
+        ) + dbDeleteFileDerivatives(
+            db,
+            file.file_id,
+            fileStorageDirectory=fileStorageDirectory,
         )
         dbDeleteRecordsByKey(
             db,
@@ -631,7 +755,7 @@ def deleteFile(
         raise OstracionError('User has no write permission')
 
 
-def makeFileInParent(db, parentBox, newFile):
+def makeFileInParent(db, parentBox, newFile, skipCommit=False):
     """ Create a file object in a box."""
     if newFile.box_id != parentBox.box_id:
         raise RuntimeError('wrong parent box id in makeFileInParent')
@@ -643,7 +767,8 @@ def makeFileInParent(db, parentBox, newFile):
                 newFile.asDict(),
                 dbTablesDesc=dbSchema,
             )
-            db.commit()
+            if not skipCommit:
+                db.commit()
         else:
             raise OstracionError('Name already exists')
 
@@ -671,7 +796,7 @@ def updateLink(
         raise RuntimeError('Link ID mismatch')
     else:
         if (not accountDeletionInProgress and
-                not userHasPermission(db, user, parentBox.permissions, 'w')):
+                not userHasBoxPermission(db, user, parentBox, 'w')):
             raise OstracionError('User is not allowed to edit link')
         else:
             if not isNameUnderParentBox(
@@ -708,7 +833,7 @@ def deleteLink(
         Returns the filesystem delete queue.
     """
     if (accountDeletionInProgress or
-            userHasPermission(db, user, parentBox.permissions, 'w')):
+            userHasBoxPermission(db, user, parentBox, 'w')):
         #
         fsDeleteQueue = (
             [
@@ -740,7 +865,7 @@ def makeLinkInParent(
         Return a dummy value (True upon success, but it is the errors
         that are raised.)
     """
-    if userHasPermission(db, user, parentBox.permissions, 'w'):
+    if userHasBoxPermission(db, user, parentBox, 'w'):
         if not isNameUnderParentBox(db, parentBox, linkName):
             userName = user.username
             newLink = Link(
@@ -884,6 +1009,7 @@ def updateBoxThumbnail(
         box.asDict(),
         dbTablesDesc=dbSchema,
     )
+    dbBumpGeneration(db, 'boxes')
     #
     if not skipCommit:
         db.commit()
@@ -902,8 +1028,8 @@ def moveFile(
         raise OstracionError('Source and destination are the same')
     else:
         if all([
-            userHasPermission(db, user, srcBox.permissions, 'w'),
-            userHasPermission(db, user, dstBox.permissions, 'w'),
+            userHasBoxPermission(db, user, srcBox, 'w'),
+            userHasBoxPermission(db, user, dstBox, 'w'),
         ]):
             #
             fileName = file.name
@@ -960,8 +1086,8 @@ def moveBox(db, box, srcBox, dstBox, user, skipCommit=False):
                     )
                 else:
                     if not all(
-                            userHasPermission(
-                                db, user, dstBox.permissions, prm
+                            userHasBoxPermission(
+                                db, user, dstBox, prm
                             )
                             for prm in {'w', 'c'}):
                         # must be able to upload and create to dest
@@ -994,6 +1120,7 @@ def moveBox(db, box, srcBox, dstBox, user, skipCommit=False):
                                     newBox,
                                     dbTablesDesc=dbSchema,
                                 )
+                                dbBumpGeneration(db, 'boxes')
                                 #
                                 if not skipCommit:
                                     db.commit()
@@ -1012,8 +1139,8 @@ def moveLink(
         raise OstracionError('Source and destination are the same')
     else:
         if all([
-            userHasPermission(db, user, srcBox.permissions, 'w'),
-            userHasPermission(db, user, dstBox.permissions, 'w'),
+            userHasBoxPermission(db, user, srcBox, 'w'),
+            userHasBoxPermission(db, user, dstBox, 'w'),
         ]):
             #
             linkName = link.name
@@ -1,6 +1,7 @@
 """ findEngines.py
     basic functions to perform searches in boxes/files tables,
-    with substring, similarity and other engines to perform search.
+    with substring, similarity, full-text and other engines
+    to perform search.
 """
 
 import re
@@ -11,10 +12,19 @@ from ostracion_app.utilities.models.Link import Link
 
 from ostracion_app.utilities.database.dbSchema import (
     dbSchema,
+    fullTextIndices,
+    similarityTrackedTables,
 )
 from ostracion_app.utilities.database.sqliteEngine import (
     dbRetrieveRecordsByKey,
+    dbRetrieveRecordsByKeyIn,
     dbRetrieveAllRecords,
+    dbFullTextSearchRecords,
+    dbTableExists,
+)
+from ostracion_app.utilities.database.similarityIndex import (
+    isSimilarityIndexUsable,
+    dbSimilarityTopItems,
 )
 
 from ostracion_app.utilities.tools.formatting import (
@@ -29,6 +39,11 @@ from ostracion_app.utilities.textSimilarity.similarityTools import (
 
 from config import similarityScoreThreshold
 
+# a double-quoted phrase or a bare word in a full-text search term
+_fullTextTokenRegex = re.compile(r'"([^"]*)"|([^\s"]+)')
+# tokens with no letters/digits at all are not searchable
+_searchableTokenRegex = re.compile(r'\w')
+
 
 def escapeForSqlite(term):
     """ Escape chars for the SQLITE "like" query."""
@@ -451,3 +466,191 @@ def explicitLoopSimilaritySearch(
             'links': [],
             'message': 'Not enough digits/letters in search term',
         }
+
+
+def matrixSimilaritySearch(
+        db,
+        searchTerm,
+        searchBoxes=True,
+        searchFiles=True,
+        searchLinks=True,
+        useDescription=False):
+    """ Same search as 'explicitLoopSimilaritySearch', with the scores
+        computed all at once on the in-memory similarity matrices
+        (see similarityIndex.py), only the matching records being
+        then read from DB.
+
+        Same return object as 'sqliteLikeSubstringSearch'.
+
+        Without NumPy/SciPy (or before postInstall creates the change log)
+        this falls back to 'explicitLoopSimilaritySearch'.
+    """
+    if not isSimilarityIndexUsable(db):
+        return explicitLoopSimilaritySearch(
+            db,
+            searchTerm,
+            searchBoxes=searchBoxes,
+            searchFiles=searchFiles,
+            searchLinks=searchLinks,
+            useDescription=useDescription,
+        )
+    #
+    searchTermDVector = textToDVector(searchTerm)
+    if len(searchTermDVector) > 0:
+        results = {
+            'files': [],
+            'boxes': [],
+            'links': [],
+        }
+        for objType, isSearched, modelClass in [
+                ('files', searchFiles, File),
+                ('boxes', searchBoxes, Box),
+                ('links', searchLinks, Link)]:
+            if isSearched:
+                tableDesc = similarityTrackedTables[objType]
+                itemScores = dict(dbSimilarityTopItems(
+                    db,
+                    objType,
+                    searchTermDVector,
+                    [
+                        dvColumn
+                        for dvColumn in tableDesc['dvectors']
+                        if useDescription or (
+                            dvColumn != 'dvector_description'
+                        )
+                    ],
+                    similarityScoreThreshold,
+                ))
+                results[objType] = [
+                    {
+                        'item': modelClass(**recordDict),
+                        'score': itemScores[recordDict[tableDesc['key']]],
+                    }
+                    for recordDict in dbRetrieveRecordsByKeyIn(
+                        db,
+                        objType,
+                        tableDesc['key'],
+                        itemScores.keys(),
+                        dbTablesDesc=dbSchema,
+                    )
+                ]
+        return results
+    else:
+        return {
+            'files': [],
+            'boxes': [],
+            'links': [],
+            'message': 'Not enough digits/letters in search term',
+        }
+
+
+def _makeFullTextMatchExpression(searchTerm, targetColumns):
+    """ Turn a search term into an FTS5 'MATCH' expression: all words
+        must be found, as (case-insensitive) prefixes of a word,
+        while "double-quoted" parts are to be found as exact phrases.
+
+        If targetColumns (a list) is given, matches are restricted
+        to those columns.
+
+        Return None if there is nothing to search.
+    """
+    phrases = []
+    for quotedPart, bareWord in _fullTextTokenRegex.findall(searchTerm):
+        if quotedPart != '':
+            if _searchableTokenRegex.search(quotedPart):
+                phrases.append('"%s"' % quotedPart)
+        elif _searchableTokenRegex.search(bareWord):
+            phrases.append('"%s"*' % bareWord)
+    if len(phrases) > 0:
+        if targetColumns is not None:
+            columnFilter = '{%s} : ' % ' '.join(targetColumns)
+        else:
+            columnFilter = ''
+        return ' AND '.join(
+            '%s%s' % (columnFilter, phrase)
+            for phrase in phrases
+        )
+    else:
+        return None
+
+
+def fullTextSearch(
+        db,
+        searchTerm,
+        searchBoxes=True,
+        searchFiles=True,
+        searchLinks=True,
+        useDescription=False):
+    """ Search files/boxes/links through the full-text indices
+        (see 'fullTextIndices' in dbSchema), matching word prefixes
+        and "quoted phrases" regardless of case and diacritics,
+        with results scored with the bm25 ranking function.
+
+        Same return object as 'sqliteLikeSubstringSearch'.
+
+        Should the indices be missing (i.e. postInstall has not been
+        run yet), a case-insensitive substring search is done instead.
+    """
+    searchedTypes = [
+        (objType, modelClass, indexName)
+        for objType, isSearched, modelClass, indexName in [
+            ('files', searchFiles, File, 'files_fts'),
+            ('boxes', searchBoxes, Box, 'boxes_fts'),
+            ('links', searchLinks, Link, 'links_fts'),
+        ]
+        if isSearched
+    ]
+    if not all(
+            dbTableExists(db, indexName)
+            for _, _, indexName in searchedTypes):
+        return explicitLoopSubstringSearch(
+            db,
+            searchTerm,
+            searchBoxes=searchBoxes,
+            searchFiles=searchFiles,
+            searchLinks=searchLinks,
+            caseSensitive=False,
+            useDescription=useDescription,
+        )
+    #
+    if _makeFullTextMatchExpression(searchTerm, None) is None:
+        return {
+            'files': [],
+            'boxes': [],
+            'links': [],
+            'message': 'No search terms provided',
+        }
+    results = {
+        'files': [],
+        'boxes': [],
+        'links': [],
+    }
+    for objType, modelClass, indexName in searchedTypes:
+        indexDesc = fullTextIndices[indexName]
+        if useDescription:
+            targetColumns = None
+        else:
+            targetColumns = [
+                colPair[0]
+                for colPair in indexDesc['columns']
+                if colPair[0] != 'description'
+            ]
+        matchExpression = _makeFullTextMatchExpression(
+            searchTerm,
+            targetColumns,
+        )
+        results[objType] = [
+            {
+                'item': modelClass(**recordDict),
+                'score': score,
+            }
+            for recordDict, score in dbFullTextSearchRecords(
+                db,
+                indexName,
+                indexDesc,
+                matchExpression,
+                dbTablesDesc=dbSchema,
+            )
+            if objType != 'boxes' or recordDict['box_id'] != ''
+        ]
+    return results
@@ -1,20 +1,24 @@
 """ findTools.py
     Tools which make use of findEngines.py and offer to the caller
     an unified interface for performing DB searches for files/boxes.
+
+    Results can be asked for one page at a time: the items found are
+    arranged in a heap by their sort key and popped only until the page
+    is filled with items the user can see. Only those are enriched
+    for display; a continuation token leads to the next page.
 """
 
-from ostracion_app.utilities.database.sqliteEngine import (
-    dbRetrieveRecordByKey,
-)
+import json
+import heapq
+import base64
+import hashlib
 
-from ostracion_app.utilities.database.dbSchema import (
-    dbSchema,
+from ostracion_app.utilities.database.fileSystem import (
+    getBoxesWithAncestors,
 )
 
-from ostracion_app.utilities.database.fileSystem import (
-    getBoxFromPath,
-    getFileFromParent,
-    getLinkFromParent,
+from ostracion_app.utilities.database.permissions import (
+    userHasBoxPermission,
 )
 
 from ostracion_app.utilities.tools.formatting import (
@@ -29,13 +33,15 @@ from ostracion_app.utilities.viewTools.pathTools import (
     prepareFileInfo,
     prepareLinkInfo,
     prepareBoxInfo,
+    preloadItemInfoActors,
     describeBoxTitle,
 )
 
 from ostracion_app.utilities.database.findEngines import (
     sqliteLikeSubstringSearch,
     explicitLoopSubstringSearch,
-    explicitLoopSimilaritySearch,
+    matrixSimilaritySearch,
+    fullTextSearch,
 )
 
 from ostracion_app.utilities.tools.setNaming import (
@@ -43,32 +49,60 @@ from ostracion_app.utilities.tools.setNaming import (
     pickSingularPluralSentences,
 )
 
-# used by _searchResultSorterKey
+from config import (
+    searchPermissionBatchSize,
+)
+
+# used by _searchCandidateSorterKey
 _sortPriorityByObjectTypeMap = {
     'file': 1,
     'link': 2,
     'box': 3,
 }
 
+# used to tell the items apart in the sort keys
+_idFieldByObjectTypeMap = {
+    'file': 'file_id',
+    'link': 'link_id',
+    'box': 'box_id',
+}
+
 
-def fsFind(db, searchTerm, user, options={}):
+def fsFind(db, searchTerm, user, options={}, pageSize=None,
+           continuation=None):
     """ Perform a fs search and return an  object
         fully describing the results
 
         Options is a map with the following possible keys
             options={
-                'mode':     'sub_cs'/'sub_ci'/sim_ci'    DEF 'sub_cs',
-                    ( = substring/similarity, case in/sensitive)
+                'mode':     'sub_cs'/'sub_ci'/sim_ci'/'fts_ci'  DEF 'sub_cs',
+                    ( = substring/similarity, case in/sensitive,
+                        or full-text on the FTS5 index)
                 'searchBoxes':      BOOL        DEF True,
                 'searchFiles':      BOOL        DEF True,
                 'useDescription':   BOOL        DEF False,
             }
+
+        With a pageSize, only (at most) that many results are returned,
+        starting after the 'continuation' token given with the previous
+        page (if any). Counts are then estimated, unless all items
+        found had to be examined anyway ('approximate' tells).
     """
 
     searchMode = options.get('mode', 'sub_cs')
     searchSimilarity = searchMode == 'sim_ci'
+    searchFullText = searchMode == 'fts_ci'
     if searchSimilarity:
-        fEngineResults = explicitLoopSimilaritySearch(
+        fEngineResults = matrixSimilaritySearch(
+            db,
+            searchTerm=searchTerm,
+            searchBoxes=options.get('searchBoxes', True),
+            searchFiles=options.get('searchFiles', True),
+            searchLinks=options.get('searchLinks', True),
+            useDescription=options.get('useDescription', False),
+        )
+    elif searchFullText:
+        fEngineResults = fullTextSearch(
             db,
             searchTerm=searchTerm,
             searchBoxes=options.get('searchBoxes', True),
@@ -98,198 +132,299 @@ def fsFind(db, searchTerm, user, options={}):
     #     searchLinks=options.get('searchLinks', True),
     # )
 
-    # we re-marshal the found items with a common enrich/equip/sort logic
-    foundFiles = [
-        fi
-        for fi in (
-            _resolveUponPermissions(
-                db,
-                _reduceFileToPath(db, fs['item']),
-                user,
-                'file',
-                fs['score'],
-            )
-            for fs in fEngineResults['files']
-        )
-        if fi is not None
-    ]
-    foundBoxes = [
-        bo
-        for bo in (
-            _resolveUponPermissions(
-                db,
-                _reduceBoxToPath(db, bs['item']),
-                user,
-                'box',
-                bs['score'],
-            )
-            for bs in fEngineResults['boxes']
+    # all items found, as (sortKey, objectType, item, score)
+    candidates = [
+        (
+            _searchCandidateSorterKey(objectType, fItem['item'],
+                                      fItem['score']),
+            objectType,
+            fItem['item'],
+            fItem['score'],
         )
-        if bo is not None
+        for objectType, resultsKey in [
+            ('file', 'files'),
+            ('box', 'boxes'),
+            ('link', 'links'),
+        ]
+        for fItem in fEngineResults[resultsKey]
     ]
-    foundLinks = [
-        li
-        for li in (
-            _resolveUponPermissions(
-                db,
-                _reduceLinkToPath(db, ls['item']),
-                user,
-                'link',
-                ls['score'],
-            )
-            for ls in fEngineResults['links']
+    queryDigest = _searchQueryDigest(searchTerm, options)
+    tokenData = _parseContinuationToken(continuation, queryDigest)
+    if tokenData is not None:
+        startKey, firstIndex = tokenData
+        heap = [cand for cand in candidates if cand[0] > startKey]
+    else:
+        firstIndex = 0
+        heap = candidates[:]
+    # the heap is popped only as far as needed to fill the page
+    # (plus one visible item, to know whether there are more)
+    heapq.heapify(heap)
+    resolver = _SearchHitResolver(db, user)
+    visibleHits = []
+    examinedCounts = {'file': 0, 'box': 0, 'link': 0}
+    while len(heap) > 0 and (pageSize is None or
+                             len(visibleHits) <= pageSize):
+        if pageSize is None:
+            batch = sorted(heap)
+            heap = []
+        else:
+            batch = [
+                heapq.heappop(heap)
+                for _ in range(min(
+                    len(heap),
+                    max(pageSize + 1 - len(visibleHits),
+                        searchPermissionBatchSize),
+                ))
+            ]
+        for cand in batch:
+            examinedCounts[cand[1]] += 1
+        resolver.loadBoxes(cand[2].box_id for cand in batch)
+        visibleHits += [
+            cand
+            for cand in batch
+            if resolver.isVisible(cand[1], cand[2])
+        ]
+    if pageSize is not None and len(visibleHits) > pageSize:
+        pageHits = visibleHits[:pageSize]
+        nextContinuation = _makeContinuationToken(
+            pageHits[-1][0],
+            firstIndex + len(pageHits),
+            queryDigest,
         )
-        if li is not None
-    ]
-    foundItems = sorted(
-        foundFiles + foundBoxes + foundLinks,
-        key=_searchResultSorterKey,
+    else:
+        pageHits = visibleHits
+        nextContinuation = None
+    # the items not examined are assumed to be
+    # as visible as the examined ones
+    numExamined = sum(examinedCounts.values())
+    visibleRatio = (
+        len(visibleHits) / numExamined
+        if numExamined > 0
+        else 1.0
     )
+    foundCounts = {}
+    for objectType, resultsKey in [
+        ('file', 'files'),
+        ('box', 'boxes'),
+        ('link', 'links'),
+    ]:
+        foundCounts[resultsKey] = sum(
+            1
+            for cand in visibleHits
+            if cand[1] == objectType
+        ) + int(round(
+            visibleRatio * (
+                len(fEngineResults[resultsKey]) - examinedCounts[objectType]
+            )
+        ))
+    #
+    preloadItemInfoActors(db, [cand[2] for cand in pageHits])
     return {
-        'counts': {
-            'files': len(foundFiles),
-            'boxes': len(foundBoxes),
-            'links': len(foundLinks),
-        },
-        'results': foundItems,
+        'counts': foundCounts,
+        'total': sum(foundCounts.values()),
+        'approximate': numExamined < len(candidates),
+        'first_index': firstIndex,
+        'results': [
+            resolver.describeHit(objectType, item, score)
+            for _, objectType, item, score in pageHits
+        ],
+        'continuation': nextContinuation,
         'message': fEngineResults.get('message'),
     }
 
 
-def _searchResultSorterKey(fItem):
-    """ Give a triple used to sort search result, regardless of
-        search mode and details."""
-    if fItem['object_type'] == 'box':
-        lowerTitle = fItem['box'].title
-    elif fItem['object_type'] == 'file':
-        lowerTitle = fItem['file'].name.lower()
-    elif fItem['object_type'] == 'link':
-        lowerTitle = fItem['link'].name.lower()
+def _searchCandidateSorterKey(objectType, item, score):
+    """ Give a tuple used to sort search results, regardless of
+        search mode and details. Each item has a different key,
+        so that a key tells exactly where a page ends.
+    """
+    if objectType == 'box':
+        lowerTitle = item.title
+    elif objectType == 'file':
+        lowerTitle = item.name.lower()
+    elif objectType == 'link':
+        lowerTitle = item.name.lower()
     else:
         raise NotImplementedError('unknown object_type')
     #
     return (
-        -fItem['score'],
+        -score,
         lowerTitle,
-        -_sortPriorityByObjectTypeMap.get(fItem['object_type'], 0),
+        -_sortPriorityByObjectTypeMap.get(objectType, 0),
+        getattr(item, _idFieldByObjectTypeMap[objectType]),
     )
 
 
-def _resolveUponPermissions(db, richObject, user, mode, score):
-    """ Verify and validate the input (rich-)box/file
-        against permissions, and return either a similar structure
-        or a None if permissions turn out to be blocking.
+def _searchQueryDigest(searchTerm, options):
+    """ A short fingerprint of a search, so that continuation tokens
+        are not applied to a different one.
+    """
+    return hashlib.sha256(
+        json.dumps([searchTerm, options], sort_keys=True).encode()
+    ).hexdigest()[:16]
 
-        (
-            richObject has keys "path" and "box/file",
-            mode = 'file' / 'box'
+
+def _makeContinuationToken(lastKey, nextIndex, queryDigest):
+    """ An opaque token pointing after the last result of a page."""
+    return base64.urlsafe_b64encode(
+        json.dumps({
+            'key': lastKey,
+            'index': nextIndex,
+            'query': queryDigest,
+        }).encode()
+    ).decode()
+
+
+def _parseContinuationToken(continuation, queryDigest):
+    """ Read a continuation token back into (lastKey, nextIndex).
+        None (i.e. start from the first page) for no/invalid tokens
+        and for tokens issued for another search.
+    """
+    if not continuation:
+        return None
+    try:
+        tokenData = json.loads(
+            base64.urlsafe_b64decode(continuation.encode()).decode()
         )
+        scorePart, titlePart, priorityPart, idPart = tokenData['key']
+        if any([
+            tokenData['query'] != queryDigest,
+            not isinstance(titlePart, str),
+            not isinstance(priorityPart, int),
+            not isinstance(idPart, str),
+        ]):
+            return None
+        else:
+            return (
+                (float(scorePart), titlePart, priorityPart, idPart),
+                int(tokenData['index']),
+            )
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+class _SearchHitResolver():
+    """ Validation against permissions, and enrichment for display,
+        of the items found by a search engine.
+
+        The boxes containing the items, with all their ancestors,
+        are read in bulk (see getBoxesWithAncestors) and the
+        permissions of each are evaluated once, however many
+        items it contains. A box must be readable and in a readable
+        box to be shown, a file/link must be in a readable box.
     """
-    pBox = getBoxFromPath(db, richObject['path'][:-1], user)
-    if mode == 'box':
-        nBox = getBoxFromPath(db, richObject['path'], user)
-        if nBox is not None and pBox is not None:
+
+    def __init__(self, db, user):
+        self.db = db
+        self.user = user
+        self.boxMap = {}
+        self.boxPaths = {}
+
+    def loadBoxes(self, boxIds):
+        """ Make sure the given boxes are known, with their ancestors."""
+        missingIds = set(boxIds) - self.boxMap.keys()
+        if len(missingIds) > 0:
+            self.boxMap.update(getBoxesWithAncestors(self.db, missingIds))
+            # boxes found missing are checked again
+            self.boxPaths = {
+                boxId: boxPath
+                for boxId, boxPath in self.boxPaths.items()
+                if boxPath is not None
+            }
+
+    def boxPath(self, boxId):
+        """ The path of a (loaded) box, starting with '',
+            None if it is not reachable.
+        """
+        if boxId not in self.boxPaths:
+            if boxId == '':
+                self.boxPaths[boxId] = ['']
+            elif boxId not in self.boxMap:
+                self.boxPaths[boxId] = None
+            else:
+                parentPath = self.boxPath(self.boxMap[boxId].parent_id)
+                self.boxPaths[boxId] = (
+                    parentPath + [self.boxMap[boxId].box_name]
+                    if parentPath is not None
+                    else None
+                )
+        return self.boxPaths[boxId]
+
+    def _isBoxReadable(self, boxId):
+        return self.boxPath(boxId) is not None and userHasBoxPermission(
+            self.db,
+            self.user,
+            self.boxMap[boxId],
+            'r',
+        )
+
+    def isVisible(self, objectType, item):
+        """ Whether a found item is to be shown to the user."""
+        if not self._isBoxReadable(item.box_id):
+            return False
+        elif objectType == 'box':
+            return self._isBoxReadable(self.boxMap[item.box_id].parent_id)
+        else:
+            return True
+
+    def describeHit(self, objectType, item, score):
+        """ The rich structure describing a visible found item."""
+        db = self.db
+        user = self.user
+        if objectType == 'box':
+            nBox = self.boxMap[item.box_id]
+            pBox = self.boxMap[nBox.parent_id]
+            path = self.boxPath(nBox.box_id)
             return {
-                'path': richObject['path'][1:],
+                'path': path[1:],
                 'box': nBox,
                 'actions': prepareBoxActions(
-                    db, nBox, richObject['path'][1:],
+                    db, nBox, path[1:],
                     pBox, user, prepareParentButton=True),
                 'info': prepareBoxInfo(db, nBox),
                 'parentInfo': 'Parent box: "%s"' % (
                     describeBoxTitle(pBox),
                 ),
-                'object_type': mode,
+                'object_type': objectType,
+                'score': score,
+            }
+        elif objectType == 'file':
+            pBox = self.boxMap[item.box_id]
+            path = self.boxPath(pBox.box_id) + [item.name]
+            return {
+                'path': path[1:],
+                'file': item,
+                'actions': prepareFileActions(
+                    db, item, path[1:],
+                    pBox, user, prepareParentButton=True),
+                'info': prepareFileInfo(db, item),
+                'nice_size': formatBytesSize(item.size),
+                'parentInfo': 'Container box: "%s"' % (
+                    describeBoxTitle(pBox),
+                ),
+                'object_type': objectType,
+                'score': score,
+            }
+        elif objectType == 'link':
+            pBox = self.boxMap[item.box_id]
+            path = self.boxPath(pBox.box_id) + [item.name]
+            return {
+                'path': path[1:],
+                'link': item,
+                'actions': prepareLinkActions(
+                    db, item, path[1:],
+                    pBox, user, prepareParentButton=True),
+                'info': prepareLinkInfo(db, item),
+                'parentInfo': 'Container box: "%s"' % (
+                    describeBoxTitle(pBox),
+                ),
+                'object_type': objectType,
                 'score': score,
             }
         else:
-            return None
-    elif mode == 'file':
-        if pBox is not None:
-            nFile = getFileFromParent(db, pBox, richObject['path'][-1], user)
-            if nFile is not None:
-                return {
-                    'path': richObject['path'][1:],
-                    'file': nFile,
-                    'actions': prepareFileActions(
-                        db, nFile, richObject['path'][1:],
-                        pBox, user, prepareParentButton=True),
-                    'info': prepareFileInfo(db, nFile),
-                    'nice_size': formatBytesSize(nFile.size),
-                    'parentInfo': 'Container box: "%s"' % (
-                        describeBoxTitle(pBox),
-                    ),
-                    'object_type': mode,
-                    'score': score,
-                }
-            else:
-                return None
-        else:
-            return None
-    elif mode == 'link':
-        if pBox is not None:
-            nLink = getLinkFromParent(db, pBox, richObject['path'][-1], user)
-            if nLink is not None:
-                return {
-                    'path': richObject['path'][1:],
-                    'link': nLink,
-                    'actions': prepareLinkActions(
-                        db, nLink, richObject['path'][1:],
-                        pBox, user, prepareParentButton=True),
-                    'info': prepareLinkInfo(db, nLink),
-                    'parentInfo': 'Container box: "%s"' % (
-                        describeBoxTitle(pBox),
-                    ),
-                    'object_type': mode,
-                    'score': score,
-                }
-            else:
-                return None
-        else:
-            return None
-    else:
-        raise NotImplementedError(
-            'Unknown _resolveUponPermissions mode "%s"' % mode
-        )
-
-
-def _retraceBoxPath(db, boxId, builtPath=[]):
-    """ From a box ID rebuild the corresponding
-        path (by retracing the parent boxes all the way up to root.
-        The id of the box itself is included in the result.
-    """
-    if boxId == '':
-        return [''] + builtPath
-    else:
-        thisBox = dbRetrieveRecordByKey(
-            db, 'boxes', {'box_id': boxId},
-            dbTablesDesc=dbSchema)
-        return _retraceBoxPath(
-            db,
-            thisBox['parent_id'],
-            [thisBox['box_name']] + builtPath,
-        )
-
-
-def _reduceFileToPath(db, file):
-    """ Given a file, calculate its full path and return it in a dict."""
-    return {
-        'path': _retraceBoxPath(db, file.box_id) + [file.name],
-    }
-
-
-def _reduceLinkToPath(db, link):
-    """ Given a link, calculate its full path and return it in a dict."""
-    return {
-        'path': _retraceBoxPath(db, link.box_id) + [link.name],
-    }
-
-
-def _reduceBoxToPath(db, box):
-    """ Given a box, calculate its full path and return it in a dict."""
-    return {
-        'path': _retraceBoxPath(db, box.box_id),
-    }
+            raise NotImplementedError(
+                'Unknown object_type "%s"' % objectType
+            )
 
 
 def describeFindResults(results):
@@ -302,7 +437,10 @@ def describeFindResults(results):
         (results['counts']['links'], 'link', 'links'),
     ]
     foundParts = pickSingularPluralSentences(foundCounts, keepZeroes=False)
-    return '%s found.' % colloquialJoinClauses(foundParts)
+    if results.get('approximate', False):
+        return 'About %s found.' % colloquialJoinClauses(foundParts)
+    else:
+        return '%s found.' % colloquialJoinClauses(foundParts)
 
 
 if __name__ == '__main__':
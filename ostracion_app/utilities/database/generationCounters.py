@@ -0,0 +1,75 @@
+""" generationCounters.py
+    DB-stored generation counters, bumped by writers and checked by
+    the in-process caches, so that all worker processes notice
+    when their cached items have become stale.
+"""
+
+from flask import (
+    g,
+    has_app_context,
+)
+
+from ostracion_app.utilities.database.sqliteEngine import (
+    dbRetrieveRecordByKey,
+    dbAddRecordToTable,
+    dbIncrementRecordColumn,
+)
+
+from ostracion_app.utilities.database.dbSchema import (
+    dbSchema,
+)
+
+
+def _dbReadGeneration(db, counterId):
+    """ Read a generation counter from DB (0 if never bumped)."""
+    counterDict = dbRetrieveRecordByKey(
+        db,
+        'generation_counters',
+        {'counter_id': counterId},
+        dbTablesDesc=dbSchema,
+    )
+    if counterDict is None:
+        return 0
+    else:
+        return counterDict['generation']
+
+
+def dbGetGeneration(db, counterId):
+    """ Return the current value of a generation counter.
+
+        Within a request, the DB is queried only the first time
+        (and again after a bump).
+    """
+    if has_app_context():
+        if '_generationCounters' not in g:
+            g._generationCounters = {}
+        if counterId not in g._generationCounters:
+            g._generationCounters[counterId] = _dbReadGeneration(
+                db,
+                counterId,
+            )
+        return g._generationCounters[counterId]
+    else:
+        return _dbReadGeneration(db, counterId)
+
+
+def dbBumpGeneration(db, counterId):
+    """ Increase a generation counter by one.
+
+        Never commits: the bump is meant to be part of the transaction
+        doing the write which makes cached items stale.
+    """
+    if dbIncrementRecordColumn(
+            db,
+            'generation_counters',
+            {'counter_id': counterId},
+            'generation',
+            dbTablesDesc=dbSchema) == 0:
+        dbAddRecordToTable(
+            db,
+            'generation_counters',
+            {'counter_id': counterId, 'generation': 1},
+            dbTablesDesc=dbSchema,
+        )
+    if has_app_context() and '_generationCounters' in g:
+        g._generationCounters.pop(counterId, None)
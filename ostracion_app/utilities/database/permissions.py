@@ -10,6 +10,7 @@ from functools import wraps
 from flask import (
     g,
     abort,
+    has_app_context,
 )
 
 from ostracion_app.utilities.tools.dictTools import (
@@ -30,6 +31,7 @@ from ostracion_app.utilities.database.sqliteEngine import (
     dbRetrieveAllRecords,
     dbRetrieveRecordByKey,
     dbRetrieveRecordsByKey,
+    dbRetrieveRecordsByKeyIn,
     dbAddRecordToTable,
     dbDeleteRecordsByKey,
     dbUpdateRecordOnTable,
@@ -39,6 +41,11 @@ from ostracion_app.utilities.database.dbSchema import (
     dbSchema,
 )
 
+from ostracion_app.utilities.database.generationCounters import (
+    dbGetGeneration,
+    dbBumpGeneration,
+)
+
 from ostracion_app.utilities.tools.listTools import (
     orderPreservingUniquifyList,
 )
@@ -109,9 +116,7 @@ def generalisedGetUserRoles(db, user):
 
 def userHasRole(db, user, roleClass, roleId):
     """Check if a user has a given role."""
-    userRoles = generalisedGetUserRoles(db, user)
-    return (userRoles is not None and
-            any(r.roleKey() == (roleClass, roleId) for r in userRoles))
+    return (roleClass, roleId) in getPermissionEvaluator(db, user).roleKeys
 
 
 def userIsAdmin(db, user):
@@ -149,6 +154,7 @@ def dbDeleteRole(db, roleClass, roleId, user):
                 {'role_class': role.role_class, 'role_id': role.role_id},
                 dbTablesDesc=dbSchema,
             )
+            dbBumpGeneration(db, 'boxes')
             dbDeleteRecordsByKey(
                 db,
                 'roles',
@@ -241,6 +247,7 @@ def dbRevokeRoleFromUser(db, role, targetUser, user):
                     dbTablesDesc=dbSchema,
                 )
                 db.commit()
+                forgetPermissionEvaluators()
     else:
         raise OstracionError('Insufficient permissions')
 
@@ -268,6 +275,7 @@ def dbGrantRoleToUser(db, role, targetUser, user):
             )
             #
             db.commit()
+            forgetPermissionEvaluators()
     else:
         raise OstracionError('Insufficient permissions')
 
@@ -355,6 +363,26 @@ def dbGetBoxRolePermissions(db, boxId, asDict=False):
             yield BoxRolePermission(**brPermission)
 
 
+def dbGetBoxesRolePermissions(db, boxIds):
+    """ Get, in a single query, the permission sets of several boxes.
+        Return a dict boxId -> list of BoxRolePermission
+        (an empty list for boxes without permissions of their own).
+    """
+    boxIdSet = set(boxIds)
+    permissionMap = {boxId: [] for boxId in boxIdSet}
+    for brPermission in dbRetrieveRecordsByKeyIn(
+        db,
+        'box_role_permissions',
+        'box_id',
+        sorted(boxIdSet),
+        dbTablesDesc=dbSchema,
+    ):
+        permissionMap[brPermission['box_id']].append(
+            BoxRolePermission(**brPermission)
+        )
+    return permissionMap
+
+
 def dbInsertBoxRolePermission(db, newBoxRolePermission,
                               user, skipCommit=False):
     """Add a new permission-set (i.e. tied to a role) to a box."""
@@ -386,6 +414,7 @@ def dbInsertBoxRolePermission(db, newBoxRolePermission,
                                 newBoxRolePermission.asDict(),
                                 dbTablesDesc=dbSchema,
                             )
+                            dbBumpGeneration(db, 'boxes')
                             if not skipCommit:
                                 db.commit()
                         except Exception as e:
@@ -428,6 +457,7 @@ def dbDeleteBoxRolePermission(db, boxId, roleClass,
                         },
                         dbTablesDesc=dbSchema,
                     )
+                    dbBumpGeneration(db, 'boxes')
                     if not skipCommit:
                         db.commit()
                 except Exception as e:
@@ -482,6 +512,7 @@ def dbToggleBoxRolePermissionBit(db, thisBox, roleClass, roleId,
                         dbTablesDesc=dbSchema,
                         allowPartial=True,
                     )
+                    dbBumpGeneration(db, 'boxes')
                     if not skipCommit:
                         db.commit()
                 except Exception as e:
@@ -524,6 +555,92 @@ def updateRolePermissionsDownPath(accumulated, newLayer):
     return finalPermissions
 
 
+class PermissionEvaluator():
+    """ Evaluates permission bits on behalf of a given user.
+
+        The user's role keys are computed once; the decisions on boxes
+        are memoised by (box_id, bit), as long as the 'boxes' generation
+        counter (bumped upon any permission change) does not change.
+        Use getPermissionEvaluator to obtain the per-request instance.
+    """
+
+    def __init__(self, db, user):
+        self.db = db
+        self.roleKeys = frozenset(
+            r.roleKey()
+            for r in generalisedGetUserRoles(db, user)
+        )
+        self._boxDecisions = {}
+        self._boxesGeneration = None
+
+    def hasPermission(self, permissions, permissionBit):
+        """ Check a permission bit against a list of permission objects."""
+        return any(
+            p.booleanBit(permissionBit)
+            for p in permissions
+            if p.roleKey() in self.roleKeys
+        )
+
+    def _checkBoxesGeneration(self):
+        generation = dbGetGeneration(self.db, 'boxes')
+        if generation != self._boxesGeneration:
+            self._boxDecisions = {}
+            self._boxesGeneration = generation
+
+    def boxHasPermission(self, box, permissionBit):
+        """ Check a permission bit on a box (with its permissions set)."""
+        self._checkBoxesGeneration()
+        decisionKey = (box.box_id, permissionBit)
+        if decisionKey not in self._boxDecisions:
+            self._boxDecisions[decisionKey] = self.hasPermission(
+                box.permissions,
+                permissionBit,
+            )
+        return self._boxDecisions[decisionKey]
+
+    def evaluateBoxes(self, boxes, permissionBits='rwc'):
+        """ Evaluate at once several bits on several boxes
+            (e.g. all children in a listing).
+            Return a map box_id -> {bit: True/False}.
+        """
+        return {
+            box.box_id: {
+                permissionBit: self.boxHasPermission(box, permissionBit)
+                for permissionBit in permissionBits
+            }
+            for box in boxes
+        }
+
+
+def _evaluatorKey(user):
+    """ Identify the users sharing the same roles within a request."""
+    if user is None:
+        return None
+    else:
+        return (user.username, user.is_authenticated)
+
+
+def getPermissionEvaluator(db, user):
+    """ Return the PermissionEvaluator for a user, which is
+        created once per request (and then kept on flask.g).
+    """
+    if has_app_context():
+        if '_permissionEvaluators' not in g:
+            g._permissionEvaluators = {}
+        evKey = _evaluatorKey(user)
+        if evKey not in g._permissionEvaluators:
+            g._permissionEvaluators[evKey] = PermissionEvaluator(db, user)
+        return g._permissionEvaluators[evKey]
+    else:
+        return PermissionEvaluator(db, user)
+
+
+def forgetPermissionEvaluators():
+    """ Discard the request's evaluators (e.g. after changing user roles)."""
+    if has_app_context():
+        g.pop('_permissionEvaluators', None)
+
+
 def userHasPermission(db, user, permissions, permissionBit):
     """ Check whether a user has a certain permission bit
         (essentially by exploiting a pre-done JOIN over the user roles).
@@ -532,13 +649,20 @@ def userHasPermission(db, user, permissions, permissionBit):
         permissions:    is a list of permission objects
         permissionBit:  is in {'r','w','c'}
     """
-    userRoles = generalisedGetUserRoles(db, user)
-    roleKeySet = {r.roleKey() for r in userRoles}
-    return any((
-        p.booleanBit(permissionBit)
-        for p in permissions
-        if p.roleKey() in roleKeySet
-    ))
+    return getPermissionEvaluator(db, user).hasPermission(
+        permissions,
+        permissionBit,
+    )
+
+
+def userHasBoxPermission(db, user, box, permissionBit):
+    """ Same as userHasPermission, for the permissions of a box:
+        the result is memoised within the request.
+    """
+    return getPermissionEvaluator(db, user).boxHasPermission(
+        box,
+        permissionBit,
+    )
 
 
 def dbGetAllRoles(db, user):
@@ -17,6 +17,9 @@
 
 import os
 import json
+import time
+import threading
+from types import MappingProxyType
 
 from flask import (
     url_for,
@@ -50,6 +53,11 @@ from ostracion_app.utilities.database.dbSchema import (
     dbSchema,
 )
 
+from ostracion_app.utilities.database.generationCounters import (
+    dbGetGeneration,
+    dbBumpGeneration,
+)
+
 from ostracion_app.utilities.fileIO.physical import (
     fileIdToPath,
 )
@@ -58,6 +66,16 @@ from ostracion_app.utilities.fileIO.thumbnails import (
     determineManagedTextImagePath,
 )
 
+from config import (
+    settingsVersionCheckSeconds,
+)
+
+# process-wide snapshot of the (enriched) settings tree, shared by all
+# requests and rebuilt only when the 'settings' generation changes:
+#   {'generation': ..., 'checked': timestamp, 'tree': frozen tree}
+_settingsSnapshot = None
+_settingsSnapshotLock = threading.Lock()
+
 
 def _unrollSettingValueByType(ty, vaString):
     """Unroll (db to actual value) a setting of given type."""
@@ -199,16 +217,19 @@ def _enrichSettingObject(st):
     }
 
 
-def dbLoadAllSettings(db, user):
-    """ Load all settings and arrange them in a tree:
-            klass -> group_id -> id -> SETTING_STUFF
-        where SETTING_STUFF is the enriched form:
-            {
-                'setting': Setting object as from db
-                + more on-the-fly calculated things
-            }
-        .
-    """
+def _freezeSettingTree(tree):
+    """ Make a (nested) dict into a read-only mapping, all levels down."""
+    if isinstance(tree, dict):
+        return MappingProxyType({
+            k: _freezeSettingTree(v)
+            for k, v in tree.items()
+        })
+    else:
+        return tree
+
+
+def _dbReadAllSettings(db):
+    """ Read all settings from DB and arrange them in the enriched tree."""
     richSettingTree = {
         klass: {
             groupId: {
@@ -238,6 +259,54 @@ def dbLoadAllSettings(db, user):
     return richSettingTree
 
 
+def dbLoadAllSettings(db, user):
+    """ Load all settings and arrange them in a tree:
+            klass -> group_id -> id -> SETTING_STUFF
+        where SETTING_STUFF is the enriched form:
+            {
+                'setting': Setting object as from db
+                + more on-the-fly calculated things
+            }
+        .
+
+        The tree is a process-wide, read-only snapshot: the DB
+        is read again only when the settings generation counter changes
+        (which is checked at most every settingsVersionCheckSeconds).
+    """
+    global _settingsSnapshot
+    snapshot = _settingsSnapshot
+    now = time.time()
+    if (snapshot is not None and
+            now - snapshot['checked'] < settingsVersionCheckSeconds):
+        return snapshot['tree']
+    #
+    generation = dbGetGeneration(db, 'settings')
+    if snapshot is None or snapshot['generation'] != generation:
+        snapshot = {
+            'generation': generation,
+            'checked': now,
+            'tree': _freezeSettingTree(_dbReadAllSettings(db)),
+        }
+    else:
+        snapshot = dict(snapshot, checked=now)
+    # settings read within a not-yet-committed transaction are not kept
+    if not db.in_transaction:
+        with _settingsSnapshotLock:
+            _settingsSnapshot = snapshot
+    return snapshot['tree']
+
+
+def dbInvalidateSettingsSnapshot(db):
+    """ Make all processes reload the settings at their next check
+        (this process at its very next one). To be called, within
+        the transaction, by all writers of the settings table.
+    """
+    global _settingsSnapshot
+    dbBumpGeneration(db, 'settings')
+    with _settingsSnapshotLock:
+        _settingsSnapshot = None
+
+
 def dbGetSetting(db, sgKlass, sgId, sId, user):
     """Load a given setting and return it as enriched."""
     return _enrichSettingObject(
@@ -340,6 +409,7 @@ def updateSettingThumbnail(db, richSetting, tId, tMT, user,
         dbTablesDesc=dbSchema,
         allowPartial=True,
     )
+    dbInvalidateSettingsSnapshot(db)
     #
     if not skipCommit:
         db.commit()
@@ -417,6 +487,7 @@ def dbUpdateStandardSettingDict(db, enrichedSetting, newFormValue,
             dbTablesDesc=dbSchema,
             allowPartial=True
         )
+        dbInvalidateSettingsSnapshot(db)
         if not skipCommit:
             db.commit()
     else:
@@ -0,0 +1,189 @@
+""" similarityIndex.py
+    Process-wide similarity matrices (see similarityMatrix.py)
+    of the digram vectors of boxes, files and links, for the
+    similarity search.
+
+    The matrices are read whole from DB once, then kept up to date
+    by applying the changes logged (by triggers) in 'similarity_changes'
+    since the last one seen; a process lagging too much behind,
+    i.e. whose last seen change has been pruned from the log,
+    reads them whole again.
+"""
+
+import threading
+
+from ostracion_app.utilities.database.sqliteEngine import (
+    dbRetrieveAllRecords,
+    dbRetrieveRecordsByKey,
+    dbRetrieveRecordsByKeyIn,
+    dbTableExists,
+)
+
+from ostracion_app.utilities.database.dbSchema import (
+    dbSchema,
+    similarityTrackedTables,
+)
+
+from ostracion_app.utilities.textSimilarity.similarityMatrix import (
+    similarityMatrixAvailable,
+    DVectorMatrix,
+)
+
+# process-wide snapshot of the similarity matrices:
+#   {'last_change': change_id, 'matrices': {tableName: DVectorMatrix}}
+_similaritySnapshot = None
+_similaritySnapshotLock = threading.Lock()
+
+
+def isSimilarityIndexUsable(db):
+    """ Whether the similarity matrices can be used: NumPy/SciPy
+        are there and the DB has the change log (i.e. postInstall
+        has been run).
+    """
+    return similarityMatrixAvailable and dbTableExists(
+        db,
+        'similarity_changes',
+    )
+
+
+def _isSearchableItem(tableName, itemId):
+    """ The root box is never a search result."""
+    return tableName != 'boxes' or itemId != ''
+
+
+def _recordDVectors(tableName, recordDict):
+    """ The (serialized) DVectors of a record,
+        in the order of the matrix fields.
+    """
+    return [
+        recordDict[dvColumn]
+        for dvColumn in similarityTrackedTables[tableName]['dvectors']
+    ]
+
+
+def _dbLastSimilarityChangeId(db):
+    """ The id of the latest logged change (0 if none)."""
+    lastChanges = list(dbRetrieveRecordsByKey(
+        db,
+        'similarity_changes',
+        {},
+        whereClauses=['change_id IS NOT NULL'],
+        order=[('change_id', 'DESC')],
+        limit=1,
+        dbTablesDesc=dbSchema,
+    ))
+    if len(lastChanges) > 0:
+        return lastChanges[0]['change_id']
+    else:
+        return 0
+
+
+def _dbLoadSimilaritySnapshot(db):
+    """ Read all the DVectors from DB into new matrices."""
+    # the last change is read first: rows read afterwards may well
+    # include later changes, which are then just applied again
+    lastChangeId = _dbLastSimilarityChangeId(db)
+    matrices = {}
+    for tName, tableDesc in similarityTrackedTables.items():
+        matrices[tName] = DVectorMatrix(
+            (
+                (
+                    recordDict[tableDesc['key']],
+                    _recordDVectors(tName, recordDict),
+                )
+                for recordDict in dbRetrieveAllRecords(
+                    db,
+                    tName,
+                    dbTablesDesc=dbSchema,
+                    columns=[tableDesc['key']] + tableDesc['dvectors'],
+                )
+                if _isSearchableItem(tName, recordDict[tableDesc['key']])
+            ),
+            len(tableDesc['dvectors']),
+        )
+    return {
+        'last_change': lastChangeId,
+        'matrices': matrices,
+    }
+
+
+def _dbApplySimilarityChanges(db, snapshot):
+    """ Bring the matrices of a snapshot up to date with the
+        change log. Return False if this is not possible
+        (changes have been pruned from the log meanwhile).
+    """
+    newChanges = list(dbRetrieveRecordsByKey(
+        db,
+        'similarity_changes',
+        {},
+        whereClauses=[('change_id > ?', snapshot['last_change'])],
+        order=[('change_id', 'ASC')],
+        dbTablesDesc=dbSchema,
+    ))
+    if len(newChanges) == 0:
+        return True
+    elif newChanges[0]['change_id'] != snapshot['last_change'] + 1:
+        return False
+    else:
+        for tName, tableDesc in similarityTrackedTables.items():
+            changedIds = {
+                chg['item_id']
+                for chg in newChanges
+                if chg['table_name'] == tName
+                if _isSearchableItem(tName, chg['item_id'])
+            }
+            if len(changedIds) > 0:
+                foundDVectors = {
+                    recordDict[tableDesc['key']]: _recordDVectors(
+                        tName,
+                        recordDict,
+                    )
+                    for recordDict in dbRetrieveRecordsByKeyIn(
+                        db,
+                        tName,
+                        tableDesc['key'],
+                        changedIds,
+                        dbTablesDesc=dbSchema,
+                        columns=[tableDesc['key']] + tableDesc['dvectors'],
+                    )
+                }
+                snapshot['matrices'][tName].updateItems(
+                    (itemId, foundDVectors.get(itemId))
+                    for itemId in changedIds
+                )
+        snapshot['last_change'] = newChanges[-1]['change_id']
+        return True
+
+
+def dbSimilarityTopItems(db, tableName, searchDVector, dvectorColumns,
+                         threshold, limit=None):
+    """ Score all items of a table (boxes/files/links) against
+        a search DVector, considering the given dvector columns.
+
+        Return a list of (itemId, score) pairs, best first, for the items
+        scoring at least 'threshold' (at most 'limit' of them if given).
+    """
+    global _similaritySnapshot
+    fieldIndices = [
+        similarityTrackedTables[tableName]['dvectors'].index(dvColumn)
+        for dvColumn in dvectorColumns
+    ]
+    # queries run under the lock as well, since applying
+    # changes alters the matrices in place
+    with _similaritySnapshotLock:
+        snapshot = _similaritySnapshot
+        if db.in_transaction:
+            # changes not yet committed are not to be tracked
+            if snapshot is None:
+                snapshot = _dbLoadSimilaritySnapshot(db)
+        else:
+            if (snapshot is None or
+                    not _dbApplySimilarityChanges(db, snapshot)):
+                snapshot = _dbLoadSimilaritySnapshot(db)
+            _similaritySnapshot = snapshot
+        return snapshot['matrices'][tableName].topItems(
+            searchDVector,
+            fieldIndices,
+            threshold,
+            limit=limit,
+        )
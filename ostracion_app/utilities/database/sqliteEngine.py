@@ -33,26 +33,227 @@
 """
 
 import sqlite3 as lite
+from functools import lru_cache
 from operator import itemgetter
+from urllib.request import pathname2url
 
 
 DB_DEBUG = False
 
 SqliteIntegrityError = lite.IntegrityError
+SqliteError = lite.Error
 
 # for moot 'limit' clause in selects (this is 2^63-1, i.e. a signed long max)
 veryLargeIntegerName = '9223372036854775807'
 
+# max number of distinct SQL statements kept by buildStatement
+statementCacheSize = 512
+
+# max "?" parameters in a single query (older SQLite builds allow 999)
+maxQueryParameters = 900
+
+# column tuples for the schemas registered with precomputeTablesColumns:
+#   id(dbTablesDesc) -> (dbTablesDesc, {tableName: (col, col, ...)})
+# (the schema itself is kept alongside, so that its id cannot be recycled)
+_precomputedColumns = {}
+
+
+def _makeColumnTuple(tableDesc):
+    """Ordered tuple of column names (primary key first) for a table."""
+    return tuple(
+        map(itemgetter(0), tableDesc.get('primary_key', []))
+    ) + tuple(
+        map(itemgetter(0), tableDesc['columns'])
+    )
+
+
+def precomputeTablesColumns(dbTablesDesc):
+    """ Compute, once and for all, the column tuples of all tables
+        in a schema description. Subsequent calls to tableColumns
+        with that very same dbTablesDesc object do no work at all.
+
+        The schema is assumed not to change after this call.
+    """
+    _precomputedColumns[id(dbTablesDesc)] = (
+        dbTablesDesc,
+        {
+            tName: _makeColumnTuple(tDesc)
+            for tName, tDesc in dbTablesDesc.items()
+        },
+    )
+
+
+def tableColumns(tableName, dbTablesDesc=None):
+    """ Return an *ordered* tuple of the fields of a table, resorting
+        to the precomputed ones whenever the schema was registered.
+    """
+    schemaColumns = _precomputedColumns.get(id(dbTablesDesc))
+    if schemaColumns is not None and schemaColumns[0] is dbTablesDesc:
+        return schemaColumns[1][tableName]
+    else:
+        return _makeColumnTuple(dbTablesDesc[tableName])
+
 
 def listColumns(tableName, dbTablesDesc=None):
     """ Read the table structure and return an *ordered*
         list of its fields.
     """
-    colList = []
-    if 'primary_key' in dbTablesDesc[tableName]:
-        colList += map(itemgetter(0), dbTablesDesc[tableName]['primary_key'])
-    colList += map(itemgetter(0), dbTablesDesc[tableName]['columns'])
-    return colList
+    return list(tableColumns(tableName, dbTablesDesc))
+
+
+@lru_cache(maxsize=statementCacheSize)
+def buildStatement(operation, tableName, columns, keyNames=(),
+                   whereShape=(), order=(), hasOffset=False, hasLimit=False):
+    """ Build (and memoise) the SQL text for one of the generic
+        operations, returning a pair (statement, columns).
+
+        All arguments must be hashable, hence tuples:
+            operation: one of 'select', 'count', 'insert', 'update',
+                'increment', 'delete'
+            columns: the selected/inserted columns (the SET ones for
+                updates, the ones to add one to for increments)
+            keyNames: the columns entering the where clause as "col=?"
+            whereShape: the additional where-clause strings (with "?"s)
+            order: pairs (fieldName, 'ASC'/'DESC')
+            hasOffset, hasLimit: whether a "LIMIT" clause is to be
+                added, its parameters being then bound at execution time
+                (the offset before the limit).
+    """
+    whereClause = ' AND '.join(
+        tuple('%s=?' % kn for kn in keyNames) + tuple(whereShape)
+    )
+    if operation == 'select':
+        if len(order) == 0:
+            orderClause = ''
+        else:
+            orderClause = ' ORDER BY %s' % (', '.join(
+                '%s %s' % (ordPair[0], ordPair[1])
+                for ordPair in order
+            ))
+        # limit/offset part
+        # (see https://dev.mysql.com/doc/refman/8.0/en/select.html)
+        if hasLimit:
+            if hasOffset:
+                limitClause = ' LIMIT ?, ?'
+            else:
+                limitClause = ' LIMIT ?'
+        else:
+            if hasOffset:
+                limitClause = ' LIMIT ?, %s' % veryLargeIntegerName
+            else:
+                limitClause = ''
+        statement = 'SELECT %s FROM %s WHERE %s%s%s' % (
+            ', '.join(columns),
+            tableName,
+            whereClause,
+            orderClause,
+            limitClause,
+        )
+    elif operation == 'count':
+        statement = 'SELECT COUNT(*) FROM %s WHERE %s' % (
+            tableName,
+            whereClause,
+        )
+    elif operation == 'insert':
+        statement = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            tableName,
+            ', '.join(columns),
+            ', '.join(['?'] * len(columns)),
+        )
+    elif operation == 'update':
+        statement = 'UPDATE %s SET %s WHERE %s' % (
+            tableName,
+            ', '.join('%s=?' % col for col in columns),
+            whereClause,
+        )
+    elif operation == 'increment':
+        statement = 'UPDATE %s SET %s WHERE %s' % (
+            tableName,
+            ', '.join('%s=%s+1' % (col, col) for col in columns),
+            whereClause,
+        )
+    elif operation == 'delete':
+        statement = 'DELETE FROM %s WHERE %s' % (tableName, whereClause)
+    else:
+        raise ValueError('Unknown statement operation "%s"' % operation)
+    return statement, columns
+
+
+@lru_cache(maxsize=statementCacheSize)
+def _buildPathChainStatement(tableName, columns, idField, parentField,
+                             nameField, pathLength):
+    """ Build (and memoise) the recursive query used by
+        dbRetrieveRecordPathChain for a path of a given length.
+    """
+    segmentValues = ', '.join(
+        '(%i, ?)' % (depth + 1)
+        for depth in range(pathLength)
+    )
+    return (
+        'WITH RECURSIVE '
+        'path_segments(depth, segment_name) AS (VALUES %s), '
+        'path_chain(depth, chain_id) AS ('
+        'SELECT 0, ? '
+        'UNION ALL '
+        'SELECT path_segments.depth, %s.%s FROM path_chain '
+        'JOIN path_segments ON path_segments.depth = path_chain.depth + 1 '
+        'JOIN %s ON %s.%s = path_chain.chain_id '
+        'AND %s.%s = path_segments.segment_name'
+        ') '
+        'SELECT path_chain.depth, %s FROM path_chain '
+        'JOIN %s ON %s.%s = path_chain.chain_id '
+        'ORDER BY path_chain.depth'
+    ) % (
+        segmentValues,
+        tableName, idField,
+        tableName, tableName, parentField,
+        tableName, nameField,
+        ', '.join('%s.%s' % (tableName, col) for col in columns),
+        tableName, tableName, idField,
+    )
+
+
+@lru_cache(maxsize=statementCacheSize)
+def _buildAncestorsStatement(tableName, columns, idField, parentField,
+                             numIds):
+    """ Build (and memoise) the recursive query used by
+        dbRetrieveRecordAncestors for a given number of starting ids.
+    """
+    return (
+        'WITH RECURSIVE ancestor_ids(ancestor_id) AS ('
+        'SELECT %s FROM %s WHERE %s IN (%s) '
+        'UNION '
+        'SELECT %s.%s FROM %s '
+        'JOIN ancestor_ids ON %s.%s = ancestor_ids.ancestor_id'
+        ') '
+        'SELECT %s FROM %s '
+        'JOIN ancestor_ids ON %s.%s = ancestor_ids.ancestor_id'
+    ) % (
+        idField, tableName, idField, ', '.join(['?'] * numIds),
+        tableName, parentField, tableName,
+        tableName, idField,
+        ', '.join('%s.%s' % (tableName, col) for col in columns),
+        tableName,
+        tableName, idField,
+    )
+
+
+def _splitKeysAndWhereClauses(keys, whereClauses):
+    """ Split an equals-only 'keys' dict and a list of whereClauses
+        (strings or ('... ? ...', value) pairs) into the three ingredients
+        of a query: key-name tuple, where-clause shape, query values.
+    """
+    kNames = tuple(keys.keys())
+    whereShape = tuple(
+        wc[0] if isinstance(wc, tuple) else wc
+        for wc in whereClauses
+    )
+    kValues = list(keys.values()) + [
+        wc[1]
+        for wc in whereClauses
+        if isinstance(wc, tuple)
+    ]
+    return kNames, whereShape, kValues
 
 
 def dbQueryColumns(db, tableName):
@@ -101,13 +302,10 @@ def dbCountRecords(db, tableName):
 
 def dbAddRecordToTable(db, tableName, recordDict, dbTablesDesc=None):
     """INSERT a row to a table."""
-    colList = listColumns(tableName, dbTablesDesc=dbTablesDesc)
-    columnNames = ', '.join(listColumns(tableName, dbTablesDesc))
-    #
-    insertStatement = 'INSERT INTO %s (%s) VALUES (%s)' % (
+    insertStatement, colList = buildStatement(
+        'insert',
         tableName,
-        columnNames,
-        ', '.join(['?']*len(colList))
+        tableColumns(tableName, dbTablesDesc),
     )
     insertValues = tuple(recordDict[k] for k in colList)
     #
@@ -125,26 +323,23 @@ def dbAddRecordToTable(db, tableName, recordDict, dbTablesDesc=None):
 def dbUpdateRecordOnTable(db, tableName, newDict,
                           dbTablesDesc=None, allowPartial=False):
     """UPDATE a row on a table. Can perform a partial update if required."""
-    dbKeys = list(map(itemgetter(0), dbTablesDesc[tableName]['primary_key']))
-    otherFields = list(map(itemgetter(0), dbTablesDesc[tableName]['columns']))
-    updatePart = ', '.join(
-        '%s=?' % of
-        for of in otherFields
-        if not allowPartial or of in newDict
-    )
-    updatePartValues = [
-        newDict[of]
-        for of in otherFields
-        if not allowPartial or of in newDict
-    ]
-    whereClause = ' AND '.join('%s=?' % dbk for dbk in dbKeys)
-    whereValues = [newDict[dbk] for dbk in dbKeys]
-    updateStatement = 'UPDATE %s SET %s WHERE %s' % (
+    tableDesc = dbTablesDesc[tableName]
+    allColumns = tableColumns(tableName, dbTablesDesc)
+    numKeys = len(tableDesc['primary_key'])
+    dbKeys = allColumns[:numKeys]
+    otherFields = allColumns[numKeys:]
+    if allowPartial:
+        otherFields = tuple(of for of in otherFields if of in newDict)
+    updateStatement, _ = buildStatement(
+        'update',
         tableName,
-        updatePart,
-        whereClause
+        otherFields,
+        keyNames=dbKeys,
     )
-    updateValues = updatePartValues + whereValues
+    updateValues = [newDict[of] for of in otherFields] + [
+        newDict[dbk]
+        for dbk in dbKeys
+    ]
     if DB_DEBUG:
         print('[dbUpdateRecordOnTable] %s' % updateStatement)
         print('[dbUpdateRecordOnTable] %s' % ','.join(
@@ -156,12 +351,94 @@ def dbUpdateRecordOnTable(db, tableName, newDict,
     return
 
 
-def dbOpenDatabase(dbFileName, dbTablesDesc=None, enableForeignKeys=True):
-    """Creates an open connection to a database given its filename."""
-    con = lite.connect(dbFileName, detect_types=lite.PARSE_DECLTYPES)
+def dbUpdateRecordsByKey(db, tableName, key, newValues, whereClauses=[],
+                         dbTablesDesc=None):
+    """ Set some columns (a 'newValues' dict) on all records matching
+        a query ('key' and 'whereClauses' as for dbRetrieveRecordsByKey).
+        Return the number of records affected, which makes this
+        usable as an atomic compare-and-set.
+    """
+    kNames, whereShape, kValues = _splitKeysAndWhereClauses(
+        key,
+        whereClauses,
+    )
+    setColumns = tuple(newValues.keys())
+    updateStatement, _ = buildStatement(
+        'update',
+        tableName,
+        setColumns,
+        keyNames=kNames,
+        whereShape=whereShape,
+    )
+    updateValues = [newValues[sc] for sc in setColumns] + kValues
+    if DB_DEBUG:
+        print('[dbUpdateRecordsByKey] %s' % updateStatement)
+        print('[dbUpdateRecordsByKey] %s' % ','.join(
+            '%s' % iv
+            for iv in updateValues
+        ))
+    return db.execute(updateStatement, updateValues).rowcount
+
+
+def dbIncrementRecordColumn(db, tableName, key, columnName,
+                            dbTablesDesc=None):
+    """ Atomically add one to an (integer) column of the records matching
+        an equals-only 'key'. Return the number of records affected.
+    """
+    kNames, kValues = tuple(key.keys()), tuple(key.values())
+    incrementStatement, _ = buildStatement(
+        'increment',
+        tableName,
+        (columnName,),
+        keyNames=kNames,
+    )
+    if DB_DEBUG:
+        print('[dbIncrementRecordColumn] %s' % incrementStatement)
+        print('[dbIncrementRecordColumn] %s' % ','.join(
+            '%s' % iv
+            for iv in kValues
+        ))
+    return db.execute(incrementStatement, kValues).rowcount
+
+
+def dbOpenDatabase(dbFileName, dbTablesDesc=None, enableForeignKeys=True,
+                   checkSameThread=True, pragmas=[], readOnly=False):
+    """ Creates an open connection to a database given its filename.
+
+        checkSameThread=False allows the connection to be handed over
+        between threads (the caller is then responsible for never
+        using it from two threads at the same time).
+
+        'pragmas' is a list of (name, value) pairs, e.g.
+            [('journal_mode', 'WAL'), ('synchronous', 'NORMAL'), ...]
+        issued in order after opening.
+
+        readOnly=True opens the file with a "mode=ro" URI: writes
+        are refused by sqlite itself (and 'journal_mode' is skipped).
+    """
+    if readOnly:
+        con = lite.connect(
+            'file:%s?mode=ro' % pathname2url(dbFileName),
+            detect_types=lite.PARSE_DECLTYPES,
+            check_same_thread=checkSameThread,
+            uri=True,
+        )
+    else:
+        con = lite.connect(
+            dbFileName,
+            detect_types=lite.PARSE_DECLTYPES,
+            check_same_thread=checkSameThread,
+        )
     con.execute('PRAGMA foreign_keys = %s;' % (
         ['OFF', 'ON'][int(enableForeignKeys)]
     ))
+    for pragmaName, pragmaValue in pragmas:
+        if readOnly and pragmaName == 'journal_mode':
+            continue
+        pragmaStatement = 'PRAGMA %s = %s;' % (pragmaName, pragmaValue)
+        if DB_DEBUG:
+            print('[dbOpenDatabase] %s' % pragmaStatement)
+        con.execute(pragmaStatement).fetchall()
     return con
 
 
@@ -249,18 +526,22 @@ def dbClearTable(db, tableName, dbTablesDesc=None):
     cur.execute(deleteStatement)
 
 
-def dbRetrieveAllRecords(db, tableName, dbTablesDesc=None):
+def dbRetrieveAllRecords(db, tableName, dbTablesDesc=None, columns=None):
     """ Return an iterator on dicts, one for each item in the table,
         in no particular order.
+        If 'columns' (a list) is given, only those are read.
     """
     cur = db.cursor()
-    columnNames = ', '.join(listColumns(tableName, dbTablesDesc))
-    selectStatement = 'SELECT %s FROM %s' % (columnNames, tableName)
+    if columns is None:
+        columnList = tableColumns(tableName, dbTablesDesc)
+    else:
+        columnList = tuple(columns)
+    selectStatement = 'SELECT %s FROM %s' % (', '.join(columnList), tableName)
     if DB_DEBUG:
         print('[dbRetrieveAllRecords] %s' % selectStatement)
     cur.execute(selectStatement)
     for recTuple in cur.fetchall():
-        yield dict(zip(listColumns(tableName, dbTablesDesc), recTuple))
+        yield dict(zip(columnList, recTuple))
 
 
 def dbRetrieveRecordsByKey(db, tableName, keys,
@@ -282,53 +563,24 @@ def dbRetrieveRecordsByKey(db, tableName, keys,
         'limit', if present (nonnegative integer), limits the max items yielded
     """
     cur = db.cursor()
-    if len(keys) > 0:
-        _kNames, _kValues = list(zip(*list(keys.items())))
-        kNames, kValues = list(_kNames), list(_kValues)
-    else:
-        kNames, kValues = [], []
-    #
-    kValues += [wc[1] for wc in whereClauses if isinstance(wc, tuple)]
-    fullWhereClauses = [
-        '%s=?' % kn
-        for kn in kNames
-    ] + [
-        wc[0] if isinstance(wc, tuple) else wc
-        for wc in whereClauses
-    ]
-    columnList = listColumns(tableName, dbTablesDesc)
-    whereClause = ' AND '.join(fullWhereClauses)
-    columnNames = ', '.join(columnList)
-    #
-    if order is None or len(order) == 0:
-        orderClause = ''
-    else:
-        orderClause = ' ORDER BY %s' % (', '.join(
-            '%s %s' % (ordPair[0], ordPair[1])
-            for ordPair in order
-        ))
-    # limit/offset part
-    # (see https://dev.mysql.com/doc/refman/8.0/en/select.html)
-    if limit is None:
-        if offset is None:
-            limitClause = ''
-        else:
-            limitClause = ' LIMIT %i, %s' % (offset, veryLargeIntegerName)
-    else:
-        if offset is None:
-            limitClause = ' LIMIT %i' % limit
-        else:
-            limitClause = ' LIMIT %i, %i' % (
-                offset,
-                limit,
-            )
+    kNames, whereShape, kValues = _splitKeysAndWhereClauses(
+        keys,
+        whereClauses,
+    )
+    if offset is not None:
+        kValues.append(int(offset))
+    if limit is not None:
+        kValues.append(int(limit))
     #
-    selectStatement = 'SELECT %s FROM %s WHERE %s%s%s' % (
-        columnNames,
+    selectStatement, columnList = buildStatement(
+        'select',
         tableName,
-        whereClause,
-        orderClause,
-        limitClause,
+        tableColumns(tableName, dbTablesDesc),
+        keyNames=kNames,
+        whereShape=whereShape,
+        order=tuple(tuple(ordPair) for ordPair in (order or [])),
+        hasOffset=offset is not None,
+        hasLimit=limit is not None,
     )
     if DB_DEBUG:
         print('[dbRetrieveRecordsByKey] %s' % selectStatement)
@@ -356,25 +608,16 @@ def dbCountRecordsByKey(db, tableName, keys,
         Return a (nonnegative) integer.
     """
     cur = db.cursor()
-    if len(keys) > 0:
-        _kNames, _kValues = list(zip(*list(keys.items())))
-        kNames, kValues = list(_kNames), list(_kValues)
-    else:
-        kNames, kValues = [], []
-    #
-    kValues += [wc[1] for wc in whereClauses if isinstance(wc, tuple)]
-    fullWhereClauses = [
-        '%s=?' % kn
-        for kn in kNames
-    ] + [
-        wc[0] if isinstance(wc, tuple) else wc
-        for wc in whereClauses
-    ]
-    whereClause = ' AND '.join(fullWhereClauses)
-    #
-    countStatement = 'SELECT COUNT(*) FROM %s WHERE %s' % (
+    kNames, whereShape, kValues = _splitKeysAndWhereClauses(
+        keys,
+        whereClauses,
+    )
+    countStatement, _ = buildStatement(
+        'count',
         tableName,
-        whereClause,
+        (),
+        keyNames=kNames,
+        whereShape=whereShape,
     )
     if DB_DEBUG:
         print('[dbCountRecordsByKey] %s' % countStatement)
@@ -390,6 +633,134 @@ def dbCountRecordsByKey(db, tableName, keys,
         return None
 
 
+def dbRetrieveRecordPathChain(db, tableName, idField, parentField,
+                              nameField, rootId, names, dbTablesDesc=None):
+    """ For a table describing a tree (each row pointing to its parent
+        through 'parentField'), resolve a path, i.e. a sequence of
+        'names' to follow starting from the row whose 'idField' is 'rootId',
+        with a single (recursive) query.
+
+        Return the list of records (as dicts) along the path, starting
+        with the root record itself: if the path cannot be followed
+        to its end, the list is shorter than len(names)+1.
+    """
+    if len(names) == 0:
+        rootRecord = dbRetrieveRecordByKey(
+            db,
+            tableName,
+            {idField: rootId},
+            dbTablesDesc=dbTablesDesc,
+        )
+        return [] if rootRecord is None else [rootRecord]
+    else:
+        columnList = tableColumns(tableName, dbTablesDesc)
+        chainStatement = _buildPathChainStatement(
+            tableName,
+            columnList,
+            idField,
+            parentField,
+            nameField,
+            len(names),
+        )
+        chainValues = list(names) + [rootId]
+        if DB_DEBUG:
+            print('[dbRetrieveRecordPathChain] %s' % chainStatement)
+            print('[dbRetrieveRecordPathChain] %s' % ','.join(
+                '%s' % iv
+                for iv in chainValues
+            ))
+        cur = db.cursor()
+        cur.execute(chainStatement, chainValues)
+        # at each depth the first record hanging from the previous one
+        # is retained (in case of homonyms, the recursion branches out)
+        chain = []
+        for recTuple in cur.fetchall():
+            depth, recDict = recTuple[0], dict(zip(columnList, recTuple[1:]))
+            if depth == len(chain):
+                if depth == 0 or (
+                        recDict[parentField] == chain[-1][idField]):
+                    chain.append(recDict)
+        return chain
+
+
+def dbRetrieveRecordAncestors(db, tableName, idField, parentField,
+                              ids, dbTablesDesc=None):
+    """ For a table describing a tree (each row pointing to its parent
+        through 'parentField'), fetch the records with the given ids
+        together with all of their ancestors, with a recursive query
+        (one per maxQueryParameters ids).
+
+        Return a dict id -> record (as dict); ids not found are missing.
+    """
+    cur = db.cursor()
+    idList = sorted(set(ids))
+    columnList = tableColumns(tableName, dbTablesDesc)
+    recordMap = {}
+    for chunkStart in range(0, len(idList), maxQueryParameters):
+        chunkIds = idList[chunkStart:chunkStart + maxQueryParameters]
+        ancestorsStatement = _buildAncestorsStatement(
+            tableName,
+            columnList,
+            idField,
+            parentField,
+            len(chunkIds),
+        )
+        if DB_DEBUG:
+            print('[dbRetrieveRecordAncestors] %s' % ancestorsStatement)
+            print('[dbRetrieveRecordAncestors] %s' % ','.join(
+                '%s' % iv
+                for iv in chunkIds
+            ))
+        cur.execute(ancestorsStatement, chunkIds)
+        for recTuple in cur.fetchall():
+            recDict = dict(zip(columnList, recTuple))
+            recordMap[recDict[idField]] = recDict
+    return recordMap
+
+
+def dbRetrieveRecordsByKeyIn(db, tableName, keyName, keyValues,
+                             dbTablesDesc=None, columns=None):
+    """ Fetch all records (an iterable, possibly empty) whose 'keyName'
+        column takes any of the provided values, with
+        "keyName IN (...)" queries (one per maxQueryParameters values).
+        If 'columns' (a list) is given, only those are read.
+    """
+    cur = db.cursor()
+    keyValueList = list(keyValues)
+    if columns is None:
+        columnList = tableColumns(tableName, dbTablesDesc)
+    else:
+        columnList = tuple(columns)
+    docTupleList = []
+    for chunkStart in range(0, len(keyValueList), maxQueryParameters):
+        chunkValues = keyValueList[
+            chunkStart:chunkStart + maxQueryParameters
+        ]
+        selectStatement, _ = buildStatement(
+            'select',
+            tableName,
+            columnList,
+            whereShape=(
+                '%s IN (%s)' % (
+                    keyName,
+                    ', '.join(['?'] * len(chunkValues)),
+                ),
+            ),
+        )
+        if DB_DEBUG:
+            print('[dbRetrieveRecordsByKeyIn] %s' % selectStatement)
+            print('[dbRetrieveRecordsByKeyIn] %s' % ','.join(
+                '%s' % iv
+                for iv in chunkValues
+            ))
+        cur.execute(selectStatement, chunkValues)
+        docTupleList += cur.fetchall()
+    return (
+        dict(zip(columnList, docT))
+        for docT in docTupleList
+    )
+
+
 def dbTableExists(db, tableName):
     """ Check for the existence of a table.
 
@@ -404,6 +775,174 @@ def dbTableExists(db, tableName):
     return tableName in foundTables
 
 
+def dbCreateFullTextIndex(db, indexName, indexDesc):
+    """ Create (if not there yet) an FTS5 index over some text columns
+        of a table, as an 'external content' table (i.e. only the index
+        is stored, the text being read from the table itself), plus
+        the triggers keeping it in sync with the table.
+
+        indexDesc is in the form
+            {
+                'table': 'TABLENAME',
+                'columns': [('COLUMN', bm25_weight), ...],
+            }
+        Raises SqliteError if FTS5 is not available.
+    """
+    tableName = indexDesc['table']
+    columns = [colPair[0] for colPair in indexDesc['columns']]
+    newValues = ', '.join('new.%s' % col for col in columns)
+    oldValues = ', '.join('old.%s' % col for col in columns)
+    insertIntoIndex = 'INSERT INTO %s (rowid, %s) VALUES (new.rowid, %s);' % (
+        indexName,
+        ', '.join(columns),
+        newValues,
+    )
+    deleteFromIndex = (
+        'INSERT INTO %s (%s, rowid, %s) VALUES (\'delete\', old.rowid, %s);'
+    ) % (
+        indexName,
+        indexName,
+        ', '.join(columns),
+        oldValues,
+    )
+    triggerTemplate = (
+        'CREATE TRIGGER IF NOT EXISTS %s_%s AFTER %s ON %s BEGIN %s END;'
+    )
+    createCommands = [
+        (
+            'CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(%s, '
+            'content=\'%s\', content_rowid=\'rowid\', '
+            'tokenize=\'unicode61 remove_diacritics 1\');'
+        ) % (indexName, ', '.join(columns), tableName),
+        triggerTemplate % (
+            indexName, 'ai', 'INSERT', tableName,
+            insertIntoIndex,
+        ),
+        triggerTemplate % (
+            indexName, 'ad', 'DELETE', tableName,
+            deleteFromIndex,
+        ),
+        triggerTemplate % (
+            indexName, 'au', 'UPDATE OF %s' % ', '.join(columns), tableName,
+            '%s %s' % (deleteFromIndex, insertIntoIndex),
+        ),
+    ]
+    cur = db.cursor()
+    for createCommand in createCommands:
+        if DB_DEBUG:
+            print('[dbCreateFullTextIndex] %s' % createCommand)
+        cur.execute(createCommand)
+
+
+def dbRebuildFullTextIndex(db, indexName):
+    """ Rebuild an FTS5 index from the contents of its table
+        (e.g. when the index is created on a table already filled,
+        or to be on the safe side after maintenance of the DB file).
+    """
+    rebuildCommand = 'INSERT INTO %s (%s) VALUES (\'rebuild\');' % (
+        indexName,
+        indexName,
+    )
+    if DB_DEBUG:
+        print('[dbRebuildFullTextIndex] %s' % rebuildCommand)
+    cur = db.cursor()
+    cur.execute(rebuildCommand)
+
+
+@lru_cache(maxsize=statementCacheSize)
+def _buildFullTextSearchStatement(tableName, columns, indexName, weights):
+    """ Build (and memoise) the query used by dbFullTextSearchRecords."""
+    rankExpression = 'bm25(%s, %s)' % (
+        indexName,
+        ', '.join('%f' % w for w in weights),
+    )
+    return (
+        'SELECT %s, %s FROM %s JOIN %s ON %s.rowid = %s.rowid '
+        'WHERE %s MATCH ? ORDER BY %s'
+    ) % (
+        ', '.join('%s.%s' % (tableName, col) for col in columns),
+        rankExpression,
+        indexName,
+        tableName,
+        tableName,
+        indexName,
+        indexName,
+        rankExpression,
+    )
+
+
+def dbFullTextSearchRecords(db, indexName, indexDesc, matchExpression,
+                            dbTablesDesc=None):
+    """ Query an FTS5 index (see dbCreateFullTextIndex) with an FTS5
+        'MATCH' expression and return an iterable of pairs
+        (recordDict, score), best matches first. The score is the
+        (sign-reversed, i.e. the higher the better) bm25 rank,
+        with the column weights given in the index description.
+    """
+    tableName = indexDesc['table']
+    columnList = tableColumns(tableName, dbTablesDesc)
+    searchStatement = _buildFullTextSearchStatement(
+        tableName,
+        columnList,
+        indexName,
+        tuple(colPair[1] for colPair in indexDesc['columns']),
+    )
+    if DB_DEBUG:
+        print('[dbFullTextSearchRecords] %s' % searchStatement)
+        print('[dbFullTextSearchRecords] %s' % matchExpression)
+    cur = db.cursor()
+    cur.execute(searchStatement, (matchExpression,))
+    return (
+        (dict(zip(columnList, recTuple[:-1])), -recTuple[-1])
+        for recTuple in cur.fetchall()
+    )
+
+
+def dbCreateChangeLogTriggers(db, logTableName, tableName, keyColumn,
+                              watchedColumns, maxLogLength):
+    """ Create (if not there yet) triggers recording, in a log table
+        with columns (change_id INTEGER primary key, table_name, item_id),
+        the key of any row of 'tableName' inserted, deleted or updated
+        in any of 'watchedColumns'.
+
+        Readers of the log keep track of the last change_id they saw;
+        only the latest 'maxLogLength' changes are retained.
+    """
+    logTemplate = (
+        'INSERT INTO %s (table_name, item_id) VALUES (\'%s\', %s.%s); '
+        'DELETE FROM %s WHERE change_id <= '
+        '(SELECT MAX(change_id) FROM %s) - %i;'
+    )
+    triggerTemplate = (
+        'CREATE TRIGGER IF NOT EXISTS %s_%s_log_%s AFTER %s ON %s '
+        'BEGIN %s END;'
+    )
+    createCommands = [
+        triggerTemplate % (
+            tableName, logTableName, triggerSuffix, triggerEvent, tableName,
+            logTemplate % (
+                logTableName,
+                tableName,
+                rowAlias,
+                keyColumn,
+                logTableName,
+                logTableName,
+                maxLogLength,
+            ),
+        )
+        for triggerSuffix, triggerEvent, rowAlias in [
+            ('ai', 'INSERT', 'new'),
+            ('ad', 'DELETE', 'old'),
+            ('au', 'UPDATE OF %s' % ', '.join(watchedColumns), 'new'),
+        ]
+    ]
+    cur = db.cursor()
+    for createCommand in createCommands:
+        if DB_DEBUG:
+            print('[dbCreateChangeLogTriggers] %s' % createCommand)
+        cur.execute(createCommand)
+
+
 def dbRetrieveRecordByKey(db, tableName, key, dbTablesDesc=None):
     """ Fetch a record (or None) according to an equals-only query,
         expressed as a 'key' such as:
@@ -412,13 +951,12 @@ def dbRetrieveRecordByKey(db, tableName, key, dbTablesDesc=None):
         Returns the row found, if any, as a dict.
     """
     cur = db.cursor()
-    kNames, kValues = zip(*list(key.items()))
-    whereClause = ' AND '.join('%s=?' % kn for kn in kNames)
-    columnNames = ', '.join(listColumns(tableName, dbTablesDesc))
-    selectStatement = 'SELECT %s FROM %s WHERE %s' % (
-        columnNames,
+    kNames, kValues = tuple(key.keys()), tuple(key.values())
+    selectStatement, columnList = buildStatement(
+        'select',
         tableName,
-        whereClause,
+        tableColumns(tableName, dbTablesDesc),
+        keyNames=kNames,
     )
     if DB_DEBUG:
         print('[dbRetrieveRecordByKey] %s' % selectStatement)
@@ -429,10 +967,7 @@ def dbRetrieveRecordByKey(db, tableName, key, dbTablesDesc=None):
     cur.execute(selectStatement, kValues)
     docTuple = cur.fetchone()
     if docTuple is not None:
-        docDict = dict(zip(
-            listColumns(tableName, dbTablesDesc=dbTablesDesc),
-            docTuple
-        ))
+        docDict = dict(zip(columnList, docTuple))
         return docDict
     else:
         return None
@@ -443,9 +978,13 @@ def dbDeleteRecordsByKey(db, tableName, key, dbTablesDesc=None):
         'key' specification (an equals-only query).
     """
     cur = db.cursor()
-    kNames, kValues = zip(*list(key.items()))
-    whereClause = ' AND '.join('%s=?' % kn for kn in kNames)
-    deleteStatement = 'DELETE FROM %s WHERE %s' % (tableName, whereClause)
+    kNames, kValues = tuple(key.keys()), tuple(key.values())
+    deleteStatement, _ = buildStatement(
+        'delete',
+        tableName,
+        (),
+        keyNames=kNames,
+    )
     if DB_DEBUG:
         print('[dbDeleteRecordsByKey] %s' % deleteStatement)
         print('[dbDeleteRecordsByKey] %s' % ','.join(
@@ -0,0 +1,186 @@
+""" thumbnailChecks.py
+    DB side of the thumbnail integrity check (see
+    post_install/thumbnailCheck.py): listing all items which have
+    a thumbnail stored in the file storage and replacing
+    (or resetting) the thumbnail of an item after the check.
+
+    Items are handled as plain dicts, so that they can travel
+    to the worker processes doing the physical checks.
+"""
+
+import json
+
+from ostracion_app.utilities.database.sqliteEngine import (
+    dbRetrieveAllRecords,
+    dbUpdateRecordsByKey,
+)
+
+from ostracion_app.utilities.database.dbSchema import (
+    dbSchema,
+)
+
+from ostracion_app.utilities.database.generationCounters import (
+    dbBumpGeneration,
+)
+
+from ostracion_app.utilities.fileIO.thumbnails import (
+    isImageMimeType,
+)
+
+from ostracion_app.utilities.fileIO.physical import (
+    fileIdToPath,
+)
+
+# how the thumbnail is stored in each table, in checking order
+thumbnailCheckTables = [
+    (
+        'settings',
+        {
+            'key': ['group_id', 'id'],
+            'icon_column': 'value',
+            'generation': 'settings',
+        },
+    ),
+    (
+        'users',
+        {
+            'key': ['username'],
+            'icon_column': 'icon_file_id',
+            'generation': None,
+        },
+    ),
+    (
+        'boxes',
+        {
+            'key': ['box_id'],
+            'icon_column': 'icon_file_id',
+            'generation': 'boxes',
+        },
+    ),
+    (
+        'links',
+        {
+            'key': ['link_id'],
+            'icon_column': 'icon_file_id',
+            'generation': None,
+        },
+    ),
+    (
+        'files',
+        {
+            'key': ['file_id'],
+            'icon_column': 'icon_file_id',
+            'generation': None,
+        },
+    ),
+]
+thumbnailCheckTableNames = [tName for tName, _ in thumbnailCheckTables]
+
+
+def _settingThumbnailFormat(settingDict):
+    """ The thumbnail format of an image setting, from its metadata."""
+    if settingDict['metadata'] is not None and settingDict['metadata'] != '':
+        metadata = json.loads(settingDict['metadata'])
+    else:
+        metadata = {}
+    return metadata.get('thumbnailFormat', 'thumbnail')
+
+
+def _makeThumbnailItem(tableName, tableDesc, recordDict):
+    """ Describe a record with a thumbnail as an item to check.
+        Only files which are images can have the thumbnail
+        made anew from the original ('source_file_id').
+    """
+    if tableName == 'settings':
+        thumbnailFormat = _settingThumbnailFormat(recordDict)
+    else:
+        thumbnailFormat = 'thumbnail'
+    if tableName == 'files' and isImageMimeType(recordDict['mime_type']):
+        sourceFileId = recordDict['file_id']
+        sourceMimeType = recordDict['mime_type']
+    else:
+        sourceFileId, sourceMimeType = None, None
+    return {
+        'table': tableName,
+        'key': [recordDict[kName] for kName in tableDesc['key']],
+        'icon_file_id': recordDict[tableDesc['icon_column']],
+        'icon_mime_type': recordDict['icon_mime_type'],
+        'thumbnail_format': thumbnailFormat,
+        'source_file_id': sourceFileId,
+        'source_mime_type': sourceMimeType,
+    }
+
+
+def thumbnailItemPosition(item):
+    """ A sortable position of an item in the overall checking order,
+        used to resume an interrupted check.
+    """
+    return (thumbnailCheckTableNames.index(item['table']), item['key'])
+
+
+def dbListThumbnailItems(db, tableNames=thumbnailCheckTableNames):
+    """ Return, in checking order, the items (of the requested tables)
+        which have a thumbnail in the file storage. Default images
+        of settings, being static files, are not listed.
+    """
+    items = []
+    for tName, tableDesc in thumbnailCheckTables:
+        if tName in tableNames:
+            for recordDict in dbRetrieveAllRecords(
+                    db,
+                    tName,
+                    dbTablesDesc=dbSchema):
+                if tName == 'settings' and recordDict['type'] != 'image':
+                    continue
+                if recordDict[tableDesc['icon_column']] != '':
+                    items.append(
+                        _makeThumbnailItem(tName, tableDesc, recordDict)
+                    )
+    return sorted(items, key=thumbnailItemPosition)
+
+
+def dbReplaceItemThumbnail(db, item, newIconFileId, newIconMimeType,
+                           fileStorageDirectory):
+    """ Replace the thumbnail of an item (with newIconFileId=None the item
+        goes back to its default icon). The change applies only if the
+        item still has the thumbnail it had when it was listed.
+
+        Never commits. Return a pair (applied, fsDeleteQueue), the latter
+        listing the replaced thumbnail if applied, else the new one.
+    """
+    tableDesc = dict(thumbnailCheckTables)[item['table']]
+    iconColumn = tableDesc['icon_column']
+    newValues = {
+        iconColumn: newIconFileId if newIconFileId is not None else '',
+        'icon_mime_type': (newIconMimeType
+                           if newIconFileId is not None
+                           else ''),
+    }
+    if newIconFileId is None and item['table'] != 'settings':
+        newValues['icon_file_id_username'] = ''
+    applied = dbUpdateRecordsByKey(
+        db,
+        item['table'],
+        dict(
+            zip(tableDesc['key'], item['key']),
+            **{iconColumn: item['icon_file_id']}
+        ),
+        newValues,
+        dbTablesDesc=dbSchema,
+    ) > 0
+    if applied:
+        if tableDesc['generation'] is not None:
+            dbBumpGeneration(db, tableDesc['generation'])
+        discardedFileId = item['icon_file_id']
+    else:
+        discardedFileId = newIconFileId
+    if discardedFileId is not None:
+        fsDeleteQueue = [
+            fileIdToPath(
+                discardedFileId,
+                fileStorageDirectory=fileStorageDirectory,
+            )
+        ]
+    else:
+        fsDeleteQueue = []
+    return applied, fsDeleteQueue
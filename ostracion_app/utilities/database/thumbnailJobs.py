@@ -0,0 +1,301 @@
+""" thumbnailJobs.py
+    The DB-backed queue of thumbnail (and rendition) preparations
+    for uploaded image files, consumed by background workers.
+    Jobs with a null thumbnail_format only make the renditions.
+
+    A job is 'pending' (waiting or to be retried), 'running'
+    (claimed by a worker) or 'failed' (attempts exhausted);
+    completed jobs are removed from the queue.
+"""
+
+import datetime
+from uuid import uuid4
+
+from ostracion_app.utilities.models.ThumbnailJob import ThumbnailJob
+
+from ostracion_app.utilities.database.sqliteEngine import (
+    dbAddRecordToTable,
+    dbRetrieveAllRecords,
+    dbRetrieveRecordsByKey,
+    dbRetrieveRecordByKey,
+    dbUpdateRecordsByKey,
+    dbDeleteRecordsByKey,
+)
+
+from ostracion_app.utilities.database.dbSchema import (
+    dbSchema,
+)
+
+from ostracion_app.utilities.database.fileDerivatives import (
+    dbStoreFileDerivatives,
+    dbDeleteFileDerivatives,
+)
+
+from ostracion_app.utilities.fileIO.thumbnails import (
+    isImageMimeType,
+)
+
+from config import (
+    imageDerivativeWidths,
+)
+
+thumbnailJobStatuses = ['pending', 'running', 'failed']
+
+
+def dbEnqueueThumbnailJob(db, fileId, mimeType, thumbnailFormat,
+                          skipCommit=False):
+    """ Add a new pending job for the thumbnail of a file."""
+    now = datetime.datetime.now()
+    newJob = ThumbnailJob(
+        job_id=uuid4().hex,
+        file_id=fileId,
+        mime_type=mimeType,
+        thumbnail_format=thumbnailFormat,
+        status='pending',
+        attempts=0,
+        last_error='',
+        worker_id='',
+        creation_date=now,
+        update_date=now,
+    )
+    dbAddRecordToTable(
+        db,
+        'thumbnail_jobs',
+        newJob.asDict(),
+        dbTablesDesc=dbSchema,
+    )
+    if not skipCommit:
+        db.commit()
+    return newJob
+
+
+def dbClaimThumbnailJob(db, workerId, candidates=8):
+    """ Take the oldest pending job, marking it as 'running' for
+        the worker. The pending->running switch is a compare-and-set,
+        so that concurrent workers never get the same job.
+
+        Return the claimed ThumbnailJob, or None if the queue is empty.
+    """
+    pendingJobs = [
+        ThumbnailJob(**jDict)
+        for jDict in dbRetrieveRecordsByKey(
+            db,
+            'thumbnail_jobs',
+            {'status': 'pending'},
+            order=[('creation_date', 'ASC')],
+            limit=candidates,
+            dbTablesDesc=dbSchema,
+        )
+    ]
+    for job in pendingJobs:
+        now = datetime.datetime.now()
+        claimed = dbUpdateRecordsByKey(
+            db,
+            'thumbnail_jobs',
+            {'job_id': job.job_id, 'status': 'pending'},
+            {
+                'status': 'running',
+                'worker_id': workerId,
+                'attempts': job.attempts + 1,
+                'update_date': now,
+            },
+            dbTablesDesc=dbSchema,
+        )
+        db.commit()
+        if claimed > 0:
+            job.status = 'running'
+            job.worker_id = workerId
+            job.attempts = job.attempts + 1
+            job.update_date = now
+            return job
+    return None
+
+
+def dbCompleteThumbnailJob(db, job, iconFileId, iconMimeType, derivatives,
+                           fileStorageDirectory):
+    """ Attach a freshly prepared thumbnail (if iconFileId is not None)
+        and renditions to the file, and remove the job from the queue.
+        Renditions replace any previous ones of the file.
+
+        The file gets the icon only if it still exists and has no icon
+        (the user may have set one meanwhile), and the renditions only
+        if it still exists. Return a triple
+            (iconAttached, derivativesAttached, fsDeleteQueue)
+        for the caller to discard unused files and replaced renditions.
+    """
+    fsDeleteQueue = []
+    if dbGetThumbnailJobFile(db, job) is not None:
+        if iconFileId is not None:
+            iconAttached = dbUpdateRecordsByKey(
+                db,
+                'files',
+                {'file_id': job.file_id, 'icon_file_id': ''},
+                {
+                    'icon_file_id': iconFileId,
+                    'icon_mime_type': iconMimeType,
+                },
+                dbTablesDesc=dbSchema,
+            ) > 0
+        else:
+            iconAttached = False
+        fsDeleteQueue += dbDeleteFileDerivatives(
+            db,
+            job.file_id,
+            fileStorageDirectory=fileStorageDirectory,
+        )
+        dbStoreFileDerivatives(
+            db,
+            job.file_id,
+            derivatives,
+            skipCommit=True,
+        )
+        derivativesAttached = True
+    else:
+        iconAttached, derivativesAttached = False, False
+    dbDeleteRecordsByKey(
+        db,
+        'thumbnail_jobs',
+        {'job_id': job.job_id},
+        dbTablesDesc=dbSchema,
+    )
+    db.commit()
+    return iconAttached, derivativesAttached, fsDeleteQueue
+
+
+def dbDiscardThumbnailJob(db, job):
+    """ Remove a job with nothing left to do (e.g. file deleted)."""
+    dbDeleteRecordsByKey(
+        db,
+        'thumbnail_jobs',
+        {'job_id': job.job_id},
+        dbTablesDesc=dbSchema,
+    )
+    db.commit()
+
+
+def dbFailThumbnailJob(db, job, errorMessage, maxAttempts):
+    """ Record a failed attempt: the job goes back to 'pending'
+        unless it has reached the max number of attempts.
+    """
+    dbUpdateRecordsByKey(
+        db,
+        'thumbnail_jobs',
+        {'job_id': job.job_id},
+        {
+            'status': 'pending' if job.attempts < maxAttempts else 'failed',
+            'last_error': errorMessage,
+            'worker_id': '',
+            'update_date': datetime.datetime.now(),
+        },
+        dbTablesDesc=dbSchema,
+    )
+    db.commit()
+
+
+def dbRequeueStaleThumbnailJobs(db, timeoutSeconds):
+    """ Give back to the queue the 'running' jobs which have been
+        running for too long (e.g. their worker died).
+        Return the number of requeued jobs.
+    """
+    threshold = (
+        datetime.datetime.now() - datetime.timedelta(seconds=timeoutSeconds)
+    )
+    numRequeued = dbUpdateRecordsByKey(
+        db,
+        'thumbnail_jobs',
+        {'status': 'running'},
+        {
+            'status': 'pending',
+            'worker_id': '',
+        },
+        whereClauses=[('update_date < ?', threshold)],
+        dbTablesDesc=dbSchema,
+    )
+    db.commit()
+    return numRequeued
+
+
+def dbRetryFailedThumbnailJobs(db):
+    """ Make all failed jobs pending again, with a fresh attempt count.
+        Return the number of affected jobs.
+    """
+    numRetried = dbUpdateRecordsByKey(
+        db,
+        'thumbnail_jobs',
+        {'status': 'failed'},
+        {
+            'status': 'pending',
+            'attempts': 0,
+            'update_date': datetime.datetime.now(),
+        },
+        dbTablesDesc=dbSchema,
+    )
+    db.commit()
+    return numRetried
+
+
+def dbCountThumbnailJobs(db):
+    """ Return a map status -> number of jobs."""
+    counts = {st: 0 for st in thumbnailJobStatuses}
+    for jDict in dbRetrieveAllRecords(
+            db,
+            'thumbnail_jobs',
+            dbTablesDesc=dbSchema):
+        counts[jDict['status']] = counts.get(jDict['status'], 0) + 1
+    return counts
+
+
+def dbRebuildThumbnailJobs(db, thumbnailFormat):
+    """ Enqueue a job for each image file still without a thumbnail
+        or (if configured) without renditions, and not already
+        in the queue. Return the number of new jobs.
+    """
+    queuedFileIds = {
+        jDict['file_id']
+        for jDict in dbRetrieveAllRecords(
+            db,
+            'thumbnail_jobs',
+            dbTablesDesc=dbSchema,
+        )
+    }
+    derivedFileIds = {
+        dDict['file_id']
+        for dDict in dbRetrieveAllRecords(
+            db,
+            'file_derivatives',
+            dbTablesDesc=dbSchema,
+        )
+    }
+    numEnqueued = 0
+    for fDict in list(dbRetrieveAllRecords(
+            db,
+            'files',
+            dbTablesDesc=dbSchema)):
+        if (fDict['file_id'] not in queuedFileIds and
+                isImageMimeType(fDict['mime_type'])):
+            needsIcon = fDict['icon_file_id'] == ''
+            needsDerivatives = (len(imageDerivativeWidths) > 0 and
+                                fDict['file_id'] not in derivedFileIds)
+            if needsIcon or needsDerivatives:
+                dbEnqueueThumbnailJob(
+                    db,
+                    fDict['file_id'],
+                    fDict['mime_type'],
+                    thumbnailFormat if needsIcon else None,
+                    skipCommit=True,
+                )
+                numEnqueued += 1
+    db.commit()
+    return numEnqueued
+
+
+def dbGetThumbnailJobFile(db, job):
+    """ Return the (dict of the) file record a job refers to,
+        None if the file does not exist anymore.
+    """
+    return dbRetrieveRecordByKey(
+        db,
+        'files',
+        {'file_id': job.file_id},
+        dbTablesDesc=dbSchema,
+    )
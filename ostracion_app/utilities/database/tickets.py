@@ -43,6 +43,7 @@ from ostracion_app.utilities.database.dbSchema import (
 
 from ostracion_app.utilities.database.userTools import (
     getUserFullName,
+    preloadUserFullNames,
 )
 
 from ostracion_app.utilities.tools.comparisonTools import (
@@ -176,6 +177,18 @@ def enrichTicket(db, t, urlRoot):
     }
 
 
+def enrichTickets(db, tickets, urlRoot):
+    """ Same as enrichTicket, on a whole list of tickets
+        (resolving all issuer names at once).
+    """
+    ticketList = list(tickets)
+    preloadUserFullNames(db, {t.username for t in ticketList})
+    return [
+        enrichTicket(db, t, urlRoot)
+        for t in ticketList
+    ]
+
+
 def dbGetEnrichAndCheckTicket(db, mode, ticketId, securityCode, urlRoot):
     """ Check validity (proper codes, existence) of a ticket
         and return it enriched.
@@ -24,6 +24,9 @@ from ostracion_app.utilities.database.sqliteEngine import (
 from ostracion_app.utilities.database.dbSchema import (
     dbSchema,
 )
+from ostracion_app.utilities.database.generationCounters import (
+    dbBumpGeneration,
+)
 from ostracion_app.utilities.database.permissions import (
     userIsAdmin,
 )
@@ -348,6 +351,7 @@ def dbDeleteUser(db, username, user, fileStorageDirectory):
                         {'role_class': 'user', 'role_id': username},
                         dbTablesDesc=dbSchema,
                     )
+                    dbBumpGeneration(db, 'boxes')
                     # 4. delete user-specific role
                     dbDeleteRecordsByKey(
                         db,
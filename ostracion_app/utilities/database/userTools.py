@@ -2,6 +2,11 @@
     Tools to work with users on the database.
 """
 
+from flask import (
+    g,
+    has_app_context,
+)
+
 from ostracion_app.utilities.tools.dictTools import (
     recursivelyMergeDictionaries
 )
@@ -22,6 +27,7 @@ from ostracion_app.utilities.database.sqliteEngine import (
     dbRetrieveAllRecords,
     dbAddRecordToTable,
     dbRetrieveRecordByKey,
+    dbRetrieveRecordsByKeyIn,
     dbUpdateRecordOnTable,
     dbDeleteRecordsByKey,
 )
@@ -90,13 +96,52 @@ def dbGetAllUsers(db, user, accountDeletionInProgress=False):
         raise OstracionError('Insufficient permissions')
 
 
+def _userFullNameCache():
+    """ The request-scoped username -> fullname map (None if no request)."""
+    if has_app_context():
+        if '_userFullNames' not in g:
+            g._userFullNames = {}
+        return g._userFullNames
+    else:
+        return None
+
+
+def preloadUserFullNames(db, usernames):
+    """ Resolve, with a single query, the full names of several users,
+        so that subsequent getUserFullName calls in the request
+        do not hit the database.
+    """
+    fullNameCache = _userFullNameCache()
+    if fullNameCache is not None:
+        missingUsernames = {
+            un
+            for un in usernames
+            if un not in fullNameCache
+        }
+        if len(missingUsernames) > 0:
+            for userDict in dbRetrieveRecordsByKeyIn(
+                db,
+                'users',
+                'username',
+                sorted(missingUsernames),
+                dbTablesDesc=dbSchema,
+            ):
+                fullNameCache[userDict['username']] = userDict['fullname']
+            for un in missingUsernames - fullNameCache.keys():
+                fullNameCache[un] = '(no user)'
+
+
 def getUserFullName(db, username):
     """Resolve a username to the current full name."""
-    fUser = dbGetUser(db, username)
-    if fUser is None:
-        return '(no user)'
+    fullNameCache = _userFullNameCache()
+    if fullNameCache is not None and username in fullNameCache:
+        return fullNameCache[username]
     else:
-        return fUser.fullname
+        fUser = dbGetUser(db, username)
+        fullName = '(no user)' if fUser is None else fUser.fullname
+        if fullNameCache is not None:
+            fullNameCache[username] = fullName
+        return fullName
 
 
 def dbUpdateUser(db, newUser, user, skipCommit=False):
@@ -108,6 +153,9 @@ def dbUpdateUser(db, newUser, user, skipCommit=False):
             newUser.asDict(),
             dbTablesDesc=dbSchema,
         )
+        fullNameCache = _userFullNameCache()
+        if fullNameCache is not None:
+            fullNameCache.pop(newUser.username, None)
         if not skipCommit:
             db.commit()
     else:
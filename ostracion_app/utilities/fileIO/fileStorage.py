@@ -3,6 +3,8 @@
     both as regular uploads and as thumbnails.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
 from ostracion_app.utilities.tools.dictTools import (
     recursivelyMergeDictionaries,
 )
@@ -26,6 +28,7 @@ from ostracion_app.utilities.fileIO.thumbnails import (
     isImageMimeType,
     makeFileThumbnail,
     makeTempFileIntoThumbnail,
+    makeFileDerivatives,
 )
 
 from ostracion_app.utilities.database.fileSystem import (
@@ -44,6 +47,14 @@ from ostracion_app.utilities.database.settingsTools import (
     updateSettingThumbnail,
 )
 
+from ostracion_app.utilities.database.thumbnailJobs import (
+    dbEnqueueThumbnailJob,
+)
+
+from ostracion_app.utilities.database.fileDerivatives import (
+    dbStoreFileDerivatives,
+)
+
 from ostracion_app.utilities.database.permissions import (
     userHasPermission,
     userIsAdmin,
@@ -55,12 +66,55 @@ from ostracion_app.utilities.fileIO.physical import (
 
 from ostracion_app.utilities.models.File import File
 
+from config import (
+    asyncThumbnailGeneration,
+    uploadProcessingThreads,
+    imageDerivativeWidths,
+)
+
 # App-items handling import
 from ostracion_app.views.apps.appRegisteredPlugins import (
     appsSetIconModes,
 )
 
 
+def _analyseStoredFile(fileId, thumbnailFormat, makeDerivatives,
+                       fileStorageDirectory):
+    """ Determine the properties of a just-stored file and, if
+        it is an image, make its thumbnail (if a thumbnailFormat is given)
+        and its reduced renditions (if makeDerivatives).
+        Touches no DB, hence can run on a worker thread.
+    """
+    fileProperties = determineFileProperties(fileIdToPath(
+        fileId,
+        fileStorageDirectory=fileStorageDirectory,
+    ))
+    mimeType = fileProperties['file_mime_type']
+    if thumbnailFormat is not None and isImageMimeType(mimeType):
+        thumbnailId, thumbnailMimeType = makeFileThumbnail(
+            fileId,
+            mimeType,
+            thumbnailFormat=thumbnailFormat,
+            fileStorageDirectory=fileStorageDirectory,
+        )
+    else:
+        thumbnailId, thumbnailMimeType = None, None
+    if makeDerivatives:
+        derivatives = makeFileDerivatives(
+            fileId,
+            mimeType,
+            fileStorageDirectory=fileStorageDirectory,
+        )
+    else:
+        derivatives = []
+    return {
+        'properties': fileProperties,
+        'thumbnail_id': thumbnailId,
+        'thumbnail_mime_type': thumbnailMimeType,
+        'derivatives': derivatives,
+    }
+
+
 def saveAndAnalyseFilesInBox(db, files, parentBox, user, thumbnailFormat,
                              fileStorageDirectory,
                              pastActionVerbForm='uploaded'):
@@ -85,7 +139,9 @@ def saveAndAnalyseFilesInBox(db, files, parentBox, user, thumbnailFormat,
             userName = user.username
             fsDeletionQueue = []
             numReplacements = 0
-            #
+            # files are stored, then analysed and (possibly) thumbnailed
+            # concurrently; DB changes then follow, in order, here
+            newFiles = []
             for file in files:
                 newFile = File(**recursivelyMergeDictionaries(
                     {
@@ -101,6 +157,31 @@ def saveAndAnalyseFilesInBox(db, files, parentBox, user, thumbnailFormat,
                         'textual_mode': 'plain',
                     },
                 ))
+                file['fileObject'].save(fileIdToPath(
+                    newFile.file_id,
+                    fileStorageDirectory=fileStorageDirectory,
+                ))
+                newFiles.append(newFile)
+            #
+            syncThumbnailFormat = (thumbnailFormat
+                                   if not asyncThumbnailGeneration
+                                   else None)
+            with ThreadPoolExecutor(
+                    max_workers=max(1, min(
+                        uploadProcessingThreads,
+                        len(newFiles),
+                    ))) as executor:
+                analyses = list(executor.map(
+                    lambda nF: _analyseStoredFile(
+                        nF.file_id,
+                        syncThumbnailFormat,
+                        not asyncThumbnailGeneration,
+                        fileStorageDirectory,
+                    ),
+                    newFiles,
+                ))
+            #
+            for newFile, analysis in zip(newFiles, analyses):
                 # are we overwriting a file?
                 if isFileNameUnderParentBox(db, parentBox, newFile.name):
                     # delete the old file entry
@@ -122,33 +203,40 @@ def saveAndAnalyseFilesInBox(db, files, parentBox, user, thumbnailFormat,
                     )
                     numReplacements += 1
                 #
-                filePath = fileIdToPath(
-                    newFile.file_id,
-                    fileStorageDirectory=fileStorageDirectory,
-                )
-                file['fileObject'].save(filePath)
-                #
-                fileProperties = determineFileProperties(filePath)
+                fileProperties = analysis['properties']
                 newFile.mime_type = fileProperties['file_mime_type']
                 newFile.type = fileProperties['file_type']
                 newFile.size = fileProperties['file_size']
+                if analysis['thumbnail_id'] is not None:
+                    newFile.icon_file_id = analysis['thumbnail_id']
+                    newFile.icon_mime_type = analysis['thumbnail_mime_type']
                 #
-                if (thumbnailFormat is not None and
-                        isImageMimeType(newFile.mime_type)):
-                    # thumbnail preparation
-                    fileThumbnailId, fileThumbnailMimeType = makeFileThumbnail(
+                makeFileInParent(
+                    db,
+                    parentBox=parentBox,
+                    newFile=newFile,
+                    skipCommit=True,
+                )
+                dbStoreFileDerivatives(
+                    db,
+                    newFile.file_id,
+                    analysis['derivatives'],
+                    skipCommit=True,
+                )
+                if (asyncThumbnailGeneration and
+                        isImageMimeType(newFile.mime_type) and
+                        (thumbnailFormat is not None or
+                            len(imageDerivativeWidths) > 0)):
+                    # the file shows the default icon until a worker is done
+                    dbEnqueueThumbnailJob(
+                        db,
                         newFile.file_id,
                         newFile.mime_type,
-                        thumbnailFormat=thumbnailFormat,
-                        fileStorageDirectory=fileStorageDirectory,
+                        thumbnailFormat,
+                        skipCommit=True,
                     )
-                    if fileThumbnailId is not None:
-                        newFile.icon_file_id = fileThumbnailId
-                        newFile.icon_mime_type = fileThumbnailMimeType
-                #
-                makeFileInParent(db, parentBox=parentBox, newFile=newFile)
-            flushFsDeleteQueue(fsDeletionQueue)
             db.commit()
+            flushFsDeleteQueue(fsDeletionQueue)
             return '%i file%s %s successfully%s.' % (
                 len(files),
                 '' if len(files) == 1 else 's',
@@ -21,6 +21,14 @@ from ostracion_app.utilities.database.tickets import (
     dbPunchTicket,
 )
 
+from ostracion_app.utilities.database.fileDerivatives import (
+    dbGetFileDerivatives,
+)
+
+from ostracion_app.utilities.tools.dictTools import (
+    recursivelyMergeDictionaries,
+)
+
 
 def isFileViewable(file):
     """Does the file belong to the viewable mime types?"""
@@ -52,6 +60,64 @@ def fileViewingClass(file):
         return file.textual_mode
 
 
+def _makeImageSrcsets(db, file, mode, viewParameters):
+    """ Prepare the 'srcset' attributes (plain and WebP) listing
+        the reduced renditions of an image, if any, for in-page viewing.
+        The original, the widest candidate, is in both
+        (in the WebP one only if there are WebP renditions at all).
+    """
+    if mode == 'fsview':
+        def renditionUrl(width, fmt):
+            return url_for(
+                'fsRenditionView',
+                fsPathString='/'.join(
+                    viewParameters['boxPath'][1:]
+                    + [viewParameters['fileName']]
+                ),
+                w=width,
+                fmt=fmt,
+            )
+    elif mode == 'galleryview':
+        def renditionUrl(width, fmt):
+            return url_for(
+                'ticketGalleryFsView',
+                ticketId=viewParameters['ticketId'],
+                securityCode=viewParameters['securityCode'],
+                fileName=viewParameters['fileName'],
+                w=width,
+                fmt=fmt,
+            )
+    else:
+        # single-file tickets: just the original
+        return {}
+    derivatives = dbGetFileDerivatives(db, file.file_id)
+    if any(d['mime_type'] == 'image/webp' for d in derivatives):
+        webpDerivatives = [
+            d
+            for d in derivatives
+            if d['mime_type'] == 'image/webp' or d['rendition'] == 'original'
+        ]
+    else:
+        webpDerivatives = []
+    return {
+        'srcset': ', '.join(
+            '%s %iw' % (renditionUrl(d['width'], None), d['width'])
+            for d in derivatives
+            if d['mime_type'] != 'image/webp'
+        ),
+        'webp_srcset': ', '.join(
+            '%s %iw' % (
+                renditionUrl(
+                    d['width'],
+                    'webp' if d['mime_type'] == 'image/webp' else None,
+                ),
+                d['width'],
+            )
+            for d in webpDerivatives
+        ),
+    }
+
+
 def produceFileViewContents(db, file, mode, viewParameters,
                             fileStorageDirectory, urlRoot=None,
                             protectBannedUserTickets=None):
@@ -108,10 +174,33 @@ def produceFileViewContents(db, file, mode, viewParameters,
             )
         else:
             raise ValueError('Unhandled mode in produceFileViewContents')
-        fileContents = {
-            'mode': 'image',
-            'value': imgValue,
-        }
+        fileContents = recursivelyMergeDictionaries(
+            {
+                'mode': 'image',
+                'value': imgValue,
+            },
+            defaultMap=_makeImageSrcsets(db, file, mode, viewParameters),
+        )
+    elif fViewClass in {'audio', 'video'}:
+        if mode == 'fsview':
+            # the player seeks through range requests to the download URL
+            fileContents = {
+                'mode': fViewClass,
+                'value': url_for(
+                    'fsDownloadView',
+                    fsPathString='/'.join(
+                        viewParameters['boxPath'][1:]
+                        + [viewParameters['fileName']]
+                    ),
+                ),
+                'mime_type': file.mime_type,
+            }
+        else:
+            # each (range) request by the player would punch the ticket
+            fileContents = {
+                'mode': 'error',
+                'value': 'Please download the file to play it.',
+            }
     else:
         fileContents = {
             'mode': 'error',
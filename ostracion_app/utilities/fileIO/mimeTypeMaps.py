@@ -41,3 +41,8 @@ textualEditableMimeTypes = {
     mimeTypeClassification[
         'viewable_mime_types_by_view_mode'].get('textual', [])
 }
+
+# types not worth compressing again when put in an archive
+archiveStoredMimeTypes = set(
+    mimeTypeClassification['archive_stored_mime_types']
+)
@@ -0,0 +1,175 @@
+""" pillowThumbnails.py
+    In-process thumbnail preparation with Pillow, reproducing
+    what resizeToThumbnail asks to ImageMagick's "convert", i.e.
+        -auto-orient -thumbnail WxH^ -gravity center -extent WxH -strip
+    (or only -auto-orient -strip for formats without a size),
+    plus the reduced renditions of images at a given width.
+
+    Pillow is an optional dependency: if it is missing, or if it
+    cannot handle an image (e.g. animated GIFs), the caller
+    is told so and can fall back to ImageMagick.
+"""
+
+import math
+
+try:
+    from PIL import (
+        Image,
+        ImageOps,
+    )
+    pillowAvailable = True
+except ImportError:
+    pillowAvailable = False
+
+# output encoding parameters, per format
+pillowSaveOptions = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'WEBP': {'quality': 90},
+    'PNG': {'optimize': False},
+}
+# modes which the Lanczos filter cannot resize directly
+pillowModeConversions = {
+    '1': 'L',
+    'P': 'RGBA',
+    'LA': 'RGBA',
+    'I;16': 'I',
+}
+# modes which can be saved as JPEG (others are converted to RGB)
+pillowJpegModes = {'RGB', 'L', 'CMYK'}
+
+
+def _exifOrientation(image):
+    """ Read the EXIF orientation tag (1 if absent or unreadable)."""
+    try:
+        return image.getexif().get(0x0112, 1)
+    except Exception:
+        return 1
+
+
+def _fillScale(srcX, srcY, dstX, dstY):
+    """ Scale factor making (srcX, srcY) cover the whole (dstX, dstY)
+        box, as ImageMagick's "WxH^" geometry does.
+    """
+    return max(dstX / srcX, dstY / srcY)
+
+
+def pillowResizeToThumbnail(srcFile, dstFile, sizeX, sizeY):
+    """ Resize an image file into dstFile, filling (sizeX, sizeY)
+        and cropping the excess around the center. With sizeX, sizeY
+        None the image is only auto-oriented and stripped.
+
+        Return True upon success, False if Pillow is unavailable
+        or the image is not one this function handles.
+    """
+    if not pillowAvailable:
+        return False
+    try:
+        with Image.open(srcFile) as image:
+            if getattr(image, 'is_animated', False):
+                # animations are kept whole by ImageMagick only
+                return False
+            srcFormat = image.format
+            orientation = _exifOrientation(image)
+            # orientations 5-8 swap the two axes
+            transposed = orientation in {5, 6, 7, 8}
+            if sizeX is not None and sizeY is not None:
+                srcX, srcY = image.size
+                if transposed:
+                    scale = _fillScale(srcY, srcX, sizeX, sizeY)
+                else:
+                    scale = _fillScale(srcX, srcY, sizeX, sizeY)
+                # JPEGs: decode directly at a reduced (>= needed) scale
+                image.draft(
+                    image.mode,
+                    (
+                        math.ceil(srcX * scale),
+                        math.ceil(srcY * scale),
+                    ),
+                )
+            image.load()
+            workImage = ImageOps.exif_transpose(image)
+            if workImage.mode in pillowModeConversions:
+                workImage = workImage.convert(
+                    pillowModeConversions[workImage.mode],
+                )
+            if sizeX is not None and sizeY is not None:
+                workImage = ImageOps.fit(
+                    workImage,
+                    (sizeX, sizeY),
+                    method=Image.LANCZOS,
+                    centering=(0.5, 0.5),
+                )
+            if srcFormat == 'JPEG' and workImage.mode not in pillowJpegModes:
+                workImage = workImage.convert('RGB')
+            # saving without 'exif'/'icc_profile' strips the metadata
+            workImage.save(
+                dstFile,
+                format=srcFormat,
+                **pillowSaveOptions.get(srcFormat, {})
+            )
+        return True
+    except (IOError, OSError, ValueError, KeyError):
+        return False
+
+
+def pillowImageSize(srcFile):
+    """ Return the (width, height) of an image as displayed,
+        i.e. after auto-orientation; None if Pillow cannot tell.
+    """
+    if not pillowAvailable:
+        return None
+    try:
+        with Image.open(srcFile) as image:
+            sizeX, sizeY = image.size
+            if _exifOrientation(image) in {5, 6, 7, 8}:
+                return sizeY, sizeX
+            else:
+                return sizeX, sizeY
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def pillowResizeToWidth(srcFile, dstFile, width, dstFormat):
+    """ Make an auto-oriented, stripped, reduced copy of an image
+        with the given width (height following the aspect ratio),
+        saved in 'dstFormat' (e.g. 'JPEG', 'WEBP').
+
+        Return True upon success, False if Pillow cannot do it.
+    """
+    if not pillowAvailable:
+        return False
+    try:
+        with Image.open(srcFile) as image:
+            if getattr(image, 'is_animated', False):
+                return False
+            srcX, srcY = image.size
+            if _exifOrientation(image) in {5, 6, 7, 8}:
+                # the target width applies to the (pre-rotation) height
+                scale = width / srcY
+            else:
+                scale = width / srcX
+            image.draft(
+                image.mode,
+                (math.ceil(srcX * scale), math.ceil(srcY * scale)),
+            )
+            image.load()
+            workImage = ImageOps.exif_transpose(image)
+            if workImage.mode in pillowModeConversions:
+                workImage = workImage.convert(
+                    pillowModeConversions[workImage.mode],
+                )
+            workX, workY = workImage.size
+            workImage = workImage.resize(
+                (width, max(1, round(workY * width / workX))),
+                Image.LANCZOS,
+            )
+            if dstFormat == 'JPEG' and workImage.mode not in pillowJpegModes:
+                workImage = workImage.convert('RGB')
+            workImage.save(
+                dstFile,
+                format=dstFormat,
+                **pillowSaveOptions.get(dstFormat, {})
+            )
+        return True
+    except (IOError, OSError, ValueError, KeyError):
+        return False
@@ -5,8 +5,20 @@
 """
 
 import os
+import threading
 import magic
 
+# libmagic handles are not shared between threads (the module-level
+# ones of python-magic are serialized by a lock): one pair per thread
+_magicHandles = threading.local()
+
+
+def _getMagicHandles():
+    """ Return the (description, mime) Magic instances of this thread."""
+    if not hasattr(_magicHandles, 'pair'):
+        _magicHandles.pair = (magic.Magic(), magic.Magic(mime=True))
+    return _magicHandles.pair
+
 
 def determineFileProperties(filepath):
     """ Given a path to a stored file, determine
@@ -17,12 +29,13 @@ def determineFileProperties(filepath):
         'file_mime_type': '',
         'file_size': 0,
     }
+    descriptionMagic, mimeMagic = _getMagicHandles()
     try:
-        fileType['file_type'] = magic.from_file(filepath)
+        fileType['file_type'] = descriptionMagic.from_file(filepath)
     except Exception:
         pass
     try:
-        fileType['file_mime_type'] = magic.from_file(filepath, mime=True)
+        fileType['file_mime_type'] = mimeMagic.from_file(filepath)
     except Exception:
         pass
     try:
@@ -0,0 +1,167 @@
+""" thumbnailChecks.py
+    Physical side of the thumbnail integrity check: for an item
+    (as listed by dbListThumbnailItems) verify that its thumbnail
+    is there and up to date, and prepare a replacement if needed.
+
+    These functions do not touch the DB, so that they can run
+    in a pool of worker processes; the outcome is then applied
+    by the caller with dbReplaceItemThumbnail.
+"""
+
+import os
+from uuid import uuid4
+
+from ostracion_app.utilities.fileIO.thumbnails import (
+    thumbnailFormatMap,
+    imageDisplaySize,
+    makeFileThumbnail,
+    resizeToThumbnail,
+)
+
+from ostracion_app.utilities.fileIO.mimeTypeMaps import (
+    imageMimeTypeToResizeMethodMap,
+)
+
+from ostracion_app.utilities.fileIO.physical import (
+    fileIdToPath,
+    flushFsDeleteQueue,
+)
+
+
+def _isThumbnailStale(iconPath, iconMimeType, thumbnailFormat,
+                      staleBefore):
+    """ Whether an existing thumbnail file should be made anew:
+        it was written before 'staleBefore' (a timestamp, if given),
+        or its size is not that of its thumbnail format
+        (e.g. thumbnailFormatMap has changed, or it is unreadable).
+    """
+    if staleBefore is not None and os.path.getmtime(iconPath) < staleBefore:
+        return True
+    fmtMap = thumbnailFormatMap.get(thumbnailFormat, {})
+    if (imageMimeTypeToResizeMethodMap.get(iconMimeType) == 'resize' and
+            fmtMap.get('x') is not None and fmtMap.get('y') is not None):
+        return imageDisplaySize(iconPath) != (fmtMap['x'], fmtMap['y'])
+    else:
+        return False
+
+
+def _hasSourceFile(item, fileStorageDirectory):
+    """ Whether the item is an image file which is physically there."""
+    return item['source_file_id'] is not None and os.path.isfile(
+        fileIdToPath(
+            item['source_file_id'],
+            fileStorageDirectory=fileStorageDirectory,
+        )
+    )
+
+
+def _remakeThumbnail(item, iconState, fileStorageDirectory):
+    """ Make a new thumbnail for an item: from the original if it is
+        an image file, otherwise (stale thumbnails only) from the
+        current thumbnail itself.
+        Return (newIconFileId, newIconMimeType), (None, None) on failure.
+    """
+    if _hasSourceFile(item, fileStorageDirectory):
+        return makeFileThumbnail(
+            item['source_file_id'],
+            item['source_mime_type'],
+            thumbnailFormat=item['thumbnail_format'],
+            fileStorageDirectory=fileStorageDirectory,
+        )
+    elif (iconState == 'stale' and
+            imageMimeTypeToResizeMethodMap.get(
+                item['icon_mime_type']) == 'resize'):
+        newId = uuid4().hex
+        newPath = fileIdToPath(
+            newId,
+            fileStorageDirectory=fileStorageDirectory,
+        )
+        if resizeToThumbnail(
+                fileIdToPath(
+                    item['icon_file_id'],
+                    fileStorageDirectory=fileStorageDirectory,
+                ),
+                newPath,
+                thumbnailFormat=item['thumbnail_format']):
+            return newId, item['icon_mime_type']
+        else:
+            flushFsDeleteQueue([newPath])
+            return None, None
+    else:
+        return None, None
+
+
+def _canRemakeThumbnail(item, iconState, fileStorageDirectory):
+    """ Whether _remakeThumbnail has something to start from
+        (used to describe the actions of a dry run).
+    """
+    return _hasSourceFile(item, fileStorageDirectory) or (
+        iconState == 'stale' and
+        imageMimeTypeToResizeMethodMap.get(item['icon_mime_type']) == 'resize'
+    )
+
+
+def checkThumbnailItem(item, fileStorageDirectory, staleBefore=None,
+                       remakeAll=False, dryRun=False):
+    """ Check the thumbnail of an item and, unless in a dry run,
+        prepare what is needed to fix it. Return a dict with:
+            'item'
+            'state': 'ok', 'missing' or 'stale'
+            'action': None, 'remake' (new thumbnail ready),
+                      'reset' (go back to the default icon)
+                      or 'unfixable' (leave as it is)
+            'icon_file_id', 'icon_mime_type': the new thumbnail, if any
+            'error': a message for failures
+        A missing thumbnail which cannot be made anew is reset,
+        a stale one is kept. With 'remakeAll' all thumbnails are stale.
+    """
+    result = {
+        'item': item,
+        'state': 'ok',
+        'action': None,
+        'icon_file_id': None,
+        'icon_mime_type': None,
+        'error': None,
+    }
+    try:
+        iconPath = fileIdToPath(
+            item['icon_file_id'],
+            fileStorageDirectory=fileStorageDirectory,
+        )
+        if not os.path.isfile(iconPath):
+            result['state'] = 'missing'
+        elif remakeAll or _isThumbnailStale(
+                iconPath,
+                item['icon_mime_type'],
+                item['thumbnail_format'],
+                staleBefore):
+            result['state'] = 'stale'
+        #
+        if result['state'] != 'ok':
+            if dryRun:
+                if _canRemakeThumbnail(item, result['state'],
+                                       fileStorageDirectory):
+                    result['action'] = 'remake'
+                elif result['state'] == 'missing':
+                    result['action'] = 'reset'
+                else:
+                    result['action'] = 'unfixable'
+            else:
+                newIconFileId, newIconMimeType = _remakeThumbnail(
+                    item,
+                    result['state'],
+                    fileStorageDirectory,
+                )
+                if newIconFileId is not None:
+                    result['action'] = 'remake'
+                    result['icon_file_id'] = newIconFileId
+                    result['icon_mime_type'] = newIconMimeType
+                elif result['state'] == 'missing':
+                    result['action'] = 'reset'
+                else:
+                    result['action'] = 'unfixable'
+                    result['error'] = 'could not make a new thumbnail'
+    except Exception as e:
+        result['action'] = 'unfixable'
+        result['error'] = str(e)
+    return result
@@ -0,0 +1,160 @@
+""" thumbnailWorkers.py
+    Background processes consuming the thumbnail job queue:
+    each worker claims a job, prepares the thumbnail and the renditions
+    and attaches them to the file (see thumbnail_worker.py
+    for the command line).
+"""
+
+import os
+import time
+import multiprocessing
+from uuid import uuid4
+
+from ostracion_app.utilities.database.dbTools import (
+    dbGetDatabase,
+)
+
+from ostracion_app.utilities.database.settingsTools import (
+    dbGetSetting,
+)
+
+from ostracion_app.utilities.database.thumbnailJobs import (
+    dbClaimThumbnailJob,
+    dbCompleteThumbnailJob,
+    dbDiscardThumbnailJob,
+    dbFailThumbnailJob,
+    dbRequeueStaleThumbnailJobs,
+    dbGetThumbnailJobFile,
+)
+
+from ostracion_app.utilities.fileIO.thumbnails import (
+    makeFileThumbnail,
+    makeFileDerivatives,
+)
+
+from ostracion_app.utilities.exceptions.exceptions import (
+    OstracionError,
+)
+
+from ostracion_app.utilities.fileIO.physical import (
+    fileIdToPath,
+    flushFsDeleteQueue,
+)
+
+from config import (
+    thumbnailWorkerPollSeconds,
+    thumbnailJobMaxAttempts,
+    thumbnailJobTimeoutSeconds,
+)
+
+
+def processThumbnailJob(db, job, fileStorageDirectory):
+    """ Carry out a claimed job, recording its outcome on the queue.
+        Return True if the job was completed.
+    """
+    if dbGetThumbnailJobFile(db, job) is None:
+        # file deleted in the meantime: nothing to do
+        dbDiscardThumbnailJob(db, job)
+        return False
+    iconFileId, iconMimeType = None, None
+    derivatives = []
+    try:
+        if job.thumbnail_format is not None:
+            iconFileId, iconMimeType = makeFileThumbnail(
+                job.file_id,
+                job.mime_type,
+                thumbnailFormat=job.thumbnail_format,
+                fileStorageDirectory=fileStorageDirectory,
+            )
+            if iconFileId is None:
+                raise OstracionError('Could not make a thumbnail')
+        derivatives = makeFileDerivatives(
+            job.file_id,
+            job.mime_type,
+            fileStorageDirectory=fileStorageDirectory,
+        )
+    except Exception as e:
+        flushFsDeleteQueue(
+            _producedFilePaths(iconFileId, derivatives, job.file_id,
+                               fileStorageDirectory),
+        )
+        dbFailThumbnailJob(db, job, str(e), thumbnailJobMaxAttempts)
+        return False
+    iconAttached, derivativesAttached, fsDeleteQueue = dbCompleteThumbnailJob(
+        db,
+        job,
+        iconFileId,
+        iconMimeType,
+        derivatives,
+        fileStorageDirectory=fileStorageDirectory,
+    )
+    # file gone, or given an icon by the user, meanwhile
+    flushFsDeleteQueue(fsDeleteQueue + _producedFilePaths(
+        iconFileId if not iconAttached else None,
+        derivatives if not derivativesAttached else [],
+        job.file_id,
+        fileStorageDirectory,
+    ))
+    return True
+
+
+def _producedFilePaths(iconFileId, derivatives, fileId,
+                       fileStorageDirectory):
+    """ Physical paths of the thumbnail/renditions made for a file."""
+    return [
+        fileIdToPath(pFileId, fileStorageDirectory=fileStorageDirectory)
+        for pFileId in (
+            ([iconFileId] if iconFileId is not None else []) + [
+                d['derivative_file_id']
+                for d in derivatives
+                if d['derivative_file_id'] != fileId
+            ]
+        )
+    ]
+
+
+def runThumbnailWorker(drain=False):
+    """ Process jobs one after the other. If 'drain', return as soon
+        as no pending jobs are left; otherwise keep polling forever.
+        Return the number of jobs processed.
+    """
+    workerId = '%i_%s' % (os.getpid(), uuid4().hex[:8])
+    db = dbGetDatabase()
+    fileStorageDirectory = dbGetSetting(
+        db,
+        'system',
+        'system_directories',
+        'fs_directory',
+        None,
+    )['value']
+    numProcessed = 0
+    dbRequeueStaleThumbnailJobs(db, thumbnailJobTimeoutSeconds)
+    while True:
+        job = dbClaimThumbnailJob(db, workerId)
+        if job is not None:
+            processThumbnailJob(db, job, fileStorageDirectory)
+            numProcessed += 1
+        elif drain:
+            break
+        else:
+            time.sleep(thumbnailWorkerPollSeconds)
+            dbRequeueStaleThumbnailJobs(db, thumbnailJobTimeoutSeconds)
+    db.close()
+    return numProcessed
+
+
+def runThumbnailWorkerPool(numProcesses, drain=False):
+    """ Run several workers as separate processes
+        (each with its own DB connection) and wait for them.
+    """
+    workers = [
+        multiprocessing.Process(
+            target=runThumbnailWorker,
+            kwargs={'drain': drain},
+        )
+        for _ in range(numProcesses)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
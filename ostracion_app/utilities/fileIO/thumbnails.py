@@ -3,6 +3,7 @@
     (thumbnail chosen among the statically configured ones).
 """
 
+import os
 import hashlib
 import shutil
 import subprocess
@@ -23,8 +24,17 @@ from ostracion_app.utilities.fileIO.mimeTypeMaps import (
     imageMimeTypeToResizeMethodMap,
 )
 
+from ostracion_app.utilities.fileIO.pillowThumbnails import (
+    pillowResizeToThumbnail,
+    pillowImageSize,
+    pillowResizeToWidth,
+)
+
 from config import (
     managedImagesDirectory,
+    thumbnailResizeBackend,
+    imageDerivativeWidths,
+    imageDerivativesWebP,
 )
 
 thumbnailFormatMap = {
@@ -129,7 +139,30 @@ def resizeToThumbnail(srcFile, dstFile, thumbnailFormat):
     """ Resize a file (srcFile -> dstFile, actual filename paths)
         according to the thumbnail format specified.
         Return True upon success.
+
+        The configured backend is tried first, ImageMagick being
+        the fallback for whatever the other backends cannot handle.
     """
+    if thumbnailResizeBackend != 'imagemagick':
+        if thumbnailResizeBackends[thumbnailResizeBackend](
+                srcFile, dstFile, thumbnailFormat):
+            return True
+    return imageMagickResizeToThumbnail(srcFile, dstFile, thumbnailFormat)
+
+
+def pillowBackendResizeToThumbnail(srcFile, dstFile, thumbnailFormat):
+    """ Resize with the in-process Pillow backend."""
+    fmtMap = thumbnailFormatMap[thumbnailFormat]
+    return pillowResizeToThumbnail(
+        srcFile,
+        dstFile,
+        fmtMap['x'],
+        fmtMap['y'],
+    )
+
+
+def imageMagickResizeToThumbnail(srcFile, dstFile, thumbnailFormat):
+    """ Resize by running ImageMagick's "convert" as a subprocess."""
     rThumbArg, rExtentArg = makeResizeGeometryStringArgs(thumbnailFormat)
     resizingArguments = [
         arg
@@ -159,6 +192,131 @@ def resizeToThumbnail(srcFile, dstFile, thumbnailFormat):
     return resizingOutput.returncode == 0
 
 
+thumbnailResizeBackends = {
+    'pillow': pillowBackendResizeToThumbnail,
+    'imagemagick': imageMagickResizeToThumbnail,
+}
+
+# format of the renditions, when different from the original
+derivativeMimeTypeMap = {
+    'image/x-ms-bmp': 'image/png',
+}
+# format names, for Pillow and for ImageMagick
+derivativeFormatNames = {
+    'image/jpeg': ('JPEG', 'jpg'),
+    'image/png': ('PNG', 'png'),
+    'image/gif': ('GIF', 'gif'),
+    'image/webp': ('WEBP', 'webp'),
+}
+
+
+def imageDisplaySize(srcFile):
+    """ Return (width, height) of an image after auto-orientation,
+        or None if it cannot be determined.
+    """
+    if thumbnailResizeBackend == 'pillow':
+        size = pillowImageSize(srcFile)
+        if size is not None:
+            return size
+    identifyOutput = subprocess.run(
+        [
+            'convert',
+            '%s[0]' % srcFile,
+            '-auto-orient',
+            '-format',
+            '%w %h',
+            'info:',
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        sizeX, sizeY = identifyOutput.stdout.decode().split()[:2]
+        return int(sizeX), int(sizeY)
+    except ValueError:
+        return None
+
+
+def resizeToWidth(srcFile, dstFile, width, dstMimeType):
+    """ Make a reduced, auto-oriented and stripped rendition of an image.
+        Return True upon success.
+    """
+    pillowFormat, imageMagickFormat = derivativeFormatNames[dstMimeType]
+    if thumbnailResizeBackend == 'pillow':
+        if pillowResizeToWidth(srcFile, dstFile, width, pillowFormat):
+            return True
+    resizingOutput = subprocess.run(
+        [
+            'convert',
+            srcFile,
+            '-auto-orient',
+            '-resize',
+            '%ix' % width,
+            '-strip',
+            '%s:%s' % (imageMagickFormat, dstFile),
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    return resizingOutput.returncode == 0
+
+
+def makeFileDerivatives(srcFileId, mimeType, fileStorageDirectory):
+    """ Make the reduced renditions of an image file, for the configured
+        widths smaller than the image. Return the list of their
+        descriptions, ready for dbStoreFileDerivatives, always
+        including the original itself with its real width
+        (empty if the file cannot have renditions).
+    """
+    if (imageMimeTypeToResizeMethodMap.get(mimeType) != 'resize' or
+            len(imageDerivativeWidths) == 0):
+        return []
+    srcFile = fileIdToPath(
+        srcFileId,
+        fileStorageDirectory=fileStorageDirectory,
+    )
+    size = imageDisplaySize(srcFile)
+    if size is None:
+        return []
+    srcX, srcY = size
+    dstMimeType = derivativeMimeTypeMap.get(mimeType, mimeType)
+    dstMimeTypes = [dstMimeType] + (
+        ['image/webp']
+        if imageDerivativesWebP and dstMimeType != 'image/webp'
+        else []
+    )
+    derivatives = []
+    for width in sorted(imageDerivativeWidths):
+        if width < srcX:
+            for dMimeType in dstMimeTypes:
+                newId = uuid4().hex
+                dstFile = fileIdToPath(
+                    newId,
+                    fileStorageDirectory=fileStorageDirectory,
+                )
+                if resizeToWidth(srcFile, dstFile, width, dMimeType):
+                    derivatives.append({
+                        'rendition': 'w%i%s' % (
+                            width,
+                            '_webp' if dMimeType != dstMimeType else '',
+                        ),
+                        'derivative_file_id': newId,
+                        'mime_type': dMimeType,
+                        'width': width,
+                        'height': max(1, round(srcY * width / srcX)),
+                        'size': os.path.getsize(dstFile),
+                    })
+    derivatives.append({
+        'rendition': 'original',
+        'derivative_file_id': srcFileId,
+        'mime_type': mimeType,
+        'width': srcX,
+        'height': srcY,
+        'size': os.path.getsize(srcFile),
+    })
+    return derivatives
+
+
 def determineManagedTextImagePath(txt, prefix=''):
     """ Given a text, construct the
         path/filename/hashed-tag of the text-image.
@@ -1,28 +1,361 @@
 """ zipFileUtilities.py:
     tools to interact with 'zip' files
+
+    Archives are written as a stream, never needing the whole
+    archive (nor a seekable file) at any time: each deflated entry is
+    a local header, followed by the data and then by a 'data descriptor'
+    with CRC and sizes, known only at that point. The central directory
+    comes at the end. ZIP64 extensions are used when needed.
+
+    Entries can also be stored as they are, which is much cheaper for
+    contents already compressed (e.g. JPEGs). Stored entries cannot
+    have a data descriptor (streaming readers would not know where
+    their data ends), so their CRC is computed in a first pass over
+    the data and written, with the sizes, in the local header.
 """
 
-import zipfile
+import time
+import zlib
+import struct
+from functools import partial
 
+from ostracion_app.utilities.fileIO.mimeTypeMaps import (
+    archiveStoredMimeTypes,
+)
 
-def makeZipFile(zipFileName, sourceFilePairs, sourceDataPairs):
-    """
-        fileName is the path of the zip-file to create
-        sourceFilePairs is a list [
-            (full_source_file_path, path_in_archive)
-        ]
+# bytes read at a time from the files being archived
+zipStreamingChunkSize = 65536
+
+# sizes, offsets and counts beyond these require ZIP64 extensions
+zip64SizeLimit = 0xFFFFFFFF
+zip64CountLimit = 0xFFFF
+# versions "needed to extract": plain deflate, ZIP64
+zipVersionDefault = 20
+zipVersionZip64 = 45
+# "made by" a Unix system, so that file permissions are honoured
+zipMadeByUnix = 3 << 8
+# general purpose flags: UTF-8 names, with data descriptor
+# (deflated entries) or without (stored entries)
+zipFlagsDeflated = 0x0008 | 0x0800
+zipFlagsStored = 0x0800
+zipMethodStored = 0
+zipMethodDeflated = 8
+# permissions of the archived entries (-rw-r--r--)
+zipEntryExternalAttributes = 0o100644 << 16
+
+zipLocalHeaderSignature = 0x04034b50
+zipDataDescriptorSignature = 0x08074b50
+zipCentralDirectorySignature = 0x02014b50
+zip64EndOfCentralDirectorySignature = 0x06064b50
+zip64EndOfCentralDirectoryLocatorSignature = 0x07064b50
+zipEndOfCentralDirectorySignature = 0x06054b50
+zip64ExtraFieldId = 0x0001
+
+
+def _dosDateTime(timestamp):
+    """ (time, date) of a timestamp in the MS-DOS format of zip files,
+        which cannot express dates before 1980.
     """
-    zipf = zipfile.ZipFile(zipFileName, 'w', zipfile.ZIP_DEFLATED)
-    for fp in sourceFilePairs:
-        zipf.write(
-          filename=fp['path'],
-          arcname=fp['zip_path'],
+    tm = time.localtime(timestamp)
+    if tm.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    else:
+        return (
+            (tm.tm_hour << 11) | (tm.tm_min << 5) | (tm.tm_sec // 2),
+            ((tm.tm_year - 1980) << 9) | (tm.tm_mon << 5) | tm.tm_mday,
         )
+
+
+def _iterateFileChunks(fileName):
+    """ Generator yielding the contents of a file, piece by piece."""
+    with open(fileName, 'rb') as fileHandle:
+        while True:
+            chunk = fileHandle.read(zipStreamingChunkSize)
+            if not chunk:
+                break
+            yield chunk
+
+
+def isCompressedInArchive(mimeType, archiveCompression):
+    """ Whether to deflate a file of a given type in an archive,
+        according to the 'archive_compression' setting
+        ('all', 'by_type' or 'none').
+    """
+    if archiveCompression == 'all':
+        return True
+    elif archiveCompression == 'none':
+        return False
+    else:
+        return mimeType not in archiveStoredMimeTypes
+
+
+def _computeCrc(chunks):
+    """ CRC-32 and size of the data coming as a sequence of chunks."""
+    crc, size = 0, 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+    return crc, size
+
+
+def _streamZipEntry(zipPath, makeChunks, sizeHint, timestamp,
+                    compressionLevel):
+    """ Generator yielding local header, data and (for deflated
+        entries) data descriptor of an archive entry, whose contents
+        come as the sequence of 'chunks' returned by makeChunks(),
+        of about 'sizeHint' bytes in total. Data are deflated with the
+        given zlib level, or stored if it is None: in that case
+        makeChunks is called twice, first to compute the CRC.
+
+        Its return value describes the entry for the central directory.
+    """
+    encodedName = zipPath.encode('utf-8')
+    dosTime, dosDate = _dosDateTime(timestamp)
+    isStored = compressionLevel is None
+    if isStored:
+        method = zipMethodStored
+        flags = zipFlagsStored
+        headerCrc, headerSize = _computeCrc(makeChunks())
+        isZip64 = headerSize >= zip64SizeLimit
+        if isZip64:
+            extraField = struct.pack(
+                '<HHQQ',
+                zip64ExtraFieldId,
+                16,
+                headerSize,
+                headerSize,
+            )
+            sizeField = zip64SizeLimit
+        else:
+            extraField = b''
+            sizeField = headerSize
+    else:
+        method = zipMethodDeflated
+        flags = zipFlagsDeflated
+        headerCrc = 0
+        # deflating may even slightly enlarge the data
+        isZip64 = sizeHint * 1.05 > zip64SizeLimit
+        if isZip64:
+            extraField = struct.pack('<HHQQ', zip64ExtraFieldId, 16, 0, 0)
+            sizeField = zip64SizeLimit
+        else:
+            extraField = b''
+            sizeField = 0
+    localHeader = struct.pack(
+        '<IHHHHHIIIHH',
+        zipLocalHeaderSignature,
+        zipVersionZip64 if isZip64 else zipVersionDefault,
+        flags,
+        method,
+        dosTime,
+        dosDate,
+        headerCrc,
+        sizeField,
+        sizeField,
+        len(encodedName),
+        len(extraField),
+    ) + encodedName + extraField
+    yield localHeader
     #
-    for dp in sourceDataPairs:
-        zipf.writestr(
-          zinfo_or_arcname=dp['zip_path'],
-          data=dp['data'],
+    crc, size, compressedSize = 0, 0, 0
+    if isStored:
+        compressor = None
+    else:
+        compressor = zlib.compressobj(
+            compressionLevel,
+            zlib.DEFLATED,
+            -zlib.MAX_WBITS,
         )
+    for chunk in makeChunks():
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            compressedSize += len(chunk)
+            yield chunk
+    if compressor is not None:
+        compressedChunk = compressor.flush()
+        compressedSize += len(compressedChunk)
+        yield compressedChunk
     #
-    zipf.close()
+    if isStored:
+        if (crc, size) != (headerCrc, headerSize):
+            raise ValueError('File "%s" changed while archiving' % zipPath)
+        dataDescriptor = b''
+    elif isZip64:
+        dataDescriptor = struct.pack(
+            '<IIQQ',
+            zipDataDescriptorSignature,
+            crc,
+            compressedSize,
+            size,
+        )
+    elif max(size, compressedSize) >= zip64SizeLimit:
+        raise ValueError('File "%s" grew too large while archiving' % zipPath)
+    else:
+        dataDescriptor = struct.pack(
+            '<IIII',
+            zipDataDescriptorSignature,
+            crc,
+            compressedSize,
+            size,
+        )
+    if dataDescriptor:
+        yield dataDescriptor
+    return {
+        'name': encodedName,
+        'method': method,
+        'flags': flags,
+        'dos_time': dosTime,
+        'dos_date': dosDate,
+        'crc': crc,
+        'size': size,
+        'compressed_size': compressedSize,
+        'length': (len(localHeader) + compressedSize +
+                   len(dataDescriptor)),
+    }
+
+
+def _centralDirectoryRecord(entry, offset):
+    """ The central directory record of an entry at a given offset."""
+    zip64Values = []
+    if max(entry['size'], entry['compressed_size']) >= zip64SizeLimit:
+        zip64Values += [entry['size'], entry['compressed_size']]
+        sizeFields = (zip64SizeLimit, zip64SizeLimit)
+    else:
+        sizeFields = (entry['compressed_size'], entry['size'])
+    if offset >= zip64SizeLimit:
+        zip64Values.append(offset)
+        offsetField = zip64SizeLimit
+    else:
+        offsetField = offset
+    if len(zip64Values) > 0:
+        extraField = struct.pack(
+            '<HH%iQ' % len(zip64Values),
+            zip64ExtraFieldId,
+            8 * len(zip64Values),
+            *zip64Values
+        )
+        version = zipVersionZip64
+    else:
+        extraField = b''
+        version = zipVersionDefault
+    return struct.pack(
+        '<IHHHHHHIIIHHHHHII',
+        zipCentralDirectorySignature,
+        zipMadeByUnix | version,
+        version,
+        entry['flags'],
+        entry['method'],
+        entry['dos_time'],
+        entry['dos_date'],
+        entry['crc'],
+        sizeFields[0],
+        sizeFields[1],
+        len(entry['name']),
+        len(extraField),
+        0,
+        0,
+        0,
+        zipEntryExternalAttributes,
+        offsetField,
+    ) + entry['name'] + extraField
+
+
+def _endOfCentralDirectory(numEntries, directorySize, directoryOffset):
+    """ The closing records of the archive (with the ZIP64 ones
+        before them if any of the values is too large).
+    """
+    if any([
+        numEntries >= zip64CountLimit,
+        directorySize >= zip64SizeLimit,
+        directoryOffset >= zip64SizeLimit,
+    ]):
+        zip64Records = struct.pack(
+            '<IQHHIIQQQQ',
+            zip64EndOfCentralDirectorySignature,
+            44,
+            zipMadeByUnix | zipVersionZip64,
+            zipVersionZip64,
+            0,
+            0,
+            numEntries,
+            numEntries,
+            directorySize,
+            directoryOffset,
+        ) + struct.pack(
+            '<IIQI',
+            zip64EndOfCentralDirectoryLocatorSignature,
+            0,
+            directoryOffset + directorySize,
+            1,
+        )
+    else:
+        zip64Records = b''
+    return zip64Records + struct.pack(
+        '<IHHHHIIH',
+        zipEndOfCentralDirectorySignature,
+        0,
+        0,
+        min(numEntries, zip64CountLimit),
+        min(numEntries, zip64CountLimit),
+        min(directorySize, zip64SizeLimit),
+        min(directoryOffset, zip64SizeLimit),
+        0,
+    )
+
+
+def streamZipFile(sourceFilePairs, sourceDataPairs,
+                  compressionLevel=zlib.Z_DEFAULT_COMPRESSION):
+    """ Generator yielding the bytes of a zip archive as it is being
+        made, without ever storing it whole.
+
+        sourceFilePairs is a list of
+            {'path': full_source_file_path, 'zip_path': path_in_archive,
+             'size': file_size, 'mtime': file_modification_time}
+        (size and time are read by the caller beforehand, so that
+        missing files are found before the first byte is produced)
+        sourceDataPairs is a list of
+            {'data': string_contents, 'zip_path': path_in_archive}
+        Entries are deflated at 'compressionLevel' unless their pair
+        has a False 'compress' field, in which case they are stored
+        (and files are read twice, the first time for their CRC).
+    """
+    entrySources = [
+        (
+            fp['zip_path'],
+            partial(_iterateFileChunks, fp['path']),
+            fp['size'],
+            fp['mtime'],
+            fp.get('compress', True),
+        )
+        for fp in sourceFilePairs
+    ] + [
+        (
+            dp['zip_path'],
+            partial(list, [dp['data'].encode('utf-8')]),
+            len(dp['data'].encode('utf-8')),
+            time.time(),
+            dp.get('compress', True),
+        )
+        for dp in sourceDataPairs
+    ]
+    offset = 0
+    centralDirectory = []
+    for zipPath, makeChunks, sizeHint, timestamp, compress in entrySources:
+        entry = yield from _streamZipEntry(
+            zipPath,
+            makeChunks,
+            sizeHint,
+            timestamp,
+            compressionLevel if compress else None,
+        )
+        centralDirectory.append(_centralDirectoryRecord(entry, offset))
+        offset += entry['length']
+    directoryBytes = b''.join(centralDirectory)
+    yield directoryBytes + _endOfCentralDirectory(
+        len(centralDirectory),
+        len(directoryBytes),
+        offset,
+    )
@@ -526,6 +526,7 @@ class FindForm(FlaskForm):
             ('sim_ci', 'Similar items'),
             ('sub_ci', 'Substring, case-insensitive'),
             ('sub_cs', 'Substring, case-sensitive'),
+            ('fts_ci', 'Words and word beginnings, "exact phrases"'),
         ],
     )
     #
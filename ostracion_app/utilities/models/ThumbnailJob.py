@@ -0,0 +1,26 @@
+""" ThumbnailJob.py
+    class for DB object "thumbnail job" (queued thumbnail preparation).
+"""
+
+from ostracion_app.utilities.models.DictableObject import DictableObject
+
+
+class ThumbnailJob(DictableObject):
+    namedFields = ['job_id', 'file_id', 'mime_type', 'thumbnail_format',
+                   'status', 'attempts', 'last_error', 'worker_id',
+                   'creation_date', 'update_date']
+
+    def __init__(self, **kwargs):
+        """Standard 'DictableObject' init."""
+        _kwargs = self.consumeKWargs(**kwargs)
+        if _kwargs:
+            raise ValueError(
+                'Unknown argument(s): %s' % ', '.join(_kwargs.keys())
+            )
+
+    def __repr__(self):
+        return '<ThumbnailJob "%s" (%s, %s)>' % (
+            self.job_id,
+            self.file_id,
+            self.status,
+        )
@@ -0,0 +1,207 @@
+""" similarityMatrix.py
+    Vectorised digram similarity: the DVectors of many items are
+    held as rows of sparse matrices (one per text field, e.g. name and
+    description), so that scoring all items against a search
+    is a single sparse matrix-vector product per field.
+
+    Requires NumPy and SciPy, which are optional:
+    see 'similarityMatrixAvailable'.
+"""
+
+try:
+    import numpy as np
+    import scipy.sparse as sp
+    similarityMatrixAvailable = True
+except ImportError:
+    similarityMatrixAvailable = False
+
+from ostracion_app.utilities.textSimilarity.similarityTools import (
+    similarityDigramList,
+    similarityDigramIndex,
+    dVectorComponentSize,
+    serializeDVector,
+    deserializeDVector,
+    isLegacySerializedDVector,
+)
+
+# items changed since the last compaction are kept in a separate,
+# small matrix until they are more than this many (or than
+# this fraction of the main matrix), then the two are merged
+compactionMinRows = 2000
+compactionRowFraction = 0.05
+
+
+def serializedDVectorsToMatrix(serializedDVectors):
+    """ Stack serialized DVectors (see serializeDVector) as rows of
+        a sparse matrix, reading the binary ones with no decoding at all.
+    """
+    indexParts = []
+    weightParts = []
+    indptr = [0]
+    for vecS in serializedDVectors:
+        if isLegacySerializedDVector(vecS):
+            vecS = serializeDVector(deserializeDVector(vecS))
+        numComponents = len(vecS) // dVectorComponentSize
+        indexParts.append(vecS[:2 * numComponents])
+        weightParts.append(vecS[2 * numComponents:])
+        indptr.append(indptr[-1] + numComponents)
+    return sp.csr_matrix(
+        (
+            np.frombuffer(b''.join(weightParts), dtype='<f4'),
+            np.frombuffer(b''.join(indexParts), dtype='<u2').astype(
+                np.int32,
+            ),
+            np.array(indptr, dtype=np.int64),
+        ),
+        shape=(len(indptr) - 1, len(similarityDigramList)),
+    )
+
+
+def dVectorToArray(dVector):
+    """ A DVector as a dense vector in the digram space."""
+    array = np.zeros(len(similarityDigramList), dtype=np.float32)
+    for dg, v in dVector.items():
+        dgIndex = similarityDigramIndex.get(dg)
+        if dgIndex is not None:
+            array[dgIndex] = v
+    return array
+
+
+class DVectorMatrix():
+    """ The DVectors of a set of items, with 'numFields' DVectors
+        per item (as serialized for DB storage), scored at once
+        against a search DVector.
+
+        Changed items are marked as dead in the main matrix and added
+        to the small 'pending' one, merged into the main
+        matrix from time to time.
+    """
+
+    def __init__(self, items, numFields):
+        """ items is an iterable of (itemId, [serializedDVector, ...])."""
+        self.numFields = numFields
+        itemList = list(items)
+        self._setMain(
+            [itemId for itemId, _ in itemList],
+            [
+                serializedDVectorsToMatrix(
+                    dVectors[fIndex]
+                    for _, dVectors in itemList
+                )
+                for fIndex in range(numFields)
+            ],
+        )
+
+    def _setMain(self, itemIds, matrices):
+        self._mainIds = itemIds
+        self._mainRowMap = {
+            itemId: rowIndex
+            for rowIndex, itemId in enumerate(itemIds)
+        }
+        self._mainAlive = np.ones(len(itemIds), dtype=bool)
+        self._mainMatrices = matrices
+        self._pending = {}
+        self._pendingIds = []
+        self._pendingMatrices = None
+
+    def __len__(self):
+        return int(self._mainAlive.sum()) + len(self._pendingIds)
+
+    def updateItems(self, changes):
+        """ Apply changes, an iterable of (itemId, [serializedDVector, ...])
+            pairs, where None in place of the DVectors marks a deleted item.
+        """
+        for itemId, dVectors in changes:
+            mainRow = self._mainRowMap.get(itemId)
+            if mainRow is not None:
+                self._mainAlive[mainRow] = False
+            if dVectors is None:
+                self._pending.pop(itemId, None)
+            else:
+                self._pending[itemId] = dVectors
+        self._pendingIds = list(self._pending.keys())
+        if len(self._pendingIds) > 0:
+            self._pendingMatrices = [
+                serializedDVectorsToMatrix(
+                    self._pending[itemId][fIndex]
+                    for itemId in self._pendingIds
+                )
+                for fIndex in range(self.numFields)
+            ]
+        else:
+            self._pendingMatrices = None
+        if len(self._pendingIds) > max(
+                compactionMinRows,
+                compactionRowFraction * len(self._mainIds)):
+            self._compact()
+
+    def _compact(self):
+        """ Merge the pending items into the main matrix,
+            dropping the dead rows.
+        """
+        aliveRows = np.flatnonzero(self._mainAlive)
+        self._setMain(
+            [self._mainIds[rowIndex] for rowIndex in aliveRows] +
+            self._pendingIds,
+            [
+                sp.vstack(
+                    [
+                        self._mainMatrices[fIndex][aliveRows],
+                        self._pendingMatrices[fIndex],
+                    ],
+                    format='csr',
+                )
+                for fIndex in range(self.numFields)
+            ],
+        )
+
+    @staticmethod
+    def _maxFieldScores(matrices, queryArray, fieldIndices):
+        return np.max(
+            np.vstack([
+                matrices[fIndex].dot(queryArray)
+                for fIndex in fieldIndices
+            ]),
+            axis=0,
+        )
+
+    def topItems(self, searchDVector, fieldIndices, threshold, limit=None):
+        """ Score all items against a search DVector, an item's score
+            being its best scalar product over the given fields.
+
+            Return a list of (itemId, score) pairs, best first, for
+            the items scoring at least 'threshold' (the best 'limit' ones
+            if a limit is given).
+        """
+        queryArray = dVectorToArray(searchDVector)
+        scores = self._maxFieldScores(
+            self._mainMatrices,
+            queryArray,
+            fieldIndices,
+        )
+        scores[~self._mainAlive] = -1
+        numMainRows = len(self._mainIds)
+        if self._pendingMatrices is not None:
+            scores = np.concatenate([
+                scores,
+                self._maxFieldScores(
+                    self._pendingMatrices,
+                    queryArray,
+                    fieldIndices,
+                ),
+            ])
+        foundRows = np.flatnonzero(scores >= threshold)
+        if limit is not None and len(foundRows) > limit:
+            foundRows = foundRows[
+                np.argpartition(-scores[foundRows], limit - 1)[:limit]
+            ]
+        foundRows = foundRows[np.argsort(-scores[foundRows], kind='stable')]
+        return [
+            (
+                (self._mainIds[rowIndex]
+                 if rowIndex < numMainRows
+                 else self._pendingIds[rowIndex - numMainRows]),
+                float(scores[rowIndex]),
+            )
+            for rowIndex in foundRows
+        ]
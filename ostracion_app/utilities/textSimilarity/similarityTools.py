@@ -5,10 +5,14 @@
     expressed as a (sparse) dictionary digram -> float,
     where digram is a string made of a pair of characters from
     'similarityAlphabet'.
+
+    DVectors are stored in a compact binary form
+    (see serializeDVector); the former JSON strings can still be read.
 """
 
 from collections import Counter
 import json
+import struct
 
 from ostracion_app.utilities.tools.formatting import (
     stripToAscii,
@@ -36,6 +40,15 @@ similarityDigrams = {
     for c1 in similarityAlphabet
     for c2 in similarityAlphabet
 }
+# a fixed ordering of the digrams, i.e. the components of DVectors
+# seen as (sparse) numeric vectors
+similarityDigramList = sorted(similarityDigrams)
+similarityDigramIndex = {
+    dg: dgIndex
+    for dgIndex, dg in enumerate(similarityDigramList)
+}
+# bytes taken by each component of a serialized DVector (uint16 + float32)
+dVectorComponentSize = 6
 
 
 def normVector(vec):
@@ -85,13 +98,39 @@ def textToDVector(text):
 
 
 def serializeDVector(vec):
-    """Serialization of a DVector to a string for DB storage."""
-    return json.dumps(vec, sort_keys=True)
+    """ Serialization of a DVector to bytes for DB storage: the
+        (sorted) digram indices in similarityDigramList as little-endian
+        uint16, followed by the corresponding weights as float32.
+    """
+    indices = sorted(similarityDigramIndex[dg] for dg in vec)
+    return struct.pack(
+        '<%iH%if' % (len(indices), len(indices)),
+        *(indices + [vec[similarityDigramList[dgIndex]]
+                     for dgIndex in indices])
+    )
+
+
+def isLegacySerializedDVector(vecS):
+    """ Whether a serialized DVector is in the former (JSON) format."""
+    return isinstance(vecS, str)
 
 
 def deserializeDVector(vecS):
-    """Deserialization of a DVector from e.g. DB storage."""
-    return json.loads(vecS)
+    """ Deserialization of a DVector from e.g. DB storage
+        (also from the former JSON format).
+    """
+    if isLegacySerializedDVector(vecS):
+        return json.loads(vecS)
+    else:
+        numComponents = len(vecS) // dVectorComponentSize
+        values = struct.unpack(
+            '<%iH%if' % (numComponents, numComponents),
+            vecS,
+        )
+        return dict(zip(
+            map(similarityDigramList.__getitem__, values[:numComponents]),
+            values[numComponents:],
+        ))
 
 
 if __name__ == '__main__':
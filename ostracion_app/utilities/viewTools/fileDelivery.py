@@ -0,0 +1,332 @@
+""" fileDelivery.py
+    Tools to serve files from the storage to the client,
+    taking care of HTTP caching aspects (validators, conditional
+    requests, cache-control headers).
+
+    Downloads can be offloaded to the front-end server
+    (X-Accel-Redirect, X-Sendfile) according to the configuration;
+    otherwise they are served here, with support for
+    byte-range requests (single- and multi-range, If-Range).
+"""
+
+import os
+from calendar import timegm
+import unicodedata
+from uuid import uuid4
+from urllib.parse import quote
+from werkzeug.http import http_date
+
+from flask import (
+    abort,
+    request,
+    send_from_directory,
+    Response,
+)
+
+from ostracion_app.utilities.database.fileDerivatives import (
+    dbGetFileDerivatives,
+    pickFileDerivative,
+)
+
+from ostracion_app.utilities.fileIO.physical import (
+    fileIdToSplitPath,
+)
+
+from config import (
+    fileDeliveryBackend,
+    fileDeliveryAccelPrefix,
+    maxRangesPerRequest,
+)
+
+# bytes read at a time when streaming (portions of) files
+fileStreamingChunkSize = 65536
+
+# max-age for responses which will never change (one year)
+immutableMaxAgeSeconds = 31536000
+
+
+def makeIconETag(iconFileId):
+    """ Content-addressed ETag for a thumbnail: each new icon
+        gets a brand new file id, hence the id identifies the contents.
+    """
+    return 'icon-%s' % iconFileId
+
+
+def isIconDummyIdCurrent(dummyId, iconFileId):
+    """ Whether the cache-busting 'dummyId' in a thumbnail URL
+        points to the current icon (URLs are built as icon_file_id + '_').
+    """
+    return iconFileId != '' and dummyId == '%s_' % iconFileId
+
+
+def sendThumbnailFromDirectory(filePhysicalPath, filePhysicalName, mimeType,
+                               etag, immutable=False):
+    """ Serve a thumbnail-like image file, identified by a strong 'etag'.
+
+        If the client already has that version (If-None-Match), a 304
+        is returned without even touching the file.
+        With 'immutable', the response can be cached forever
+        (only privately, as permissions may apply to the image).
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = send_from_directory(
+            filePhysicalPath,
+            filePhysicalName,
+            mimetype=mimeType,
+        )
+    response.set_etag(etag)
+    if immutable:
+        response.headers['Cache-Control'] = (
+            'private, max-age=%i, immutable' % immutableMaxAgeSeconds
+        )
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _setAttachmentDisposition(response, attachmentFileName):
+    """ Add a Content-Disposition for a download, encoding non-latin
+        file names as send_from_directory would do.
+    """
+    try:
+        attachmentFileName.encode('latin-1')
+        fileNameParams = {'filename': attachmentFileName}
+    except UnicodeEncodeError:
+        fileNameParams = {
+            'filename': unicodedata.normalize(
+                'NFKD',
+                attachmentFileName,
+            ).encode('ascii', 'ignore').decode(),
+            'filename*': "UTF-8''%s" % quote(attachmentFileName, safe=''),
+        }
+    response.headers.add('Content-Disposition', 'attachment', **fileNameParams)
+
+
+def _makeOffloadedResponse(fullFileName, mimeType, attachmentFileName,
+                           rootDirectory):
+    """ An empty response instructing the front-end server
+        to deliver the file itself.
+    """
+    response = Response(mimetype=mimeType)
+    if fileDeliveryBackend == 'x-accel-redirect':
+        relativeName = os.path.relpath(fullFileName, rootDirectory)
+        response.headers['X-Accel-Redirect'] = '%s%s' % (
+            fileDeliveryAccelPrefix,
+            quote(relativeName.replace(os.sep, '/')),
+        )
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(fullFileName)
+    if attachmentFileName is not None:
+        _setAttachmentDisposition(response, attachmentFileName)
+    return response
+
+
+def isFileDeliveryOffloaded():
+    """Whether file bytes are delivered by the front-end server."""
+    return fileDeliveryBackend in {'x-accel-redirect', 'x-sendfile'}
+
+
+def _makeFileETag(fullFileName, fileStat):
+    """ ETag for a served file, changing whenever the file changes."""
+    return '%s-%x-%x' % (
+        os.path.basename(fullFileName),
+        int(fileStat.st_mtime),
+        fileStat.st_size,
+    )
+
+
+def _streamFileRanges(fullFileName, ranges, partHeaders=None,
+                      closingBytes=b''):
+    """ Generator yielding the bytes of a file in the given
+        [start, stop) ranges, each optionally preceded by
+        the corresponding (bytes) part header.
+    """
+    with open(fullFileName, 'rb') as fileHandle:
+        for rangeIndex, (start, stop) in enumerate(ranges):
+            if partHeaders is not None:
+                yield partHeaders[rangeIndex]
+            fileHandle.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = fileHandle.read(
+                    min(remaining, fileStreamingChunkSize),
+                )
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    if closingBytes:
+        yield closingBytes
+
+
+def _resolveRequestedRanges(fileSize, etag, lastModified):
+    """ Inspect Range/If-Range of the request and return:
+            None if the whole file is to be sent;
+            [] if no requested range can be satisfied;
+            a list of [start, stop) pairs otherwise.
+    """
+    requestedRange = request.range
+    if requestedRange is None or requestedRange.units != 'bytes':
+        return None
+    else:
+        ifRange = request.if_range
+        if ifRange.etag is not None:
+            # If-Range validators are to be compared strongly
+            if ifRange.etag != etag:
+                return None
+        elif ifRange.date is not None:
+            if timegm(ifRange.date.utctimetuple()) != int(lastModified):
+                return None
+        if len(requestedRange.ranges) > maxRangesPerRequest:
+            # too many pieces: not worth the effort
+            return None
+        ranges = []
+        for begin, end in requestedRange.ranges:
+            if begin < 0:
+                # suffix range ("last N bytes")
+                start, stop = max(fileSize + begin, 0), fileSize
+            else:
+                start = begin
+                stop = fileSize if end is None else min(end, fileSize)
+            if start < stop:
+                ranges.append((start, stop))
+        return ranges
+
+
+def _sendFileWithRanges(fullFileName, mimeType, attachmentFileName):
+    """ Serve a file from Python, honouring conditional and
+        (possibly multiple) byte-range requests.
+    """
+    if not os.path.isfile(fullFileName):
+        abort(404)
+    fileStat = os.stat(fullFileName)
+    fileSize = fileStat.st_size
+    etag = _makeFileETag(fullFileName, fileStat)
+    ranges = _resolveRequestedRanges(fileSize, etag, fileStat.st_mtime)
+    #
+    if ranges is None and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif ranges is None:
+        response = Response(
+            _streamFileRanges(fullFileName, [(0, fileSize)]),
+            mimetype=mimeType,
+            direct_passthrough=True,
+        )
+        response.content_length = fileSize
+    elif len(ranges) == 0:
+        response = Response(status=416)
+        response.headers['Content-Range'] = 'bytes */%i' % fileSize
+    elif len(ranges) == 1:
+        start, stop = ranges[0]
+        response = Response(
+            _streamFileRanges(fullFileName, ranges),
+            status=206,
+            mimetype=mimeType,
+            direct_passthrough=True,
+        )
+        response.headers['Content-Range'] = 'bytes %i-%i/%i' % (
+            start,
+            stop - 1,
+            fileSize,
+        )
+        response.content_length = stop - start
+    else:
+        boundary = uuid4().hex
+        partHeaders = [
+            (
+                '\r\n--%s\r\nContent-Type: %s\r\n'
+                'Content-Range: bytes %i-%i/%i\r\n\r\n' % (
+                    boundary,
+                    mimeType,
+                    start,
+                    stop - 1,
+                    fileSize,
+                )
+            ).encode()
+            for start, stop in ranges
+        ]
+        closingBytes = ('\r\n--%s--\r\n' % boundary).encode()
+        response = Response(
+            _streamFileRanges(
+                fullFileName,
+                ranges,
+                partHeaders=partHeaders,
+                closingBytes=closingBytes,
+            ),
+            status=206,
+            content_type='multipart/byteranges; boundary=%s' % boundary,
+            direct_passthrough=True,
+        )
+        response.content_length = (
+            sum(len(pH) for pH in partHeaders) +
+            sum(stop - start for start, stop in ranges) +
+            len(closingBytes)
+        )
+    #
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Last-Modified'] = http_date(fileStat.st_mtime)
+    response.set_etag(etag)
+    if attachmentFileName is not None and response.status_code != 304:
+        _setAttachmentDisposition(response, attachmentFileName)
+    return response
+
+
+def sendFileFromDirectory(filePhysicalPath, filePhysicalName, mimeType,
+                          rootDirectory, attachmentFileName=None):
+    """ Serve a file, as attachment if a name is passed,
+        through the configured delivery backend.
+
+        'rootDirectory' is the directory which the front-end server maps
+        to its internal location for file delivery.
+        Range requests are honoured either here or, when offloading,
+        by the front-end server itself.
+    """
+    fullFileName = os.path.join(filePhysicalPath, filePhysicalName)
+    if isFileDeliveryOffloaded():
+        return _makeOffloadedResponse(
+            fullFileName,
+            mimeType,
+            attachmentFileName,
+            rootDirectory,
+        )
+    else:
+        return _sendFileWithRanges(
+            fullFileName,
+            mimeType,
+            attachmentFileName,
+        )
+
+
+def sendFileRendition(db, file, fileStorageDirectory, width,
+                      acceptWebp=False):
+    """ Serve, inline, the rendition of an image file best suited
+        to a display width (the file itself if no width is given, or if
+        no rendition is wide enough, or if there are no renditions).
+    """
+    if width is not None:
+        derivative = pickFileDerivative(
+            dbGetFileDerivatives(db, file.file_id),
+            width,
+            acceptWebp=acceptWebp,
+        )
+    else:
+        derivative = None
+    if derivative is None:
+        servedFileId, servedMimeType = file.file_id, file.mime_type
+    else:
+        servedFileId, servedMimeType = (
+            derivative['derivative_file_id'],
+            derivative['mime_type'],
+        )
+    filePhysicalPath, filePhysicalName = fileIdToSplitPath(
+        servedFileId,
+        fileStorageDirectory=fileStorageDirectory,
+    )
+    return sendFileFromDirectory(
+        filePhysicalPath,
+        filePhysicalName,
+        mimeType=servedMimeType,
+        rootDirectory=fileStorageDirectory,
+    )
@@ -22,7 +22,7 @@ from ostracion_app.utilities.exceptions.exceptions import (
 )
 
 from ostracion_app.utilities.database.permissions import (
-    userHasPermission,
+    userHasBoxPermission,
     userHasRole,
     userIsAdmin,
 )
@@ -41,6 +41,7 @@ from ostracion_app.utilities.fileIO.fileTypes import (
 
 from ostracion_app.utilities.database.userTools import (
     getUserFullName,
+    preloadUserFullNames,
 )
 
 from ostracion_app.utilities.database.settingsTools import (
@@ -317,6 +318,27 @@ def prepareTaskPageFeatures(pageDescriptor, pagePath, g, appendedItems=[],
     }
 
 
+def preloadItemInfoActors(db, items):
+    """ Resolve at once the full names of all users appearing
+        in the info (see prepare{Box,File,Link}Info) of the given
+        boxes/files/links, in view of their preparation.
+    """
+    preloadUserFullNames(
+        db,
+        {
+            getattr(item, actorField)
+            for item in items
+            for actorField in (
+                'creator_username',
+                'editor_username',
+                'icon_file_id_username',
+                'metadata_username',
+            )
+            if getattr(item, actorField, None) is not None
+        },
+    )
+
+
 def prepareBoxInfo(db, box):
     """Calculate box information for display."""
     return [
@@ -355,8 +377,8 @@ def prepareBoxHeaderActions(db, box, boxPath, user,
     """
     ticketerOrAdmin = (userHasRole(db, user, 'system', 'ticketer') or
                        userIsAdmin(db, user))
-    canWriteFiles = userHasPermission(db, user, box.permissions, 'w')
-    canChangeBoxes = userHasPermission(db, user, box.permissions, 'c')
+    canWriteFiles = userHasBoxPermission(db, user, box, 'w')
+    canChangeBoxes = userHasBoxPermission(db, user, box, 'c')
     canIssueUploadTicket = ((canWriteFiles and ticketerOrAdmin) or
                             userIsAdmin(db, user))
     canIssueGalleryTicket = ticketerOrAdmin
@@ -426,13 +448,13 @@ def prepareBoxActions(db, box, boxPath, parentBox,
             quotedSrcBox=urllib.parse.quote_plus('/'.join(boxPath)),
         )
     # change icon
-    if userHasPermission(db, user, box.permissions, 'w'):
+    if userHasBoxPermission(db, user, box, 'w'):
         bActions['icon'] = url_for(
             'setIconView',
             mode='b',
             itemPathString='/'.join(boxPath),
         )
-    if userHasPermission(db, user, box.permissions, 'w'):
+    if userHasBoxPermission(db, user, box, 'w'):
         bActions['metadata'] = url_for(
             'metadataBoxView',
             boxPathString='/'.join(boxPath),
@@ -482,7 +504,7 @@ def prepareLinkActions(db, link, linkPath, parentBox, user,
     """
     lActions = {}
     # active stuff
-    if userHasPermission(db, user, parentBox. permissions, 'w'):
+    if userHasBoxPermission(db, user, parentBox, 'w'):
         lActions['icon'] = url_for(
             'setIconView',
             mode='l',
@@ -561,7 +583,7 @@ def prepareFileActions(db, file, filePath, parentBox, user,
         fsPathString='/'.join(filePath),
     )
     # active stuff
-    if userHasPermission(db, user, parentBox. permissions, 'w'):
+    if userHasBoxPermission(db, user, parentBox, 'w'):
         if isFileTextEditable(file):
             fActions['text_edit'] = url_for(
                 'editTextFileView',
@@ -84,7 +84,7 @@ from ostracion_app.utilities.database.tickets import (
     dbGetAllFileTickets,
     dbGetAllUploadTickets,
     dbGetAllGalleryTickets,
-    enrichTicket,
+    enrichTickets,
     richTicketSorter,
 )
 
@@ -1349,9 +1349,10 @@ def adminUserInvitationsView():
     db = dbGetDatabase()
     #
     ticketDicts = sorted(
-        (
-            enrichTicket(db, t, urlRoot=request.url_root)
-            for t in dbGetAllUserInvitationTickets(db, user)
+        enrichTickets(
+            db,
+            dbGetAllUserInvitationTickets(db, user),
+            urlRoot=request.url_root,
         ),
         key=richTicketSorter,
     )
@@ -1479,9 +1480,10 @@ def adminUserChangePasswordTicketsView():
     db = dbGetDatabase()
     #
     ticketDicts = sorted(
-        (
-            enrichTicket(db, t, urlRoot=request.url_root)
-            for t in dbGetAllUserChangePasswordTickets(db, user)
+        enrichTickets(
+            db,
+            dbGetAllUserChangePasswordTickets(db, user),
+            urlRoot=request.url_root,
         ),
         key=richTicketSorter,
     )
@@ -1611,9 +1613,10 @@ def adminUploadTicketsView():
     db = dbGetDatabase()
     #
     ticketDicts = sorted(
-        (
-            enrichTicket(db, t, urlRoot=request.url_root)
-            for t in dbGetAllUploadTickets(db, user)
+        enrichTickets(
+            db,
+            dbGetAllUploadTickets(db, user),
+            urlRoot=request.url_root,
         ),
         key=richTicketSorter,
     )
@@ -1644,9 +1647,10 @@ def adminGalleryTicketsView():
     db = dbGetDatabase()
     #
     ticketDicts = sorted(
-        (
-            enrichTicket(db, t, urlRoot=request.url_root)
-            for t in dbGetAllGalleryTickets(db, user)
+        enrichTickets(
+            db,
+            dbGetAllGalleryTickets(db, user),
+            urlRoot=request.url_root,
         ),
         key=richTicketSorter,
     )
@@ -1677,9 +1681,10 @@ def adminFileTicketsView():
     db = dbGetDatabase()
     #
     ticketDicts = sorted(
-        (
-            enrichTicket(db, t, urlRoot=request.url_root)
-            for t in dbGetAllFileTickets(db, user)
+        enrichTickets(
+            db,
+            dbGetAllFileTickets(db, user),
+            urlRoot=request.url_root,
         ),
         key=richTicketSorter,
     )
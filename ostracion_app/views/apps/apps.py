@@ -7,7 +7,6 @@ from flask import (
     url_for,
     render_template,
     request,
-    send_from_directory,
     abort,
     g,
 )
@@ -20,6 +19,12 @@ from ostracion_app.utilities.fileIO.physical import (
     fileIdToSplitPath,
 )
 
+from ostracion_app.utilities.viewTools.fileDelivery import (
+    makeIconETag,
+    isIconDummyIdCurrent,
+    sendThumbnailFromDirectory,
+)
+
 from ostracion_app.utilities.viewTools.pathTools import (
     prepareTaskPageFeatures,
 )
@@ -79,10 +84,12 @@ def appItemThumbnailView(mode, dummyId, itemId):
                 ledger.icon_file_id,
                 fileStorageDirectory=fileStorageDirectory,
             )
-            return send_from_directory(
+            return sendThumbnailFromDirectory(
                 filePhysicalPath,
                 filePhysicalName,
-                mimetype=ledger.icon_mime_type,
+                mimeType=ledger.icon_mime_type,
+                etag=makeIconETag(ledger.icon_file_id),
+                immutable=isIconDummyIdCurrent(dummyId, ledger.icon_file_id),
             )
         else:
             return redirect(makeSettingImageUrl(
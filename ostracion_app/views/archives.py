@@ -47,7 +47,6 @@ from ostracion_app.utilities.fileIO.physical import (
     flushFsDeleteQueue,
     fileIdToPath,
     temporaryFileName,
-    temporarySplitFileName,
 )
 
 from ostracion_app.utilities.tools.formatting import (
@@ -60,7 +59,12 @@ from ostracion_app.utilities.tools.comparisonTools import (
 )
 
 from ostracion_app.utilities.fileIO.zipFileUtilities import (
-    makeZipFile,
+    streamZipFile,
+    isCompressedInArchive,
+)
+
+from config import (
+    archiveCompressionLevel,
 )
 
 
@@ -84,8 +88,6 @@ def downloadBoxView(boxPathString=''):
         thisBox = getBoxFromPath(db, lsPath, user)
         if thisBox is not None:
             boxPath = lsPath[1:]
-            tempFileDirectory = g.settings['system']['system_directories'][
-                'temp_directory']['value']
             fileStorageDirectory = g.settings['system']['system_directories'][
                 'fs_directory']['value']
             # we extract the tree "from this box downward"
@@ -132,6 +134,10 @@ def downloadBoxView(boxPathString=''):
                         lsPathString=boxPathString,
                     ))
                 else:
+                    # which files get compressed ('all', 'by_type', 'none')
+                    archiveCompression = g.settings['behaviour']['archives'][
+                        'archive_compression']['value']
+
                     # we collect the information needed to prepare the
                     # archive file. For now, no empty boxes
                     # (a zip format limitation)
@@ -147,6 +153,10 @@ def downloadBoxView(boxPathString=''):
                                     accPath,
                                     file['file'].name,
                                 ),
+                                'compress': isCompressedInArchive(
+                                    file['file'].mime_type,
+                                    archiveCompression,
+                                ),
                             }
                             for file in tr['contents']['files']
                         ] + [
@@ -157,6 +167,7 @@ def downloadBoxView(boxPathString=''):
                                     accPath,
                                     '%s' % link['link'].name,
                                 ),
+                                'compress': archiveCompression != 'none',
                             }
                             for link in tr['contents']['links']
                         ]
@@ -177,43 +188,50 @@ def downloadBoxView(boxPathString=''):
                     inPairs = collectArchivablePairs(tree)
                     filePairs = [p for p in inPairs if p['type'] == 'file']
                     dataPairs = [p for p in inPairs if p['type'] == 'data']
-                    # we create the zip
-                    _, archiveFileTitle = temporarySplitFileName(
-                        tempFileDirectory,
-                    )
-                    makeZipFile(
-                        os.path.join(tempFileDirectory, archiveFileTitle),
-                        filePairs,
-                        dataPairs,
-                    )
-                    # Now the file exists, ready to be served.
-                    # Instead of a plain send_from_directory, though,
-                    # we use the answer "Stream file, then delete"
-                    # by Sean Vieira here:
-                    # https://stackoverflow.com/questions/24612366/
-                    #   delete-an-uploaded-file-after-downloading-it-from-flask
-
-                    def StreamFileAndRemoveIt(localFileName):
-                        fileHandle = open(localFileName, 'rb')
-                        yield from fileHandle
-                        fileHandle.close()
-                        os.remove(localFileName)
-
+                    # all files are checked now: once the response has
+                    # started, a failure could only truncate the archive
+                    missingZipPaths = []
+                    for filePair in filePairs:
+                        try:
+                            fileStat = os.stat(filePair['path'])
+                            filePair['size'] = fileStat.st_size
+                            filePair['mtime'] = fileStat.st_mtime
+                        except OSError:
+                            missingZipPaths.append(filePair['zip_path'])
+                    if len(missingZipPaths) > 0:
+                        raise OstracionError(
+                            'Cannot prepare archive: %i file(s) missing '
+                            'from the storage (%s)' % (
+                                len(missingZipPaths),
+                                ', '.join(
+                                    '"%s"' % zp
+                                    for zp in missingZipPaths[:3]
+                                ) + (
+                                    ', ...'
+                                    if len(missingZipPaths) > 3
+                                    else ''
+                                ),
+                            )
+                        )
                     zipFileName = '%s.zip' % describeBoxName(
                         thisBox,
                     )
+                    # the archive is made while being sent: no temporary
+                    # file, and the download starts right away.
+                    # (Buffering by the front-end server is disabled
+                    # for the same reason)
                     contentDisposition = 'attachment; filename="%s"' % (
                         zipFileName,
                     )
                     return current_app.response_class(
-                        StreamFileAndRemoveIt(
-                            localFileName=os.path.join(
-                                tempFileDirectory,
-                                archiveFileTitle,
-                            ),
+                        streamZipFile(
+                            filePairs,
+                            dataPairs,
+                            compressionLevel=archiveCompressionLevel,
                         ),
                         headers={
                             'Content-Disposition': contentDisposition,
+                            'X-Accel-Buffering': 'no',
                         },
                         mimetype='application/zip',
                     )
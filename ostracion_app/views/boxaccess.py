@@ -66,6 +66,7 @@ from ostracion_app.utilities.viewTools.pathTools import (
     prepareFileInfo,
     prepareLinkInfo,
     prepareBoxInfo,
+    preloadItemInfoActors,
     prepareBoxHeaderActions,
     prepareRootTasks,
     describeBoxTitle,
@@ -143,6 +144,25 @@ def lsView(lsPathString=''):
             tasks = prepareRootTasks(db, g, user)
         else:
             tasks = []
+        childBoxes = sorted(
+            (
+                b
+                for b in getBoxesFromParent(db, thisBox, user)
+                if b is not None
+                if b.box_id != ''
+            ),
+            key=lambda b: (b.box_name.lower(), b.box_name),
+        )
+        childFiles = sorted(
+            getFilesFromBox(db, thisBox),
+            key=lambda f: (f.name.lower(), f.name),
+        )
+        childLinks = sorted(
+            getLinksFromBox(db, thisBox),
+            key=lambda l: (l.name.lower(), l.name),
+        )
+        preloadItemInfoActors(db, childBoxes + childFiles + childLinks)
+        #
         boxes = [
             {
                 'box': box,
@@ -156,15 +176,7 @@ def lsView(lsPathString=''):
                     user
                 ),
             }
-            for box in sorted(
-                (
-                    b
-                    for b in getBoxesFromParent(db, thisBox, user)
-                    if b is not None
-                ),
-                key=lambda b: (b.box_name.lower(), b.box_name),
-            )
-            if box.box_id != ''
+            for box in childBoxes
         ]
         files = [
             {
@@ -180,10 +192,7 @@ def lsView(lsPathString=''):
                     user
                 ),
             }
-            for file in sorted(
-                getFilesFromBox(db, thisBox),
-                key=lambda f: (f.name.lower(), f.name),
-            )
+            for file in childFiles
         ]
         links = [
             {
@@ -198,10 +207,7 @@ def lsView(lsPathString=''):
                     user
                 ),
             }
-            for link in sorted(
-                getLinksFromBox(db, thisBox),
-                key=lambda l: (l.name.lower(), l.name),
-            )
+            for link in childLinks
         ]
         #
         pathBCrumbs = makeBreadCrumbs(lsPath, g)
@@ -9,7 +9,6 @@ from flask import (
     url_for,
     render_template,
     g,
-    send_from_directory,
     request,
     abort,
 )
@@ -26,6 +25,10 @@ from ostracion_app.utilities.exceptions.exceptions import (
 )
 
 from ostracion_app.utilities.viewTools.messageTools import flashMessage
+from ostracion_app.utilities.viewTools.fileDelivery import (
+    sendFileFromDirectory,
+    sendFileRendition,
+)
 
 from ostracion_app.utilities.database.permissions import (
     userRoleRequired,
@@ -353,12 +356,41 @@ def fsDownloadView(fsPathString=''):
                 file.file_id,
                 fileStorageDirectory=fileStorageDirectory,
             )
-            return send_from_directory(
+            return sendFileFromDirectory(
                 filePhysicalPath,
                 filePhysicalName,
-                attachment_filename=file.name,
-                as_attachment=True,
-                mimetype=file.mime_type,
+                mimeType=file.mime_type,
+                rootDirectory=fileStorageDirectory,
+                attachmentFileName=file.name,
+            )
+        else:
+            return abort(404, 'Content unavailable')
+    else:
+        return abort(404, 'Content unavailable')
+
+
+@app.route('/fsr/<path:fsPathString>')
+def fsRenditionView(fsPathString):
+    """ Image-file route for in-page display: the rendition
+        suited to the requested width ('w' parameter) is sent
+        (WebP ones only if 'fmt=webp' is passed).
+    """
+    user = g.user
+    lsPath = splitPathString(fsPathString)
+    boxPath, fileName = lsPath[:-1], lsPath[-1]
+    db = dbGetDatabase()
+    fileStorageDirectory = g.settings['system']['system_directories'][
+        'fs_directory']['value']
+    parentBox = getBoxFromPath(db, boxPath, user)
+    if parentBox is not None:
+        file = getFileFromParent(db, parentBox, fileName, user)
+        if file is not None:
+            return sendFileRendition(
+                db,
+                file,
+                fileStorageDirectory=fileStorageDirectory,
+                width=safeInt(request.args.get('w'), None),
+                acceptWebp=request.args.get('fmt') == 'webp',
             )
         else:
             return abort(404, 'Content unavailable')
@@ -53,6 +53,10 @@ from ostracion_app.views.viewTools.toolsPageTreeDescriptor import (
     toolsPageDescriptor,
 )
 
+from config import (
+    searchResultsPageSize,
+)
+
 
 @app.route('/find', methods=['GET', 'POST'])
 def findView():
@@ -81,11 +85,14 @@ def findView():
         }
         #
         initTime = time.time()
+        # the "more results" button brings the token of the next page
         findResults = fsFind(
             db,
             searchTerm,
             user,
             options=options,
+            pageSize=searchResultsPageSize,
+            continuation=request.form.get('continuation'),
         )
         resultsDescription = describeFindResults(findResults)
         elapsed = time.time() - initTime
@@ -182,6 +189,7 @@ def quickFindView():
         searchTerm,
         user,
         options=options,
+        pageSize=searchResultsPageSize,
     )
     resultsDescription = describeFindResults(findResults)
     elapsed = time.time() - initTime
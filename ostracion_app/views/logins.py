@@ -40,6 +40,8 @@ from ostracion_app.utilities.models.User import User
 
 from ostracion_app.utilities.database.dbTools import (
     dbGetDatabase,
+    dbReleaseDatabase,
+    dbDeclareRequestReadOnly,
 )
 from ostracion_app.utilities.database.userTools import (
     dbGetUser,
@@ -142,6 +144,45 @@ endpointsWithoutTermAcceptanceBlocking = {
     'static',
 }
 
+# endpoints which never write to the DB when accessed with GET:
+# (if so configured) they are given a read-only DB connection
+endpointsWithReadOnlyDatabase = {
+    'lsView',
+    'dirTreeView',
+    'fsView',
+    'fsHybridView',
+    'fsDownloadView',
+    'fsRenditionView',
+    'fsGalleryView',
+    'downloadBoxView',
+    'fileThumbnailView',
+    'linkThumbnailView',
+    'boxThumbnailView',
+    'userThumbnailView',
+    'settingThumbnailView',
+    'faviconView',
+    'robotsTxtView',
+    'static',
+}
+
+# "lean" endpoints, serving no HTML pages: for them the template context
+# (navbar, quick-find form, available apps/tools, ...) is not prepared
+leanEndpoints = {
+    'fileThumbnailView',
+    'linkThumbnailView',
+    'boxThumbnailView',
+    'userThumbnailView',
+    'settingThumbnailView',
+    'fsDownloadView',
+    'fsRenditionView',
+    'faviconView',
+    'robotsTxtView',
+    'DPOEmailImageView',
+    'contactInfoImageView',
+    'appItemThumbnailView',
+    'static',
+}
+
 
 @app.before_request
 def before_request():
@@ -149,30 +190,34 @@ def before_request():
         handling of special post-install situations and of banned users
         and logged-in-only setups.
     """
+    if (request.method in {'GET', 'HEAD'} and
+            request.endpoint in endpointsWithReadOnlyDatabase):
+        dbDeclareRequestReadOnly()
     db = dbGetDatabase()
     g.user = current_user
     g.settings = dbLoadAllSettings(db, g.user)
-    g.applicationLogoUrl = makeSettingImageUrl(
-        g,
-        'ostracion_images',
-        'navbar_logo',
-    )
-    #
-    g.canPerformSearch = isUserWithinPermissionCircle(
-        db,
-        g.user,
-        g.settings['behaviour']['search']['search_access']['value'],
-    )
-    g.quickFindForm = QuickFindForm()
-    g.canShowTreeView = isUserWithinPermissionCircle(
-        db,
-        g.user,
-        g.settings['behaviour']['search']['tree_view_access']['value'],
-    )
-    # task lists - must happen after the above (which set access flags)
-    g.availableApps = selectAvailableApps(db, g.user, g)
-    g.availableInfoItems = selectAvailableInfoItems(db, g.user, g)
-    g.availableTools = selectAvailableTools(db, g.user, g)
+    if request.endpoint not in leanEndpoints:
+        g.applicationLogoUrl = makeSettingImageUrl(
+            g,
+            'ostracion_images',
+            'navbar_logo',
+        )
+        #
+        g.canPerformSearch = isUserWithinPermissionCircle(
+            db,
+            g.user,
+            g.settings['behaviour']['search']['search_access']['value'],
+        )
+        g.quickFindForm = QuickFindForm()
+        g.canShowTreeView = isUserWithinPermissionCircle(
+            db,
+            g.user,
+            g.settings['behaviour']['search']['tree_view_access']['value'],
+        )
+        # task lists - must happen after the above (which set access flags)
+        g.availableApps = selectAvailableApps(db, g.user, g)
+        g.availableInfoItems = selectAvailableInfoItems(db, g.user, g)
+        g.availableTools = selectAvailableTools(db, g.user, g)
     #
     if g.user.is_authenticated:
         g.user.setRoles(list(dbGetUserRoles(db, g.user)))
@@ -293,6 +338,12 @@ def before_request():
             return redirect(url_for('loginView'))
 
 
+@app.teardown_appcontext
+def teardown_appcontext(exception):
+    """Give the request-scoped DB connection back to the pool."""
+    dbReleaseDatabase()
+
+
 @lm.user_loader
 def load_user(uid):
     """Given an ID, fetch the DB and return the corresponding user, if any."""
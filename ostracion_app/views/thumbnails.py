@@ -11,7 +11,6 @@ from flask import (
     url_for,
     abort,
     g,
-    send_from_directory,
     request,
 )
 
@@ -44,6 +43,12 @@ from ostracion_app.utilities.fileIO.physical import (
     fileIdToSplitPath,
 )
 
+from ostracion_app.utilities.viewTools.fileDelivery import (
+    makeIconETag,
+    isIconDummyIdCurrent,
+    sendThumbnailFromDirectory,
+)
+
 from ostracion_app.utilities.database.dbTools import (
     dbGetDatabase,
 )
@@ -132,10 +137,12 @@ def fileThumbnailView(dummyId, fsPathString):
             file.icon_file_id,
             fileStorageDirectory=fileStorageDirectory,
         )
-        return send_from_directory(
+        return sendThumbnailFromDirectory(
             filePhysicalPath,
             filePhysicalName,
-            mimetype=file.icon_mime_type,
+            mimeType=file.icon_mime_type,
+            etag=makeIconETag(file.icon_file_id),
+            immutable=isIconDummyIdCurrent(dummyId, file.icon_file_id),
         )
     else:
         return redirect(
@@ -165,10 +172,12 @@ def linkThumbnailView(dummyId, fsPathString=''):
             link.icon_file_id,
             fileStorageDirectory=fileStorageDirectory,
         )
-        return send_from_directory(
+        return sendThumbnailFromDirectory(
             filePhysicalPath,
             filePhysicalName,
-            mimetype=link.icon_mime_type,
+            mimeType=link.icon_mime_type,
+            etag=makeIconETag(link.icon_file_id),
+            immutable=isIconDummyIdCurrent(dummyId, link.icon_file_id),
         )
     else:
         return redirect(
@@ -203,10 +212,12 @@ def boxThumbnailView(dummyId, boxPathString=''):
                 box.icon_file_id,
                 fileStorageDirectory=fileStorageDirectory,
             )
-            return send_from_directory(
+            return sendThumbnailFromDirectory(
                 filePhysicalPath,
                 filePhysicalName,
-                mimetype=box.icon_mime_type,
+                mimeType=box.icon_mime_type,
+                etag=makeIconETag(box.icon_file_id),
+                immutable=isIconDummyIdCurrent(dummyId, box.icon_file_id),
             )
         else:
             return redirect(makeSettingImageUrl(
@@ -233,10 +244,15 @@ def userThumbnailView(dummyId, username):
                 targetUser.icon_file_id,
                 fileStorageDirectory=fileStorageDirectory,
             )
-            return send_from_directory(
+            return sendThumbnailFromDirectory(
                 filePhysicalPath,
                 filePhysicalName,
-                mimetype=targetUser.icon_mime_type,
+                mimeType=targetUser.icon_mime_type,
+                etag=makeIconETag(targetUser.icon_file_id),
+                immutable=isIconDummyIdCurrent(
+                    dummyId,
+                    targetUser.icon_file_id,
+                ),
             )
         else:
             return redirect(makeSettingImageUrl(g, 'user_images', 'user_icon'))
@@ -264,15 +280,26 @@ def settingThumbnailView(dummyId, settingGroupId, settingId):
                 fileStorageDirectory=fileStorageDirectory,
             )
             mimeType = setting.icon_mime_type
+            etag = makeIconETag(setting.value)
         else:
             filePhysicalPath = defaultAppImageDirectory
             filePhysicalName = setting.default_value
             mimeType = setting.default_icon_mime_type
+            # default images may change with an upgrade of the application
+            defaultImagePath = os.path.join(filePhysicalPath, filePhysicalName)
+            etag = 'default-%s-%i' % (
+                setting.default_value,
+                int(os.path.getmtime(defaultImagePath))
+                if os.path.isfile(defaultImagePath)
+                else 0,
+            )
         #
-        return send_from_directory(
+        return sendThumbnailFromDirectory(
             filePhysicalPath,
             filePhysicalName,
-            mimetype=mimeType,
+            mimeType=mimeType,
+            etag=etag,
+            immutable=isIconDummyIdCurrent(dummyId, setting.value),
         )
 
 
@@ -10,7 +10,6 @@ from flask import (
     request,
     redirect,
     render_template,
-    send_from_directory,
     abort,
 )
 
@@ -21,6 +20,10 @@ from werkzeug.utils import secure_filename
 from ostracion_app.app_main import app
 
 from ostracion_app.utilities.viewTools.messageTools import flashMessage
+from ostracion_app.utilities.viewTools.fileDelivery import (
+    sendFileFromDirectory,
+    sendFileRendition,
+)
 
 from ostracion_app.utilities.models.User import User
 
@@ -38,6 +41,8 @@ from ostracion_app.utilities.tools.comparisonTools import (
     optionNumberLeq,
 )
 
+from ostracion_app.utilities.tools.extraction import safeInt
+
 from ostracion_app.utilities.database.dbTools import (
     dbGetDatabase,
 )
@@ -388,16 +393,25 @@ def ticketGalleryFsView(ticketId, securityCode, fileName):
                     file = getFileFromParent(db, parentBox, fileName, issuer)
                     if file is not None:
                         dbPunchRichTicket(db, richTicket)
+                        renditionWidth = safeInt(request.args.get('w'), None)
+                        if renditionWidth is not None:
+                            return sendFileRendition(
+                                db,
+                                file,
+                                fileStorageDirectory=fileStorageDirectory,
+                                width=renditionWidth,
+                                acceptWebp=request.args.get('fmt') == 'webp',
+                            )
                         filePhysicalPath, filePhysicalName = fileIdToSplitPath(
                             file.file_id,
                             fileStorageDirectory=fileStorageDirectory,
                         )
-                        return send_from_directory(
+                        return sendFileFromDirectory(
                             filePhysicalPath,
                             filePhysicalName,
-                            attachment_filename=file.name,
-                            as_attachment=True,
-                            mimetype=file.mime_type,
+                            mimeType=file.mime_type,
+                            rootDirectory=fileStorageDirectory,
+                            attachmentFileName=file.name,
                         )
                     else:
                         return abort(404, 'Content unavailable')
@@ -542,12 +556,12 @@ def ticketFsDownloadView(ticketId, securityCode):
                     file.file_id,
                     fileStorageDirectory=fileStorageDirectory,
                 )
-                return send_from_directory(
+                return sendFileFromDirectory(
                     filePhysicalPath,
                     filePhysicalName,
-                    attachment_filename=file.name,
-                    as_attachment=True,
-                    mimetype=file.mime_type,
+                    mimeType=file.mime_type,
+                    rootDirectory=fileStorageDirectory,
+                    attachmentFileName=file.name,
                 )
             else:
                 return abort(404, 'Content unavailable')
@@ -1491,6 +1491,30 @@ initialDbValues = {
                 'group_ordering':   30,
                 'ordering':         15,
             },
+            {
+                'id':               'archive_compression',
+                'klass':            'behaviour',
+                'type':             'option',
+                'value':            'by_type',
+                'title':            'Archive compression',
+                'description':      (
+                                        'Files in downloaded box archives '
+                                        'are compressed:'
+                                    ),
+                'default_value':    '',
+                'metadata':         (
+                                        '{"choices": [{"n": "All", "id": '
+                                        '"all"}, {"n": "All but already-'
+                                        'compressed types (images, videos, '
+                                        'archives, ...)", "id": "by_type"}, '
+                                        '{"n": "None (fastest)", "id": '
+                                        '"none"}]}'
+                                    ),
+                'group_id':         'archives',
+                'group_title':      'Archive settings',
+                'group_ordering':   30,
+                'ordering':         20,
+            },
             #
             {
                 'id':               'tree_view_access',
@@ -27,10 +27,16 @@ from ostracion_app.utilities.database.sqliteEngine import (
     dbQueryColumns,
     dbRetrieveAllRecords,
     dbRetrieveRecordByKey,
+    dbCreateFullTextIndex,
+    dbRebuildFullTextIndex,
+    dbCreateChangeLogTriggers,
+    SqliteError,
 )
 from ostracion_app.utilities.database.dbSchema import (
     dbSchema,
     tableCreationOrder,
+    fullTextIndices,
+    similarityTrackedTables,
 )
 
 from ostracion_app.utilities.tools.securityCodes import makeSecretKey
@@ -40,6 +46,8 @@ from ostracion_app.utilities.models.Link import Link
 from config import (
     dbFullName,
     basedir,
+    similarityChangeLogLength,
+    asyncThumbnailGeneration,
 )
 
 from ostracion_app.utilities.tools.formatting import (
@@ -48,6 +56,10 @@ from ostracion_app.utilities.tools.formatting import (
 
 from post_install.initialValues.defaultDb import initialDbValues
 from post_install.specialFixers.roleFixer import fixRoleTablesAddingRoleClass
+from post_install.specialFixers.dvectorFixer import convertDVectorsToBinary
+from post_install.specialFixers.derivativeFixer import (
+    addMissingOriginalDerivatives,
+)
 
 sensitiveConfigFileTemplate = applyReplacementPairs(
     open(
@@ -175,7 +187,7 @@ if __name__ == '__main__':
                         'ALTER TABLE links ADD COLUMN title TEXT;'
                     )
                     db.execute(
-                        'ALTER TABLE links ADD COLUMN dvector_title TEXT;'
+                        'ALTER TABLE links ADD COLUMN dvector_title BLOB;'
                     )
                     print('        * Upgrading entries ... ', end='')
                     #
@@ -331,5 +343,43 @@ if __name__ == '__main__':
                     print('#')
             #
             print('        * done.')
+    # digram vectors still in the former (JSON) format are converted
+    convertDVectorsToBinary(db)
+    # renditions made when the original was not always recorded
+    addMissingOriginalDerivatives(db)
+    # full-text indices are rebuilt in any case, as (e.g.) a VACUUM
+    # may renumber the rows they refer to
+    print(' * Full-text indices')
+    for indName, indDesc in sorted(fullTextIndices.items()):
+        print('     * %-60s' % ('"%s" ' % indName), end='')
+        try:
+            dbCreateFullTextIndex(db, indName, indDesc)
+            dbRebuildFullTextIndex(db, indName)
+            print('rebuilt.')
+        except SqliteError as e:
+            print('skipped (%s).' % e)
+    # changes to the digram vectors are logged for the similarity search
+    print(' * Similarity change log')
+    for tName, tableDesc in sorted(similarityTrackedTables.items()):
+        print('     * %-60s' % ('"%s" ' % tName), end='')
+        dbCreateChangeLogTriggers(
+            db,
+            'similarity_changes',
+            tName,
+            tableDesc['key'],
+            tableDesc['dvectors'],
+            similarityChangeLogLength,
+        )
+        print('done.')
     # all done.
     db.commit()
+    if asyncThumbnailGeneration:
+        print(
+            ' * NOTE: thumbnails of uploaded images are prepared by '
+            'background workers.\n'
+            '   Make sure "thumbnail_worker.py run" is running (the '
+            'installer sets up\n'
+            '   the ostracion_thumbnailer service), or set '
+            'asyncThumbnailGeneration = False\n'
+            '   in config.py.'
+        )
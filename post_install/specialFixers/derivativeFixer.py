@@ -0,0 +1,107 @@
+""" derivativeFixer.py
+    One-time addition of the 'original' row to the renditions of
+    the images processed when it was recorded only for originals
+    not wider than the largest rendition: their original is then
+    offered to wide screens as well.
+"""
+
+import os
+
+from ostracion_app.utilities.database.sqliteEngine import (
+    dbRetrieveRecordsByKey,
+    dbRetrieveRecordByKey,
+)
+
+from ostracion_app.utilities.database.dbSchema import (
+    dbSchema,
+)
+
+from ostracion_app.utilities.database.settingsTools import (
+    dbGetSetting,
+)
+
+from ostracion_app.utilities.database.fileDerivatives import (
+    dbStoreFileDerivatives,
+)
+
+from ostracion_app.utilities.fileIO.physical import (
+    fileIdToPath,
+)
+
+from ostracion_app.utilities.fileIO.thumbnails import (
+    imageDisplaySize,
+)
+
+# files done between two commits
+addBatchFiles = 500
+
+
+def addMissingOriginalDerivatives(db):
+    """ Record the 'original' rendition of all files having
+        renditions but not that one, reading the image size from
+        the file (files missing or unreadable are left as they are).
+        Commits as it goes, so that this can be interrupted and run again.
+
+        Returns whether it did something or not as a bool
+    """
+    legacyFileIds = sorted({
+        derivative['file_id']
+        for derivative in dbRetrieveRecordsByKey(
+            db,
+            'file_derivatives',
+            {},
+            whereClauses=[(
+                'file_id NOT IN (SELECT file_id FROM file_derivatives '
+                'WHERE rendition = ?)',
+                'original',
+            )],
+            dbTablesDesc=dbSchema,
+        )
+    })
+    if len(legacyFileIds) == 0:
+        return False
+    fileStorageDirectory = dbGetSetting(
+        db,
+        'system',
+        'system_directories',
+        'fs_directory',
+        None,
+    )['value']
+    print(' * Recording the original among the renditions ', end='')
+    numAdded = 0
+    for fileIndex, fileId in enumerate(legacyFileIds):
+        fileDict = dbRetrieveRecordByKey(
+            db,
+            'files',
+            {'file_id': fileId},
+            dbTablesDesc=dbSchema,
+        )
+        if fileDict is not None:
+            srcFile = fileIdToPath(
+                fileId,
+                fileStorageDirectory=fileStorageDirectory,
+            )
+            size = (imageDisplaySize(srcFile)
+                    if os.path.isfile(srcFile)
+                    else None)
+            if size is not None:
+                dbStoreFileDerivatives(
+                    db,
+                    fileId,
+                    [{
+                        'rendition': 'original',
+                        'derivative_file_id': fileId,
+                        'mime_type': fileDict['mime_type'],
+                        'width': size[0],
+                        'height': size[1],
+                        'size': os.path.getsize(srcFile),
+                    }],
+                    skipCommit=True,
+                )
+                numAdded += 1
+        if (fileIndex + 1) % addBatchFiles == 0:
+            db.commit()
+            print('.', end='', flush=True)
+    db.commit()
+    print(' %i of %i files done.' % (numAdded, len(legacyFileIds)))
+    return True
@@ -0,0 +1,75 @@
+""" dvectorFixer.py
+    One-time conversion of the digram vectors of boxes, files
+    and links from the former JSON strings to the binary format
+    of serializeDVector (the application reads both meanwhile).
+"""
+
+from ostracion_app.utilities.database.sqliteEngine import (
+    dbRetrieveRecordsByKey,
+    dbUpdateRecordsByKey,
+)
+
+from ostracion_app.utilities.database.dbSchema import (
+    dbSchema,
+    similarityTrackedTables,
+)
+
+from ostracion_app.utilities.textSimilarity.similarityTools import (
+    serializeDVector,
+    deserializeDVector,
+    isLegacySerializedDVector,
+)
+
+# rows converted (and committed) at a time
+convertBatchRows = 2000
+
+
+def convertDVectorsToBinary(db):
+    """ Convert all JSON digram vectors to the binary format,
+        a batch of rows at a time (each batch being committed,
+        so that this can be interrupted and run again).
+
+        Returns whether it did something or not as a bool
+    """
+    didSomething = False
+    for tName, tableDesc in sorted(similarityTrackedTables.items()):
+        keyColumn = tableDesc['key']
+        legacyClause = '(%s)' % ' OR '.join(
+            'typeof(%s) = \'text\'' % dvColumn
+            for dvColumn in tableDesc['dvectors']
+        )
+        numConverted = 0
+        while True:
+            legacyRecords = list(dbRetrieveRecordsByKey(
+                db,
+                tName,
+                {},
+                whereClauses=[legacyClause],
+                limit=convertBatchRows,
+                dbTablesDesc=dbSchema,
+            ))
+            if len(legacyRecords) == 0:
+                break
+            if numConverted == 0:
+                print(' * Converting digram vectors of "%s" ' % tName, end='')
+            for recordDict in legacyRecords:
+                dbUpdateRecordsByKey(
+                    db,
+                    tName,
+                    {keyColumn: recordDict[keyColumn]},
+                    {
+                        dvColumn: serializeDVector(
+                            deserializeDVector(recordDict[dvColumn])
+                        )
+                        for dvColumn in tableDesc['dvectors']
+                        if isLegacySerializedDVector(recordDict[dvColumn])
+                    },
+                    dbTablesDesc=dbSchema,
+                )
+            db.commit()
+            numConverted += len(legacyRecords)
+            print('.', end='', flush=True)
+        if numConverted > 0:
+            didSomething = True
+            print(' %i rows done.' % numConverted)
+    return didSomething
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+""" thumbnailCheck.py
+    Integrity check, and regeneration, of the thumbnails
+    of settings, users, boxes, links and files.
+
+    A thumbnail is:
+        -   'missing' if its file is not in the storage;
+        -   'stale' if its size does not match its thumbnail format
+            (e.g. after a change of thumbnailFormatMap), if it was
+            written before the --stale-before date (e.g. an ImageMagick
+            upgrade) or, with --all, in any case.
+    Thumbnails of image files are made anew from the file itself
+    (replacing also icons set by hand on those files); stale thumbnails
+    of other items are made anew from the thumbnail itself, while missing
+    ones are reset so that the item shows its default icon.
+
+    The checks run in a pool of processes. An interrupted run (Ctrl-C)
+    can be picked up later with --resume.
+
+    Usage:
+        thumbnailCheck.py [-n] [-r] [-a] [-p N] [-t TABLE,...]
+                          [--stale-before YYYY-MM-DD]
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import datetime
+import argparse
+import multiprocessing
+from functools import partial
+
+from ostracion_app.utilities.database.dbTools import (
+    dbGetDatabase,
+)
+
+from ostracion_app.utilities.database.settingsTools import (
+    dbGetSetting,
+)
+
+from ostracion_app.utilities.database.thumbnailChecks import (
+    thumbnailCheckTableNames,
+    thumbnailItemPosition,
+    dbListThumbnailItems,
+    dbReplaceItemThumbnail,
+)
+
+from ostracion_app.utilities.fileIO.thumbnailChecks import (
+    checkThumbnailItem,
+)
+
+from ostracion_app.utilities.fileIO.physical import (
+    flushFsDeleteQueue,
+    mkDirP,
+)
+
+# name of the progress file, in the temp directory
+progressFileName = 'thumbnail_check_progress.json'
+# results applied between two commits (and progress file updates)
+commitEveryItems = 500
+# interval between progress lines
+progressIntervalSeconds = 5
+# items sent to a worker process at a time
+poolChunkSize = 16
+
+
+def parseArguments(args):
+    """ Read the command line into a namespace."""
+    parser = argparse.ArgumentParser(
+        description='Check, and fix, the thumbnails in the file storage.',
+    )
+    parser.add_argument(
+        '-n', '--dry-run',
+        action='store_true',
+        help='only report what would be done',
+    )
+    parser.add_argument(
+        '-r', '--resume',
+        action='store_true',
+        help='pick up an interrupted run from where it stopped',
+    )
+    parser.add_argument(
+        '-a', '--all',
+        action='store_true',
+        help='make anew all thumbnails that can be',
+    )
+    parser.add_argument(
+        '-p', '--processes',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='number of worker processes (default: number of CPUs)',
+    )
+    parser.add_argument(
+        '-t', '--tables',
+        default=','.join(thumbnailCheckTableNames),
+        help='comma-separated tables to check (default: all of %s)' % (
+            ','.join(thumbnailCheckTableNames),
+        ),
+    )
+    parser.add_argument(
+        '--stale-before',
+        metavar='YYYY-MM-DD',
+        help='thumbnails written before this date are stale',
+    )
+    return parser.parse_args(args)
+
+
+def loadProgress(progressFilePath, options):
+    """ Read the position reached by an interrupted run,
+        None if there is nothing to resume.
+    """
+    if not os.path.isfile(progressFilePath):
+        return None
+    with open(progressFilePath) as progressFile:
+        progress = json.load(progressFile)
+    if progress['options'] != options:
+        raise ValueError(
+            'The interrupted run had different options: %s' % (
+                json.dumps(progress['options']),
+            )
+        )
+    return tuple(progress['position'])
+
+
+def saveProgress(progressFilePath, options, position):
+    """ Record the position of the last item done, atomically."""
+    tempPath = '%s.tmp' % progressFilePath
+    with open(tempPath, 'w') as progressFile:
+        json.dump({'options': options, 'position': position}, progressFile)
+    os.replace(tempPath, progressFilePath)
+
+
+def describeItem(item):
+    """ A short human-readable name for an item."""
+    return '%s/%s' % (item['table'], '/'.join(item['key']))
+
+
+def ignoreInterrupts():
+    """ Worker processes leave Ctrl-C to the main process."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class ProgressReporter():
+    """ Periodic printing of how the check is going."""
+
+    def __init__(self, numItems):
+        self.numItems = numItems
+        self.numDone = 0
+        self.counts = {}
+        self.startTime = time.time()
+        self.lastReport = self.startTime
+
+    def record(self, result):
+        self.numDone += 1
+        if result['action'] is not None:
+            self.counts[result['action']] = (
+                self.counts.get(result['action'], 0) + 1
+            )
+            print('   - %s : %s, %s%s' % (
+                describeItem(result['item']),
+                result['state'],
+                result['action'],
+                '' if result['error'] is None else ' (%s)' % result['error'],
+            ))
+        now = time.time()
+        if now - self.lastReport >= progressIntervalSeconds:
+            self.report(now)
+
+    def report(self, now=None):
+        now = now if now is not None else time.time()
+        self.lastReport = now
+        rate = self.numDone / max(now - self.startTime, 1e-6)
+        eta = (
+            (self.numItems - self.numDone) / rate
+            if rate > 0
+            else 0
+        )
+        print(' * %i/%i (%.1f%%), %.1f items/s, ETA %s. %s' % (
+            self.numDone,
+            self.numItems,
+            100.0 * self.numDone / max(self.numItems, 1),
+            rate,
+            datetime.timedelta(seconds=int(eta)),
+            ', '.join(
+                '%s: %i' % (action, count)
+                for action, count in sorted(self.counts.items())
+            ) or 'all fine so far',
+        ))
+
+
+if __name__ == '__main__':
+    arguments = parseArguments(sys.argv[1:])
+    tableNames = [t.strip() for t in arguments.tables.split(',')]
+    for tName in tableNames:
+        if tName not in thumbnailCheckTableNames:
+            print('Unknown table "%s"' % tName)
+            sys.exit(1)
+    if arguments.stale_before is not None:
+        staleBefore = time.mktime(datetime.datetime.strptime(
+            arguments.stale_before,
+            '%Y-%m-%d',
+        ).timetuple())
+    else:
+        staleBefore = None
+    # what makes a run resumable by another
+    options = {
+        'tables': tableNames,
+        'all': arguments.all,
+        'stale_before': arguments.stale_before,
+    }
+    #
+    db = dbGetDatabase()
+    fileStorageDirectory = dbGetSetting(
+        db,
+        'system',
+        'system_directories',
+        'fs_directory',
+        None,
+    )['value']
+    tempDirectory = dbGetSetting(
+        db,
+        'system',
+        'system_directories',
+        'temp_directory',
+        None,
+    )['value']
+    mkDirP(tempDirectory)
+    progressFilePath = os.path.join(tempDirectory, progressFileName)
+    #
+    print(' * Listing thumbnails... ', end='')
+    items = dbListThumbnailItems(db, tableNames)
+    print('%i found.' % len(items))
+    if arguments.resume:
+        try:
+            resumePosition = loadProgress(progressFilePath, options)
+        except ValueError as e:
+            print(str(e))
+            sys.exit(1)
+        if resumePosition is not None:
+            items = [
+                item
+                for item in items
+                if thumbnailItemPosition(item) > resumePosition
+            ]
+            print(' * Resuming: %i left.' % len(items))
+        else:
+            print(' * Nothing to resume, starting over.')
+    if arguments.dry_run:
+        print(' * Dry run: nothing will be changed.')
+    #
+    reporter = ProgressReporter(len(items))
+    numSinceCommit = 0
+    fsDeleteQueue = []
+    lastPosition = None
+    pool = multiprocessing.Pool(
+        arguments.processes,
+        initializer=ignoreInterrupts,
+    )
+    try:
+        for result in pool.imap(
+                partial(
+                    checkThumbnailItem,
+                    fileStorageDirectory=fileStorageDirectory,
+                    staleBefore=staleBefore,
+                    remakeAll=arguments.all,
+                    dryRun=arguments.dry_run,
+                ),
+                items,
+                chunksize=poolChunkSize):
+            if (not arguments.dry_run and
+                    result['action'] in {'remake', 'reset'}):
+                applied, itemDeleteQueue = dbReplaceItemThumbnail(
+                    db,
+                    result['item'],
+                    result['icon_file_id'],
+                    result['icon_mime_type'],
+                    fileStorageDirectory=fileStorageDirectory,
+                )
+                fsDeleteQueue += itemDeleteQueue
+                if not applied:
+                    result['action'] = 'changed_meanwhile'
+            lastPosition = thumbnailItemPosition(result['item'])
+            reporter.record(result)
+            numSinceCommit += 1
+            if not arguments.dry_run and numSinceCommit >= commitEveryItems:
+                db.commit()
+                flushFsDeleteQueue(fsDeleteQueue)
+                saveProgress(progressFilePath, options, lastPosition)
+                fsDeleteQueue = []
+                numSinceCommit = 0
+        pool.close()
+        interrupted = False
+    except KeyboardInterrupt:
+        # thumbnails made for results not yet collected stay
+        # in the storage as unreferenced files
+        pool.terminate()
+        interrupted = True
+    pool.join()
+    #
+    if not arguments.dry_run:
+        db.commit()
+        flushFsDeleteQueue(fsDeleteQueue)
+        if interrupted and lastPosition is not None:
+            saveProgress(progressFilePath, options, lastPosition)
+        elif not interrupted and os.path.isfile(progressFilePath):
+            os.remove(progressFilePath)
+    reporter.report()
+    if interrupted:
+        print(' * Interrupted%s.' % (
+            '' if arguments.dry_run else ': run again with -r to resume'
+        ))
+        sys.exit(1)
+    else:
+        print(' * Done.')
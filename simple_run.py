@@ -9,6 +9,10 @@ import sys
 
 from ostracion_app.app_main import app
 
+from config import (
+    asyncThumbnailGeneration,
+)
+
 if __name__ == '__main__':
     # if -e flag is specified, enable running as
     # externally-accessible (still non-production) host
@@ -16,4 +20,11 @@ if __name__ == '__main__':
     if '-e' in sys.argv[1:]:
         host = '0.0.0.0'
     app.config['DEVELOPMENT'] = True
+    if asyncThumbnailGeneration:
+        print(
+            ' * Thumbnails of uploaded images are prepared by background '
+            'workers:\n'
+            '   run "./thumbnail_worker.py run" alongside this app (or set '
+            'asyncThumbnailGeneration = False in config.py).'
+        )
     app.run(debug=True, host=host)
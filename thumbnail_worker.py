@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+    Command-line handling of the thumbnail job queue.
+
+    Usage:
+        thumbnail_worker.py run [N]     keep N (default from config)
+                                          workers running, polling the queue
+        thumbnail_worker.py drain [N]   process all pending jobs, then exit
+        thumbnail_worker.py status      show the number of jobs by status
+        thumbnail_worker.py retry       make failed jobs pending again
+        thumbnail_worker.py rebuild     enqueue a job for each image file
+                                          still lacking a thumbnail
+"""
+
+import sys
+
+from ostracion_app.utilities.database.dbTools import (
+    dbGetDatabase,
+)
+
+from ostracion_app.utilities.database.thumbnailJobs import (
+    dbCountThumbnailJobs,
+    dbRetryFailedThumbnailJobs,
+    dbRebuildThumbnailJobs,
+)
+
+from ostracion_app.utilities.fileIO.thumbnailWorkers import (
+    runThumbnailWorkerPool,
+)
+
+from config import (
+    thumbnailWorkerProcesses,
+)
+
+
+def printUsage():
+    print(__doc__)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if len(args) == 0:
+        printUsage()
+        sys.exit(1)
+    command = args[0]
+    if command in {'run', 'drain'}:
+        numProcesses = (int(args[1])
+                        if len(args) > 1
+                        else thumbnailWorkerProcesses)
+        runThumbnailWorkerPool(numProcesses, drain=command == 'drain')
+    elif command == 'status':
+        db = dbGetDatabase()
+        for status, count in sorted(dbCountThumbnailJobs(db).items()):
+            print('%-10s %i' % (status, count))
+    elif command == 'retry':
+        db = dbGetDatabase()
+        print('%i failed job(s) made pending' % (
+            dbRetryFailedThumbnailJobs(db),
+        ))
+    elif command == 'rebuild':
+        db = dbGetDatabase()
+        print('%i job(s) enqueued' % dbRebuildThumbnailJobs(db, 'thumbnail'))
+    else:
+        printUsage()
+        sys.exit(1)